@@ -15,16 +15,75 @@ from gym import spaces
 # import egi
 # import egi.simple as egi
 import egi3.simple as egi
+from key_table import action_space_from_meanings
 # import egi.threaded as egi
 import sys # sys.argv[]
 import pickle
+import json
+import re
 from datetime import datetime
 
+# action meanings of the minimal action set of every Atari game of gym_task, generated once from the ROMs by
+# build_action_space_registry() and committed ; only read at run time
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'action_space_registry.json')
 
-def get_actionSpace(env_name='MountainCar-v0'):
+_registry = None
+
+
+def _env_name_to_game(env_name):
+    """ 'MsPacman-v0', 'MsPacmanNoFrameskip-v4' -> 'ms_pacman' """
+    name = env_name.split('-')[0]
+    name = re.sub('(Deterministic|NoFrameskip)$', '', name)
+    return re.sub('(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+def _minimal_action_meanings(game):
+    """ action meanings of the minimal action set of 'game', read from the ROM without building a gym env """
+    import atari_py
+    from gym.envs.atari.atari_env import ACTION_MEANING
+
+    ale = atari_py.ALEInterface()
+    ale.loadROM(atari_py.get_game_path(game))
+    return [ACTION_MEANING[a] for a in ale.getMinimalActionSet()]
+
+
+def build_action_space_registry(games=None, path=REGISTRY_PATH):
+    """
+    Compute the action meanings of all games registered in gym_task (or of 'games') from
+    their ROMs (atari_py) and write them to 'path' ; run by hand when a game is added.
+    """
+    if games is None:
+        from gym_task import ATARI_GAMES
+        games = ATARI_GAMES
 
-    env = gym.make(env_name)
-    num_action_space = env.action_space.n
+    registry = {}
+    for game in games:
+        registry[game] = _minimal_action_meanings(game)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(registry, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp, path)
+    return registry
+
+
+def get_action_meanings(env_name):
+    """ same as gym.make(env_name).get_action_meanings(), read from the registry """
+    global _registry
+
+    if _registry is None:
+        with open(REGISTRY_PATH, 'r') as f:
+            _registry = json.load(f)
+
+    game = _env_name_to_game(env_name)
+    if game not in _registry:
+        raise KeyError('{0} is not in {1}, regenerate it with build_action_space_registry()'.format(
+            game, REGISTRY_PATH))
+    return _registry[game]
+
+
+def get_actionSpace(env_name='MountainCar-v0'):
 
     if env_name == 'CartPole-v1':
         action_space = {"right": 1, "left": 0}
@@ -39,49 +98,8 @@ def get_actionSpace(env_name='MountainCar-v0'):
         action_space = {'w': 2, 's': 5, 'a': 4, 'd': 3, 'l': 1}
 
     else: # atari except pong
-        meaning = env.get_action_meanings()  # ['NOOP', 'FIRE', 'RIGHT', 'LEFT', 'RIGHTFIRE', 'LEFTFIRE']
-        my_map = env.get_keys_to_action()  # {(): 0, (32,): 1, (100,): 2, (97,): 3, (32, 100): 4, (32, 97): 5}
-        action_to_key = {v: k for k, v in my_map.items()}
-        action_space = {}
-        for i in range(num_action_space):
-            if len(action_to_key[i]) == 1:
-                if chr(action_to_key[i][0]) == ' ':
-                    action_space.update({'l': i})
-                else:
-                    action_space.update({chr(action_to_key[i][0]): i})
-            elif len(action_to_key[i]) == 2:
-                if chr(action_to_key[i][0]) == ' ':
-                    k1 = 'l'
-                else:
-                    k1 = chr(action_to_key[i][0])
-
-                if chr(action_to_key[i][1]) == ' ':
-                    k2 = 'l'
-                else:
-                    k2 = chr(action_to_key[i][1])
-                k = [k1, k2]
-                k.sort()
-                action_space.update({tuple(k): i})
-                # action_space.update({chr(action_to_key[i][1]): i})
-
-            elif len(action_to_key[i]) == 3:
-                if chr(action_to_key[i][0]) == ' ':
-                    k1 = 'l'
-                else:
-                    k1 = chr(action_to_key[i][0])
-
-                if chr(action_to_key[i][1]) == ' ':
-                    k2 = 'l'
-                else:
-                    k2 = chr(action_to_key[i][1])
-                if chr(action_to_key[i][2]) == ' ':
-                    k3 = 'l'
-                else:
-                    k3 = chr(action_to_key[i][2])
-                k = [k1, k2, k3]
-                k.sort()
-                action_space.update({tuple(k): i})
-                # action_space.update({chr(action_to_key[i][1]): i})
+        # ['NOOP', 'FIRE', 'RIGHT', 'LEFT', 'RIGHTFIRE', 'LEFTFIRE'] -> {'l': 1, 'd': 2, 'a': 3, ('d', 'l'): 4, ('a', 'l'): 5}
+        action_space = action_space_from_meanings(get_action_meanings(env_name))
 
         if env_name == 'Enduro-v0':
             action_space.pop('s')
@@ -7,10 +7,23 @@ from PIL import Image
 
 # import egi
 # import egi.simple as egi
-import egi3.simple as egi
 # import egi3.simple as egi
+import egi3.threaded as egi  # events are queued, the game loop does not wait for the replies
 from Env_actionMap import *
 from my_Scheduler import *
+from frame_recorder import FrameRecorder
+from image_export import ImageExporter
+from loop_scheduler import LoopScheduler
+from key_table import KeyActionTable, GAME_KEYS
+from key_events import KeyEventStream
+from env_pool import EnvPool
+from presenter import PresenterProcess
+from replay import ReplayRecorder
+from result_log import ResultLog, compact
+from frame_log import EpisodeLog
+from session_checkpoint import SessionCheckpoint, CHECKPOINT_DIR, find_latest, load as load_checkpoint
+from egi3.clock_sync import ClockSync
+from session_clock import WallClock
 import itertools
 
 time_now = datetime.now().strftime('%Y%m%d-%H%M')
@@ -29,304 +42,38 @@ def keyboard_recording():
     pykb.wait()
 
 
-def key_processing(ns, env_name, keyss, action_space, info_key, info_keys, t, t_ep, pp, cur_comp, order):  # TODO : t3
-    action = 0
-    if env_name != 'Enduro-v0' and env_name != 'SpaceInvaders-v0' and env_name != 'Breakout-v0':
-        if pykb.is_pressed(31):
-            keyss.append('s')
-        if pykb.is_pressed(17):
-            keyss.append('w')
-    if pykb.is_pressed(32):
-        keyss.append('d')
-    if pykb.is_pressed(30):
-        keyss.append('a')
+def key_processing(ns, key_table, episode_log, t, t_ep, pp, cur_comp, order, key_stream=None):  # TODO : t3
+    # one bitmask read and one table lookup (see key_table.py)
+    mask = key_table.read_mask()
+    action, log_label, event_label = key_table.lookup(mask)
+    if key_stream is not None:
+        key_stream.update()
 
-    if pykb.is_pressed(38):
-        keyss.append('l')
-    if pykb.is_pressed(35):
-        keyss.append('h')
-
-
-    if len(keyss) > 1:
-        if 'a' in keyss and 'd' in keyss:
-            keyss.remove('a')
-            keyss.remove('d')
-
-        if 'w' in keyss and 's' in keyss:
-            keyss.remove('w')
-            keyss.remove('s')
-
-    final_len = len(keyss)
-
-    # for random key for uncertainty
-    ll = list(action_space.keys())
-
-    if 'l' not in keyss:
-        # new random key
-        del_list = []
-
-        for key in ll:
-            l_key = list(key)
-            if 'l' in l_key:
-                del_list.append(key)
-
-        for i in del_list:
-            ll.remove(i)
-
-    ll_random = random.sample(ll, 1)
-    action_random = action_space[ll_random[0]]
-
-    if final_len == 0:  # len(keys) == 0:  # press nothing
-
-        # uncertainty = np.random.choice(2, 1, p=pp)[0]
-        uncertainty = 0  # TODO uncertainty -> no
-
-        if uncertainty == 0:
-            info_key.append(np.nan)  # action action
-            info_key.append(np.nan)  # rt
-            # info_key.append(np.nan)  # duration
-            # info_key.append(np.nan)  # common/rare
-            info_key.append(uncertainty)  # block_uncertainty...?
-            info_key.append(cur_comp)
-            info_key.append(order)
-            info_keys.append(info_key)
-
-            action = 0
-
-        if uncertainty == 1:
-            info_key.append(np.nan)  # action action
-            info_key.append(np.nan)  # rt
-            # info_key.append(np.nan)  # duration
-            # info_key.append(np.nan)  # common/rare
-            info_key.append(uncertainty)
-            info_key.append(cur_comp)
-            info_key.append(order)
-            info_keys.append(info_key)
-
-            action = action_random
-
-
-    elif final_len == 1:
-        reaction_time = t_ep.getTime()
+    poll_time = t_ep.getTime()
+    if event_label is None:  # press nothing
+        reaction_time = np.nan
+    else:
+        # time of the latest press of the held keys (OS time stamp, key_events.py) on t_ep, with the
+        # offset taken at key_stream.mark() ; the poll time if the stream has not seen the press
+        # (or the key is held since before the episode started)
+        t_press = key_stream.press_time(mask, key_table.scan_codes) if key_stream is not None else None
+        reaction_time = poll_time if t_press is None else key_stream.episode_time(t_press)
         if ns is not None:
-            ns.send_event('act' + str(t), label=keyss[0],
-                          timestamp=egi.ms_localtime())
-
-        if keyss[0] == 'h':
-            return
-
-        if keyss[0] in action_space.keys():
-            # uncertainty = np.random.choice(2, 1,
-            #                                p=pp)[0]  # 0, 1중 1개 pp = [0.9, 0.1] or [0.5, 0.5]의 확률로
-            uncertainty = 0  # TODO uncertainty -> no
-
-            # uncertainty = 0
-
-            if uncertainty == 0:  # condition normal
+            # stamped with the session clock attached to ns (egi3/clock_sync.py)
+            ns.send_event('act' + str(t), label=event_label)  # label : left, right, # TODO reaction_time
 
-                action = action_space[keyss[0]]
-
-                info_key.append(keyss[0])
-                info_key.append(reaction_time)
-                # info_key.append(dd) #duration
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
+    if log_label is not None:
+        # uncertainty = np.random.choice(2, 1, p=pp)[0]  # 0, 1중 1개 pp = [0.9, 0.1] or [0.5, 0.5]의 확률로
+        uncertainty = 0  # TODO uncertainty -> no
 
-            if uncertainty == 1:  # condition not normal
+        if uncertainty == 1:  # condition not normal
+            # random key for uncertainty ; fire only if 'l' is pressed
+            action = random.choice(key_table.random_actions[1 if mask & key_table.fire_bit else 0])
 
-                true_action = action_space[keyss[0]]
-                # action  = 0 # drop button
-                action = action_random
+        # one typed row (see frame_log.py) ; the label is looked up from the mask when saved
+        episode_log.key(mask, action, reaction_time, uncertainty, cur_comp, order, poll_time)
 
-                info_key.append(keyss[0])
-                info_key.append(reaction_time)
-                # info_key.append(dd) #duration
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-    elif final_len == 2:  # press two key
-        reaction_time = t_ep.getTime()
-        if ns is not None:
-            ns.send_event('act' + str(t), label="({0}, {1})".format(keyss[0], keyss[1]),
-                          timestamp=egi.ms_localtime())  # label : left, right, # TODO reaction_time
-
-        action_pre = [keyss[0], keyss[1]]
-        action_pre.sort()
-
-        if tuple(action_pre) in action_space.keys():
-
-            # uncertainty = 0
-            # uncertainty = np.random.choice(2, 1,
-            #                                p=pp)[0]  # 0, 1중 1개 pp = [0.9, 0.1] or [0.5, 0.5]의 확률로
-            uncertainty = 0  # TODO uncertainty -> no
-
-            if uncertainty == 0:  # condition common
-
-                action = action_space[tuple(action_pre)]
-                # k1_dur = action_inorder[0].duration
-                # k2_dur = action_inorder[1].duration
-                info_key.append((keyss[0], keyss[1]))
-                info_key.append(reaction_time)
-                # info_key.append((dd1, dd2))
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-            if uncertainty == 1:  # condition not normal
-
-                true_action = action_space[tuple(action_pre)]
-                # action = 0 # drop button
-                action = action_random
-
-                info_key.append((keyss[0], keyss[1]))
-                info_key.append(reaction_time)
-                # info_key.append((dd1, dd2))
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-        else:  # combination 안될 때 last key만
-            # print("no comb")
-            # uncertainty = np.random.choice(2, 1, p=pp)[0]
-            uncertainty = 0  # TODO uncertainty -> no
-
-            if uncertainty == 0:  # condition common
-                action = action_space[keyss[0]]
-
-                info_key.append(keyss[0])
-                info_key.append(reaction_time)
-                # info_key.append(dd)
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-            if uncertainty == 1:  # condition not normal
-
-                true_action = action_space[keyss[0]]
-                # action = 0 # drop button
-                action = action_random
-
-                info_key.append(keyss[0])
-                info_key.append(reaction_time)
-                # info_key.append(dd)
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-    else:  # len(keys) >= 3
-        reaction_time = t_ep.getTime()
-        if ns is not None:
-            ns.send_event('act' + str(t),
-                          label="({0}, {1}, {2})".format(keyss[0], keyss[1], keyss[2]),
-                          timestamp=egi.ms_localtime())  # label : left, right
-
-        action_pre = [keyss[0], keyss[1], keyss[2]]
-        action_pre.sort()
-        if tuple(action_pre) in action_space.keys():
-            # uncertainty = np.random.choice(2, 1, p=pp)[0]
-            uncertainty = 0  # TODO uncertainty -> no
-
-
-            if uncertainty == 0:  # condition common
-
-                action = action_space[tuple(action_pre)]
-
-                info_key.append((keyss[0], keyss[1], keyss[2]))
-                info_key.append(reaction_time)
-                # info_key.append((dd1, dd2, dd3))
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-            if uncertainty == 1:  # condition not normal
-                true_action = action_space[tuple(action_pre)]
-                # action = 0  # drop button
-                action = action_random
-
-                info_key.append((keyss[0], keyss[1], keyss[2]))
-                info_key.append(reaction_time)
-                # info_key.append((dd1, dd2, dd3))
-                info_key.append(uncertainty)
-                info_key.append(cur_comp)
-                info_key.append(order)
-                info_keys.append(info_key)
-
-        else:  # combination 안될 때 last key만
-            # print("no comb in 3")
-            # uncertainty = np.random.choice(2, 1, p=pp)[0]
-            uncertainty = 0  # TODO uncertainty -> no
-
-            if 'l' in action_pre:
-                action_pre.remove('l')
-                for i in range(len(keyss)):
-                    if keyss[i] == 'l':
-                        keyss.pop(i)
-                        break
-
-                if uncertainty == 0:
-                    actual_act = [keyss[0], 'l']
-                    actual_act.sort()
-                    action = action_space[tuple(actual_act)]
-
-                    info_key.append((keyss[0], 'l'))
-                    info_key.append(reaction_time)
-                    # info_key.append((dd, dl))
-                    info_key.append(uncertainty)
-                    info_key.append(cur_comp)
-                    info_key.append(order)
-                    info_keys.append(info_key)
-
-                if uncertainty == 1:
-                    actual_act = [keyss[0], 'l']
-                    actual_act.sort()
-                    true_action = action_space[tuple(actual_act)]
-                    # action = 0 # drop button
-                    action = action_random
-
-                    info_key.append((keyss[0], 'l'))
-                    info_key.append(reaction_time)
-                    # info_key.append((dd, dl))
-                    info_key.append(uncertainty)
-                    info_key.append(cur_comp)
-                    info_key.append(order)
-                    info_keys.append(info_key)
-
-
-            else:  # action_pre 에 'l'없을때
-                if uncertainty == 0:
-                    action = action_space[keyss[0]]
-
-                    info_key.append(keyss[0])
-                    info_key.append(reaction_time)
-                    # info_key.append(dd)
-                    info_key.append(uncertainty)
-                    info_key.append(cur_comp)
-                    info_key.append(order)
-                    info_keys.append(info_key)
-
-                if uncertainty == 1:
-                    true_action = action_space[keyss[0]]
-                    # action = 0  # drop button
-                    action = action_random
-
-                    info_key.append(keyss[0])
-                    info_key.append(reaction_time)
-                    # info_key.append(dd)
-                    info_key.append(uncertainty)
-                    info_key.append(cur_comp)
-                    info_key.append(order)
-                    info_keys.append(info_key)
-
-    return action, info_key, info_keys
+    return action
 
 
 def reward_processing(index, reward_in, cur_comp, reward_temp, reward_stage_lst, reward_stage_lst_MH, order,
@@ -477,42 +224,44 @@ def reward_processing(index, reward_in, cur_comp, reward_temp, reward_stage_lst,
 
 
 def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
-                          FrameRate=60):  # TODO framerate = 60 # part_number = 0-6  , env_name='Skiing-v0', slowing=0, # Sess_number = day, part_number =
-
-    p = Process(target=keyboard_recording)
-    p.start()
+                          FrameRate=60, resume=None, make_env=None, viewer_factory=None, is_pressed=None,
+                          clock=None, n_blocks=None):  # TODO framerate = 60 # part_number = 0-6  , env_name='Skiing-v0', slowing=0, # Sess_number = day, part_number =
+    # resume : None, 'latest' or a checkpoint directory -> continue an interrupted session (session_checkpoint.py)
+    # headless runs (bench_headless.py) : make_env(env_name) instead of gym.make, viewer_factory of the AtariEnv
+    # viewers, is_pressed(scan code) instead of the keyboard, clock (session_clock.py) instead of the real
+    # timers and waits, n_blocks : stop after that many blocks
+    global time_now
+
+    if clock is None:
+        clock = WallClock()
+    if is_pressed is None:
+        p = Process(target=keyboard_recording)
+        p.start()
+        read_key = pykb.is_pressed
+    else:
+        p = None
+        read_key = is_pressed
     day = SESS_NUMBER
     RenderingRate = 60
+    KeyRate = 60  # key polling
+    SaveFrames = True  # False : no raw frames, they are regenerated from the replay logs (replay.py)
+    TwoProcess = False  # True : the game window is drawn by a separate presenter process (presenter.py)
+    NtpHost = None  # NTP server of the amplifier (e.g. '10.10.10.51') : offset / drift of its clock (egi3/clock_sync.py)
 
     ## for session conditioning ##
     if SESS_NUMBER == 0:
 
-        num_eachGame = 2
-
-        cand_list = block_permut(num_of_gameType=3, num_eachGame=num_eachGame)
-        cand_list_goal_setting = goal_setting_permut()
-        direc = './SESS_atari'
-
-        if not os.path.exists(direc):
-            os.makedirs(direc)
-
-        with open(direc + '/SESS_day' + str(day) + '.pkl', 'wb') as f:
-            pickle.dump(cand_list, f)
-
-        with open(direc + '/SESS_day' + str(day) + '_goal_setting.pkl', 'wb') as f:
-            pickle.dump(cand_list_goal_setting, f)
+        # block and goal setting schedules -> ./SESS_atari/schedule_bank.json (see my_Scheduler.py)
+        bank = build_schedule_bank()
+        cand_list = {key: bank[key] for key in ('env_list', 'complexity_list', 'uncertainty_list')}
+        cand_list_goal_setting = {key: bank[key] for key in ('high_complexity_per_trial', 'low_complexity_per_trial')}
 
         return cand_list, cand_list_goal_setting
 
     else:
         #### load necessary data ####
-        direc_SESS = './SESS_atari/SESS_day' + str(0) + '.pkl'
-        with open(direc_SESS, 'rb') as f:
-            SESSs = pickle.load(f)
-
-        direc_SESS_goal = './SESS_atari/SESS_day' + str(0) + '_goal_setting.pkl'
-        with open(direc_SESS_goal, 'rb') as g:
-            SESSs_goal = pickle.load(g)
+        # cached schedule bank, generated on the first run
+        SESSs = SESSs_goal = load_schedule_bank()
 
         session = SESS_NUMBER - 1  # 0 1 2
 
@@ -553,7 +302,72 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
         if ns is not None:
             flag_ns = 1
 
+        # PNG export of a block runs on worker processes during the score / rest screens
+        exporter = ImageExporter()
+
+        # key presses with the time stamp of the OS, for the reaction times
+        key_stream = KeyEventStream(scan_codes=[code for code, _ in GAME_KEYS],
+                                    hook='keyboard' if is_pressed is None else None)
+
+        # ALE instances and viewers are kept alive across blocks and episodes
+        if TwoProcess:
+            # frames go through a shared-memory ring to the presenter process
+            presenter = PresenterProcess()
+            env_pool = EnvPool(make=presenter.make_env)
+        else:
+            presenter = None
+            env_pool = EnvPool() if make_env is None else EnvPool(make=make_env)
+
+        #### crash-safe checkpoints ####
+        resume_state = None  # state of the interrupted block, restored at its start
+        resume_episode = None  # state of the interrupted episode, restored at its start
+        resume_screen = False  # show the start screen (and reconnect) before the first resumed episode
+        n_blocks_done = 0
+        if resume is not None:
+            direc_checkpoint = find_latest(PART_NUMBER, SESS_NUMBER) if resume == 'latest' else resume
+            resume_state = load_checkpoint(direc_checkpoint) if direc_checkpoint is not None else None
+            if resume_state is None:
+                raise IOError('no checkpoint of subject {0}, session {1} to resume'.format(PART_NUMBER, SESS_NUMBER))
+            if resume_state['kind'] == 'done':  # only an explicit directory can point to a finished session
+                raise IOError('session of {0} has finished, nothing to resume'.format(direc_checkpoint))
+            time_now = resume_state['time_now']
+            random.setstate(resume_state['random_state'])
+            np.random.set_state(resume_state['np_random_state'])
+            print("resuming from {0} : block {1}, episode {2} ({3} checkpoint)".format(
+                direc_checkpoint, resume_state['block_num'], resume_state['i_episode'], resume_state['kind']))
+
+            if resume_state['kind'] == 'block':  # stopped between blocks
+                n_blocks_done = resume_state['block_num']
+                exporter.start(resume_state['export_list'])
+                resume_state = None
+            else:
+                n_blocks_done = resume_state['block_num'] - 1
+
+        checkpoint = SessionCheckpoint('./result_save/ATARI' + '/Subject{0}/session{1}_'.format(
+            PART_NUMBER, SESS_NUMBER) + time_now + '/' + CHECKPOINT_DIR)
+
+        # monotonic session clock of the event timestamps, with the offset / drift of the amplifier clock
+        clock_sync = ClockSync(ntp_host=NtpHost)
+        clock_sync.start()
+
+        def block_state():
+            # session state saved with every checkpoint ; lists are copied, the writer pickles them later
+            return {'time_now': time_now, 'block_num': block_num, 'block_time': t_block.getTime(),
+                    'i_episode': i_episode, 'temp_seq': list(temp_seq), 'order': order, 'prev_reward': prev_reward,
+                    'stage_i': stage_i, 'cur_comp': cur_comp, 'reward_temp': reward_temp, 'reward_tot': reward_tot,
+                    'session_num': session_num, 'reward_stage_lst': list(reward_stage_lst),
+                    'reward_stage_lst_MH': list(reward_stage_lst_MH), 'reward_per_session': dict(reward_per_session),
+                    'reward_per_session_MH': dict(reward_per_session_MH), 'reward_sess_2': list(reward_sess_2),
+                    'observations_sess': list(observations_sess), 'replay_sess': list(replay_sess),
+                    'random_state': random.getstate(), 'np_random_state': np.random.get_state()}
+
         for block in schedule_env:
+            if block_num < n_blocks_done:  # finished before the session was interrupted
+                block_num += 1
+                continue
+            if n_blocks is not None and block_num - n_blocks_done >= n_blocks:
+                break
+
             stage_i = 1  # for repetition of simple stage
 
             block_complexity = schedule_complexity[block_num]
@@ -590,18 +404,16 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
 
             temp_seq = list(itertools.chain(temp_seq_, schedule_goal))
 
-            t1 = core.Clock()
-            t2 = core.Clock()
-            t3 = core.Clock()  # for rt and ot
-            t_ep = core.Clock()  # for first episode time
-            t_block = core.Clock()  # for 8 min duration
-            t_stage = core.Clock()
+            t3 = clock.timer()  # for rt and ot
+            t_ep = clock.timer()  # for first episode time
+            t_block = clock.timer()  # for 8 min duration
+            t_stage = clock.timer()
 
             observations_sess = []
-            info_keys_sess = []
-            ots_sess = []
             reward_sess = []
-            reward_per_image_sess = []
+            loop_timing_sess = []
+            replay_sess = []
+            result_log = None  # append-only episode log of the block (result_log.py)
 
             reward_sess_2 = []
             reward_stage_lst = []
@@ -624,11 +436,39 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
 
             """rest 1min"""
 
-            t_done1 = time.time()
+            t_done1 = clock.now()
 
-            t_leftover = core.Clock()  # for calculate rest time
+            t_leftover = clock.timer()  # for calculate rest time
             t_leftover.reset()
 
+            if resume_state is not None:
+                # continue the interrupted block from its last checkpoint
+                i_episode = resume_state['i_episode']
+                temp_seq = resume_state['temp_seq']
+                order = resume_state['order']
+                prev_reward = resume_state['prev_reward']
+                stage_i = resume_state['stage_i']
+                cur_comp = resume_state['cur_comp']
+                reward_temp = resume_state['reward_temp']
+                reward_tot = resume_state['reward_tot']
+                session_num = resume_state['session_num']
+                reward_stage_lst = resume_state['reward_stage_lst']
+                reward_stage_lst_MH = resume_state['reward_stage_lst_MH']
+                reward_per_session = resume_state['reward_per_session']
+                reward_per_session_MH = resume_state['reward_per_session_MH']
+                reward_sess_2 = resume_state['reward_sess_2']
+                observations_sess = resume_state['observations_sess']
+                replay_sess = resume_state['replay_sess']
+
+                # the block time already played counts for the 4 min of the block
+                for clock in (t_ep, t_block, t_leftover):
+                    clock.addTime(-resume_state['block_time'])
+                t_done1 -= resume_state['block_time']
+
+                resume_episode = resume_state if resume_state['kind'] == 'stage' else None
+                resume_screen = True
+                resume_state = None
+
             while t_block.getTime() <= 60 * run_time_min:  # 8 min
 
                 if block == 1:
@@ -647,22 +487,24 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                     env_name = 'Pitfall-v0'  # 50
 
 
-                env = gym.make(env_name)
+                env = env_pool.acquire(env_name)  # already reset
+                if viewer_factory is not None:
+                    env.unwrapped.viewer_factory = viewer_factory
                 action_space = get_actionSpace(env_name)
+                key_table = KeyActionTable(env_name, action_space, is_pressed=is_pressed)
                 key_list = list(action_space.keys()) + ['h']
                 slowing = slow[env_name]
-                observation = env.reset()
 
-                info_keys = []
-                ots = []
+                episode_log = EpisodeLog(key_table)  # key rows and frame times of the episode
 
-                if i_episode == 0 and block_num == 1:
+                if (i_episode == 0 and block_num == 1) or resume_screen:
+                    resume_screen = False
 
                     if flag_ns == 1:
                         ns = egi.Netstation()
                         ns.connect("10.10.10.42", 55513)
                         # ns.connect("192.168.0.2", 55513)  # THIS
-                        ns.sync()
+                        clock_sync.attach(ns)  # 'A' + 'T' on the session clock, events are stamped by it
 
                     if ns is not None:
                         ns.StartRecording()
@@ -675,7 +517,7 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                     textRect = text.get_rect()
                     textRect.center = (X // 2, Y // 2)
 
-                    ots.append(t_ep.getTime())  # meassage time point
+                    episode_log.mark(t_ep.getTime())  # meassage time point
 
                     display_surface.fill(black)
                     display_surface.blit(text, textRect)
@@ -683,7 +525,7 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
 
                     while True:
 
-                        if pykb.is_pressed(20):
+                        if read_key(20):
                             break
 
                         for event in pygame.event.get():
@@ -697,26 +539,25 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
 
                 elif i_episode == 0 and block_num != 1:
                     # rest 끝나기 30초 전에 start recording
-                    ots.append(
-                        t_ep.getTime())  # fixation time point
+                    episode_log.mark(t_ep.getTime())  # fixation time point
 
-                    t_rec3 = time.time()
+                    t_rec3 = clock.now()
                     if t_rec1 in locals():
                         print(t_rec3 - t_rec1)
                         if t_rec3 - t_rec1 < 30:
-                            time.sleep(30 - (t_rec3 - t_rec1))
+                            clock.sleep(30 - (t_rec3 - t_rec1))
 
                     if flag_ns == 1:
                         ns = egi.Netstation()
                         ns.connect("10.10.10.42", 55513)
                         # ns.connect("192.168.0.2", 55513)  # THIS
-                        ns.sync()
+                        clock_sync.attach(ns)  # 'A' + 'T' on the session clock, events are stamped by it
 
                     if ns is not None:
                         ns.StartRecording()
 
                     # 2분 초과해도 30초는 쉬게 해주기
-                    time.sleep(30)
+                    clock.sleep(30)
 
 
                 else:
@@ -724,77 +565,98 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                     if ns is not None:
                         ns.StartRecording()
 
-                    ots.append(t_ep.getTime())  # fixation time point
-                    time.sleep(0.5 + np.random.rand())
-
-                observation = env.reset()
-
-                ots.append(t_ep.getTime())  # episode 시작 time point
+                    episode_log.mark(t_ep.getTime())  # fixation time point
+                    clock.sleep(0.5 + np.random.rand())
+
+                # the episode is seeded and its actions are logged, so every frame can be replayed offline
+                direc_episode = './result_save/ATARI' + '/Subject{0}/session{1}_'.format(
+                    PART_NUMBER, SESS_NUMBER) + time_now + f'/block{block_num}_' + env_name.split('-')[0]
+                # an interrupted episode continues from the ALE state of its last stage boundary
+                suffix = '' if resume_episode is None else '_resumed' + datetime.now().strftime('%H%M%S')
+                replay_log = ReplayRecorder(direc_episode + '_replay/episode{0:03d}{1}.npz'.format(i_episode, suffix),
+                                            env, env_name, seed=np.random.randint(2 ** 31 - 1),  # seeds np_random
+                                            restore=None if resume_episode is None else resume_episode['ale_state'],
+                                            first_step=0 if resume_episode is None else resume_episode.get('replay_step', 0),
+                                            reset=False)  # the one reset of the episode was in env_pool.acquire
+                observation = replay_log.observation
+
+                episode_log.mark(t_ep.getTime())  # episode 시작 time point
+                # keys held from before do not count as presses of this episode ; t_ep <-> key times
+                key_stream.mark(t_ep.getTime())
+                # session clock <-> t_ep, to put the frame times on the time base of the EEG events
+                clock_sync.mark('block{0}_episode{1}'.format(block_num, i_episode), t_ep.getTime())
 
                 if ns is not None:
-                    # print(egi.ms_localtime())
-                    ns.send_event('epi' + str(i_episode), label="episode",
-                                  timestamp=egi.ms_localtime())
+                    ns.send_event('epi' + str(i_episode), label="episode")
 
                 ## 시작점
-                observations = []
-                reward_per_images = []
-                t1.reset()
-                t2.reset()
+                # frames are streamed to disk during play (see frame_recorder.py)
+                direc_frames = direc_episode + '_frames/episode{0:03d}{1}'.format(i_episode, suffix)
+                observations = FrameRecorder(direc_frames) if SaveFrames else None
                 t3.reset()
                 t_stage.reset()
-                t_refresh1 = time.time()
-                n = 0
                 t = 0
                 tt = 0
-                t0 = time.time()
+                t0 = clock.now()
                 done = False
                 reward_c = 0
                 pygame.quit()
 
                 # for get the number of original lives
-                observation, reward, done, info = env.step(0)
-                original_lives = info['ale.lives']
+                if resume_episode is None:
+                    observation, reward, done, info = replay_log.step(0)
+                    original_lives = info['ale.lives']
+                else:
+                    # the interrupted episode stopped at a stage boundary : no step here, the step counter
+                    # of replay_log goes on from the checkpoint
+                    original_lives = env.unwrapped.ale.lives()
+                    info = {'ale.lives': original_lives}
                 target_lives = original_lives - 2
                 flag_stage = 0
 
+                if resume_episode is not None:
+                    target_lives = resume_episode['target_lives']
+                    reward_c = resume_episode['reward_c']
+                    t = resume_episode['t']
+                    episode_log.prepend(resume_episode['key_rows'], resume_episode['time_rows'])
+                    observations_sess.extend(resume_episode['episode_frames'])  # frames before the crash
+                    ckpt_rows = [len(resume_episode['key_rows']), len(resume_episode['time_rows'])]
+                    resume_episode = None
+                else:
+                    ckpt_rows = [0, 0]  # key / time rows of the episode already in a 'stage' checkpoint
+
+                # fixed-timestep loop : key polling, env.step and env.render each run on their own grid
+                action = 0
+                reward_acc = 0  # rewards of all steps since the last rendered frame
+                sched = LoopScheduler({'keys': KeyRate / slowing, 'step': RenderingRate / slowing,
+                                       'render': FrameRate / slowing, 'report': 0.1},
+                                      spin=clock.spin, clock=clock.now, sleep=clock.sleep)
+
                 while True:  # sampling
 
                     if len(temp_seq) < 1:
                         break
 
                     tt += 1
-                    info_key = []
+                    due = sched.wait()
 
-                    if n == 0:
-                        t2.reset()
+                    if 'report' in due and t > 0:  # every 10 s
+                        print(sched.summary())
+                        print("Rest time for block_{0} is {1} min.".format(block_num,
+                                                                           int(
+                                                                               run_time_min - t_leftover.getTime() / 60)))  # 8-~~
 
-                    gt2 = t2.getTime()
-
-                    if gt2 > 1:
-                        t_refresh2 = time.time()
-                        if int(t_refresh2 - t_refresh1) % 10 == 0:
-                            print(f"refresh rate is {n} Hz.")
-                            print("Rest time for block_{0} is {1} min.".format(block_num,
-                                                                               int(
-                                                                                   run_time_min - t_leftover.getTime() / 60)))  # 8-~~
-                        n = 0
-                        t2.reset()
-
-                    action = 0
-                    gt = t1.getTime()
-
-                    if gt > (slowing / RenderingRate):  # render 60Hz   #0.01694915
-                        keyss = []
+                    if 'keys' in due:
                         cur_comp = temp_seq[0]  # 220208
-                        action, info_key, info_keys = key_processing(ns, env_name, keyss, action_space, info_key,
-                                                                     info_keys, t, t_ep, pp, cur_comp,
-                                                                     order)
+                        action = key_processing(ns, key_table, episode_log, t, t_ep, pp, cur_comp, order, key_stream)
 
-                        observation, reward, done, info = env.step(action)
+                    if 'step' in due:  # 60Hz
+                        observation, reward, done, info = replay_log.step(action)
+                        reward_acc += reward
 
-
-                    if gt > (slowing / FrameRate):  # render 60Hz   #0.01694915
+                    if 'render' in due:  # render 60Hz
+                        reward = reward_acc
+                        reward_acc = 0
 
                         # for stage converting
                         if info['ale.lives'] == original_lives - 1:
@@ -820,8 +682,9 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                             # print(reward)
 
                         reward_c += reward
-                        observations.append(observation)
-                        reward_per_images.append(reward)
+                        if observations is not None:
+                            observations.append(observation)
+                        replay_log.mark_frame()
 
                         # complexity sequence is given as a list with limited length here
                         cur_comp = temp_seq[0]  # current stage
@@ -829,11 +692,10 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                         render_seq = temp_seq[:i]
                         env.render(prev=prev_reward, seq=render_seq, game=block, order=order)
 
-                        ots.append(t_ep.getTime())
+                        episode_log.frame(t_ep.getTime(), reward)
 
                         if reward != 0 and ns is not None:
-                            ns.send_event('reward_stage' + str(order), label="reward",
-                                          timestamp=egi.ms_localtime())
+                            ns.send_event('reward_stage' + str(order), label="reward")
 
 
                         if flag_stage == 1:
@@ -874,12 +736,20 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                             t_stage.reset()
                             flag_stage = 0
 
+                            # checkpoint at the stage boundary ; rows since the previous checkpoint only
+                            state = block_state()
+                            state.update({'ale_state': replay_log.snapshot(), 'replay_step': len(replay_log),
+                                          'target_lives': target_lives, 'reward_c': reward_c, 't': t,
+                                          'frames_direc': observations.direc if observations is not None else None,
+                                          'key_rows': episode_log.keys.array(ckpt_rows[0]),
+                                          'time_rows': episode_log.times.array(ckpt_rows[1])})
+                            checkpoint.save('stage', state)
+                            ckpt_rows = [len(episode_log.keys), len(episode_log.times)]
+
 
-                        n += 1
-                        t1.reset()
                         t += 1
 
-                    t_done2 = time.time()
+                    t_done2 = clock.now()
 
                     if done or t_done2 - t_done1 > run_time_min * 60:  # 8*60
                         break
@@ -887,7 +757,10 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                     # after all time step
                     # every one episode
 
-                reward_close = env.close()
+                reward_close = env_pool.release(env)
+                if observations is not None:
+                    observations.close()
+                replay_log.close()
 
                 # if reward_close != 0:
                     # print(reward_close)
@@ -932,33 +805,21 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                 textRect2.center = (X // 2, Y // 2)
                 # reward 보여줄 때 event tagging
                 if ns is not None:
-                    ns.send_event('reward_epi' + str(i_episode), label="reward",
-                                  timestamp=egi.ms_localtime())
+                    ns.send_event('reward_epi' + str(i_episode), label="reward")
 
-                t4 = time.time()
+                t4 = clock.now()
                 display_surface.fill(black)
                 display_surface.blit(text, textRect2)
                 pygame.display.update()
 
-                ots_sess.append(ots)
                 reward_sess.append(int(reward_c))
-                info_keys_sess.append(info_keys)
-                observations_sess.append(observations)
-                reward_per_image_sess.append(reward_per_images)
+                if observations is not None:
+                    observations_sess.append(observations.direc)
+                replay_sess.append(replay_log.path)
+                loop_timing_sess.append(sched.stats())
 
                 i_episode += 1
 
-                frame_data_dict = {'observation_time': ots_sess, 'reward_c': reward_sess_2,
-                                   'rewards_per_image': reward_per_image_sess,
-                                   'key': info_keys_sess, 'session': schedule_env,
-                                   'session_tag': "1: Seaquest, 2: MsPacman, 3: SpaceInvaders, 4: Asterix, 6 : Breakout, 7: Pitfall",
-                                   'complexity_schedule': schedule_complexity,
-                                   'uncertainty_schedule': schedule_uncertainty,
-                                   'goal_condition_schedule': schedule_goal}  # session마다 COND_name_
-
-                reward_per_session_stage_dict_MH = reward_per_session_MH
-                reward_per_session_stage_dict = reward_per_session
-
                 # for saving
                 env_name2 = env_name.split('-')[0]
                 direc_save = './result_save/ATARI' + '/Subject{0}/session{1}_'.format(
@@ -967,28 +828,53 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                     PART_NUMBER, SESS_NUMBER) + time_now + f'/block{block_num}_' + env_name2 + '_dict'
 
 
-                if not os.path.exists(direc_save_dict):
-                    os.makedirs(direc_save_dict)
+                # one record per episode ; the .mat files of the block are compacted from the log at its end
+                if result_log is None:
+                    result_log = ResultLog(direc_save_dict + '/episode_log',
+                                           header={'session': schedule_env,
+                                                   'session_tag': "1: Seaquest, 2: MsPacman, 3: SpaceInvaders, 4: Asterix, 6 : Breakout, 7: Pitfall",
+                                                   'complexity_schedule': schedule_complexity,
+                                                   'uncertainty_schedule': schedule_uncertainty,
+                                                   'goal_condition_schedule': schedule_goal})  # session마다 COND_name_
 
-                io.savemat(direc_save_dict + '/' + time_now + '.mat',
-                           frame_data_dict)
-                io.savemat(direc_save_dict + '/reward_per_session_stage_dict_sep' + time_now + '.mat',
-                           reward_per_session_stage_dict_MH)
-                io.savemat(direc_save_dict + '/reward_per_session_stage_dict' + time_now + '.mat',
-                           reward_per_session_stage_dict)
+                # rows are saved as numpy arrays, the MATLAB layout is built by compact()
+                result_log.append({'reward_c': reward_sess_2[-1], **episode_log.rows(),
+                                   'loop_timing': loop_timing_sess[-1], 'replay_log': replay_sess[-1],
+                                   'reward_per_session_stage_sep': {str(session_num - 1): temp_lst_MH},
+                                   'reward_per_session_stage': {str(session_num - 1): temp_lst}})
+                checkpoint.save('episode', block_state())
 
-                t5 = time.time()
+                t5 = clock.now()
 
                 # DK
                 svtime = t5 - t4
                 print(str(svtime / 60) + "min to save data / one trial")
 
                 if 3 > svtime:  # 2*60
-                    time.sleep(3 - svtime + np.random.rand())
+                    clock.sleep(3 - svtime + np.random.rand())
 
                 del font2
                 pygame.quit()
 
+            # .mat files of the block, in the layout of the former per-episode io.savemat calls
+            if result_log is not None:
+                result_log.close()
+                compact(result_log.direc, direc_save_dict, time_now)
+
+            ##### save obs img #####
+            env_name2 = env_name.split('-')[0]
+            export_list = []
+            for i_episodei in range(len(observations_sess)):
+                direc_img = "./result_save/ATARI" + '/Subject{0}/session{1}_'.format(
+                    PART_NUMBER, SESS_NUMBER) + time_now + "/block{}_".format(
+                    block_num) + env_name2 + "/" + os.path.basename(observations_sess[i_episodei])
+                export_list.append((observations_sess[i_episodei], direc_img))
+            exporter.start(export_list)
+
+            state = block_state()
+            state['export_list'] = export_list
+            checkpoint.save('block', state)
+
             print("initialising pygame")
             pygame.init()
 
@@ -1019,50 +905,42 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
             display_surface.blit(text2, textRect32)
             pygame.display.update()
 
-            t_rest = core.Clock()  # for rest
+            t_rest = clock.timer()  # for rest
             t_rest.reset()
 
             # reward 보여줄 때 event tagging
             if ns is not None:
-                ns.send_event('reward_block' + str(block_num), label="total_r",
-                              timestamp=egi.ms_localtime())
+                ns.send_event('reward_block' + str(block_num), label="total_r")
 
             # reward 보여주고 5초 뒤에 stop recording
-            time.sleep(5)
+            clock.sleep(5)
 
             if ns is not None:
-                ns.StopRecording()
-                ns.EndSession()
+                if ns.error is None:
+                    ns.StopRecording()
+                    ns.EndSession()
                 ns.disconnect()
-
-            t_saving1 = time.time()  # for rest
-
-            ##### save obs img #####
-            env_name2 = env_name.split('-')[0]
-
-            for i_episodei in range(len(observations_sess)):
-                direc_img = "./result_save/ATARI" + '/Subject{0}/session{1}_'.format(
-                    PART_NUMBER, SESS_NUMBER) + time_now + "/block{}_".format(
-                    block_num) + env_name2 + "/episode{0:03d}".format(i_episodei)
-
-                if not os.path.exists(direc_img):
-                    os.makedirs(direc_img)
-
-                observations_i = observations_sess[i_episodei]
-                for ob in range(len(observations_i)):
-                    Image.fromarray(observations_i[ob]).save(
-                        direc_img + "/obs_{0:03d}.png".format(ob))
-
-            t_saving2 = time.time()
-            print("time for saving images per block: {} ".format(t_saving2 - t_saving1))
+                print(ns.summary())
+                if ns.error is not None:
+                    # the block went on without Netstation ; its events after the failure are missing in the EEG
+                    print("WARNING : the connection to Netstation failed during block {0} : {1}".format(block_num, ns.error))
+            clock_sync.export('./result_save/ATARI' + '/Subject{0}/session{1}_'.format(
+                PART_NUMBER, SESS_NUMBER) + time_now + '/block{0}_clock_sync.json'.format(block_num))
 
             """rest 1min"""
             t_restornot = t_rest.getTime()
             rest_time = 60  # + np.random.rand()  # 60 sec
             if t_restornot < rest_time:
-                time.sleep(rest_time - t_restornot)
+                # image export progress is reported during the rest
+                exporter.wait(timeout=rest_time - t_restornot, report_every=10)
+                t_restornot = t_rest.getTime()
+                if t_restornot < rest_time:
+                    clock.sleep(rest_time - t_restornot)
+
+            # the next game starts only after the images of this block are saved
+            exporter.wait()
 
-            t_rec1 = time.time()
+            t_rec1 = clock.now()
 
             del font3
             pygame.quit()
@@ -1071,7 +949,7 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
             pygame.init()
             print("press t to continue.")
             while True:
-                if pykb.is_pressed(20):
+                if read_key(20):
                     pygame.quit()
                     break
 
@@ -1080,10 +958,21 @@ def openAI_function_atari(PART_NUMBER, SESS_NUMBER, ns=None,
                     if event.type == pygame.QUIT:
                         running = False
             print("next")
+        checkpoint.save('done', {'time_now': time_now, 'block_num': block_num})
+        checkpoint.close()
+        clock_sync.close()
+        key_stream.close()
+        exporter.shutdown()
+        print("env switch latency (count, mean s): {}".format(env_pool.stats()))
+        env_pool.close()
+        if presenter is not None:
+            presenter.close()
+            print(presenter.summary())
     # else:
     #     raise ValueError
     print("end")
-    p.join()
+    if p is not None:
+        p.join()
     print("finish")
     return 0
 
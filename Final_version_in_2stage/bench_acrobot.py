@@ -0,0 +1,102 @@
+"""
+Micro-benchmark : the acrobot integration step of gym_task, the former generic path
+(rk4(env._dsdt, ...) with wrap / bound, as AcrobotEnv.step did it) vs. the specialized
+AcrobotRK4 (acrobot.py) -- step_one() for the single env, step() on (N, 4) state arrays.
+
+The outputs are checked first on random states, book and nips equations : both AcrobotRK4
+paths must agree with the former path to --atol and be bit-identical to each other.
+The memory allocated by the batched steps (tracemalloc) is reported : after the first step
+only small view objects are left, the same few kB for any N.
+
+    python bench_acrobot.py
+    python bench_acrobot.py --sizes 1 64 1024 16384
+"""
+import timeit
+import argparse
+import tracemalloc
+import numpy as np
+from numpy import pi
+
+from gym_task.envs.acrobot import AcrobotEnv, AcrobotRK4, rk4, wrap, bound
+
+
+def legacy_step(env, s, torque):
+    """ the former integration of AcrobotEnv.step """
+    ns = rk4(env._dsdt, np.append(s, torque), [0, env.dt])[-1][:4]
+    ns[0] = wrap(ns[0], -pi, pi)
+    ns[1] = wrap(ns[1], -pi, pi)
+    ns[2] = bound(ns[2], -env.MAX_VEL_1, env.MAX_VEL_1)
+    ns[3] = bound(ns[3], -env.MAX_VEL_2, env.MAX_VEL_2)
+    return ns
+
+
+def random_states(n, seed=0):
+    rng = np.random.RandomState(seed)
+    states = np.column_stack([rng.uniform(-pi, pi, size=(n, 2)),
+                              rng.uniform(-AcrobotEnv.MAX_VEL_1, AcrobotEnv.MAX_VEL_1, size=n),
+                              rng.uniform(-AcrobotEnv.MAX_VEL_2, AcrobotEnv.MAX_VEL_2, size=n)])
+    return states, rng.choice(AcrobotEnv.AVAIL_TORQUE, size=n)
+
+
+def check(n, atol):
+    states, torques = random_states(n)
+    for equations in ('book', 'nips'):
+        env = AcrobotEnv()
+        env.book_or_nips = equations
+        integrator = AcrobotRK4(env)
+        expected = np.array([legacy_step(env, s, a) for s, a in zip(states, torques)])
+        batched = integrator.step(states, torques)
+        single = np.array([integrator.step_one(s, a) for s, a in zip(states, torques)])
+        diff = np.abs(batched - expected).max()
+        assert diff <= atol, (equations, diff)
+        assert np.array_equal(batched, single), equations
+        print("{0} equations : {1} states, max difference to the former path {2:.1e}, step / step_one identical".format(
+            equations, n, diff))
+
+
+def allocated_per_step(integrator, states, torques, n_steps=20):
+    """ peak bytes traced during batched steps (after a first one) """
+    out = np.empty_like(states)
+    integrator.step(states, torques, out=out)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    for _ in range(n_steps):
+        integrator.step(out, torques, out=out)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 256, 4096])
+    parser.add_argument('--atol', type=float, default=1e-12)
+    args = parser.parse_args(argv)
+
+    check(2000, args.atol)
+
+    env = AcrobotEnv()
+    env.seed(0)
+    env.reset()
+    integrator = AcrobotRK4(env)
+    s, a = env.state.copy(), 1.0
+    n = 2000
+    t_legacy = min(timeit.repeat(lambda: legacy_step(env, s, a), number=n, repeat=5)) / n
+    t_one = min(timeit.repeat(lambda: integrator.step_one(s, a), number=n, repeat=5)) / n
+    t_env = min(timeit.repeat(lambda: env.step(1), number=n, repeat=5)) / n
+    print("former rk4(_dsdt) path {0:8.2f} us/step".format(1e6 * t_legacy))
+    print("AcrobotRK4.step_one    {0:8.2f} us/step ({1:.1f}x) ; AcrobotEnv.step {2:.2f} us".format(
+        1e6 * t_one, t_legacy / t_one, 1e6 * t_env))
+
+    for size in args.sizes:
+        states, torques = random_states(size, seed=1)
+        out = np.empty_like(states)
+        number = max(1, 20000 // size)
+        t = min(timeit.repeat(lambda: integrator.step(states, torques, out=out), number=number, repeat=5)) / number
+        print("AcrobotRK4.step N {0:6d} {1:8.3f} us/state ({2:7.1f}x), peak {3} bytes allocated".format(
+            size, 1e6 * t / size, t_legacy * size / t, allocated_per_step(integrator, states, torques)))
+
+
+if __name__ == '__main__':
+    main()
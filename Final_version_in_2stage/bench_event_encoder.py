@@ -0,0 +1,91 @@
+"""
+Micro-benchmark : encoding of a Netstation event by egi3.simple._DataFormat.pack (per event
+format strings, many small concatenations) vs. egi3.simple.EventEncoder (precompiled header
+struct, cached keys / label tails, reusable buffer).
+
+The outputs are checked to be byte-identical first, for the events of Session_atari and for
+edge cases (short / long keys, long and non-ASCII labels, descriptions, timestamp limits) ;
+invalid timestamps must fail in both.
+
+    python bench_event_encoder.py
+"""
+import timeit
+
+from egi3.simple import _DataFormat, EventEncoder, ms_localtime
+
+
+def session_events(n_frames=600):
+    """ (key, timestamp, label, description) as sent by openAI_function_atari """
+    t0 = ms_localtime(warnme=False)
+    events = []
+    for t in range(n_frames):
+        events.append(('act' + str(t), t0 + 16 * t, ('left', 'right', 'fire', 'up', 'down')[t % 5], None))
+        if t % 50 == 0:
+            events.append(('reward_stage' + str(t % 7), t0 + 16 * t, 'reward', None))
+    for i in range(12):
+        events.append(('epi' + str(i), t0 + i, 'episode', None))
+        events.append(('reward_epi' + str(i), t0 + i, 'reward', None))
+    events.append(('reward_block3', t0, 'total_r', None))
+    return events
+
+
+def edge_events():
+    return [('ab', 0, None, None), ('abcd', 0x7FFFFFFF, '', ''), ('key', 1, 'x' * 255, 'y' * 300),
+            ('kéy1', 2, 'label éè', 'desc'), ('long_key_name', 3, 'l', 'description'),
+            (b'byte', 4, 'bytes key', None)]
+
+
+def invalid_events():
+    return [('bad1', -1, 'negative', None), ('bad2', 0x80000000, 'too large', None), ('bad3', 5.5, 'float', None)]
+
+
+def check(data_fmt, encoder):
+    n = 0
+    for key, timestamp, label, description in session_events() + edge_events():
+        k = key if isinstance(key, bytes) else bytes(key, 'utf-8')
+        expected = data_fmt.pack(k, timestamp, label, description)
+        got = encoder.pack(key, timestamp, label, description)
+        if got != expected:
+            raise AssertionError('{0!r}: {1!r} != {2!r}'.format(key, got, expected))
+        n += 1
+    for key, timestamp, label, description in invalid_events():
+        errors = []
+        for pack in (lambda: data_fmt.pack(bytes(key, 'utf-8'), timestamp, label, description),
+                     lambda: encoder.pack(key, timestamp, label, description)):
+            try:
+                pack()
+                errors.append(None)
+            except Exception as e:
+                errors.append(type(e))
+        if errors[0] is None or errors[0] != errors[1]:
+            raise AssertionError('{0!r}: {1}'.format(key, errors))
+        n += 1
+    return n
+
+
+def main():
+    data_fmt = _DataFormat()
+    encoder = EventEncoder()
+    n = check(data_fmt, encoder)
+    print("identical output for {0} events (and {1} invalid ones rejected by both)".format(
+        n - len(invalid_events()), len(invalid_events())))
+
+    events = session_events()
+    encoded = [(bytes(key, 'utf-8'), timestamp, label) for key, timestamp, label, _ in events]
+
+    def legacy():
+        for key, timestamp, label in encoded:
+            data_fmt.pack(key, timestamp, label)
+
+    def precompiled():
+        for key, timestamp, label, _ in events:
+            encoder.encode(key, timestamp, label)
+
+    for name, fn in (('_DataFormat.pack', legacy), ('EventEncoder.encode', precompiled)):
+        number = 20
+        best = min(timeit.repeat(fn, number=number, repeat=5)) / (number * len(events))
+        print("{0:20s} {1:7.2f} us / event".format(name, best * 1e6))
+
+
+if __name__ == '__main__':
+    main()
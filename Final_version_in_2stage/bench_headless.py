@@ -0,0 +1,293 @@
+"""
+Headless benchmark of the Atari game loop of Session_atari.
+
+Runs openAI_function_atari itself for one or more blocks of a session, through its seams, without
+keyboard, subject or amplifier :
+  - the AtariEnv of every game renders into a NullImageViewer instead of a pyglet window (viewer_factory),
+    or into the real SimpleImageViewer on an offscreen pyglet context (--presenter pyglet),
+  - the keys come from a seeded script instead of the keyboard (is_pressed),
+  - Netstation events are encoded (egi3.simple.EventEncoder) but not sent (ns),
+  - the waits of the session (60 Hz grid, fixation, rests, score screens) are skipped by a FastClock,
+    the session logic sees the time they would have taken (clock, see session_clock.py) ;
+    --realtime runs on the WallClock, rests included.
+
+The envs are wrapped to time env.step and env.render ; reported are the frames/s of the game loop
+(intervals between the rendered frames of an episode), the step / render / frame latency percentiles
+and the memory growth over the run. The session writes its results and schedule bank into a temporary
+directory. The start / score screens are the pygame windows of the session (display 1), so a display
+is still needed ; on a machine without one, a virtual X server with two screens.
+
+    python bench_headless.py                          # one block of session 1, as fast as possible
+    python bench_headless.py --blocks 3 --json bench.json
+    python bench_headless.py --realtime               # on the 60 Hz grid, 4 min + rest per block
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import gym
+
+from egi3.simple import EventEncoder
+from key_table import GAME_KEYS
+from session_clock import WallClock, FastClock
+
+STAGES = ('step', 'render', 'frame')
+START_KEY = 20  # 't' : start of the session / next block
+
+
+class NullImageViewer(object):
+    """
+    Presenter with the interface of rendering.SimpleImageViewer that draws nothing ;
+    the frame is copied into a preallocated buffer like the retained-mode imshow().
+    The stage score arithmetic (signed rewards, operations) is not reproduced.
+    """
+
+    def __init__(self, width, height, prev, seq, game, order, **kwargs):
+        self.width = width
+        self.height = height
+        self.isopen = True
+        self.frame = None
+        self.n_frames = 0
+        self.reset(prev, seq, game, order)
+
+    def imshow(self, arr):
+        if self.frame is None:
+            self.frame = np.empty_like(arr)
+        np.copyto(self.frame, arr[::-1])
+        self.n_frames += 1
+
+    def update(self, reward):
+        self.cur += reward
+
+    def img_update(self, seq, prev, order):
+        self.sequence = seq
+        self.comp = seq[0]
+        self.order = order
+        self.prev = prev
+        self.cur = 0
+
+    def reset(self, prev, seq, game, order):
+        self.game = game
+        self.img_update(seq, prev, order)
+
+    def get_cur(self):
+        return int(self.cur)
+
+    def release(self):
+        total = int(self.cur)
+        self.cur = 0
+        return total
+
+    def close(self):
+        self.isopen = False
+        return int(self.cur)
+
+
+class NullNetstation(object):
+    """ egi3.threaded.Netstation stand-in : events are encoded as for the socket, then dropped """
+
+    def __init__(self):
+        self._encoder = EventEncoder()
+        self.n_events = 0
+        self.n_bytes = 0
+        self.error = None
+
+    def connect(self, str_address, port_no):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def sync(self, timestamp=None):
+        return True
+
+    def StartRecording(self):
+        return True
+
+    def StopRecording(self):
+        return True
+
+    def EndSession(self):
+        return True
+
+    def send_event(self, key, timestamp=None, label=None, description=None, table=None, pad=False):
+        message = self._encoder.encode(key, timestamp, label, description, table, pad)
+        self.n_events += 1
+        self.n_bytes += len(message)
+        return True
+
+    def summary(self):
+        return "Netstation (not sent) : {0} events, {1} bytes".format(self.n_events, self.n_bytes)
+
+
+class ScriptedKeys(object):
+    """
+    Seeded key script replacing keyboard.is_pressed : every 'hold' frames (60 Hz, on the session
+    clock) a new set of zero to three game keys is held, roughly like a subject playing ; the
+    start key is always down, the start / next block screens go on at once.
+    """
+
+    def __init__(self, clock, seed=0, hold=(3, 30)):
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.hold = hold
+        self.codes = [code for code, name in GAME_KEYS if name != 'h']
+        self.pressed = frozenset()
+        self.t_next = -np.inf
+
+    def is_pressed(self, code):
+        if code == START_KEY:
+            return True
+        now = self.clock.now()
+        if now >= self.t_next:
+            n = self.rng.choice((0, 1, 1, 2, 2, 3))
+            self.pressed = frozenset(self.rng.sample(self.codes, n))
+            self.t_next = now + self.rng.randint(*self.hold) / 60.
+        return code in self.pressed
+
+
+class TimedEnv(gym.Wrapper):
+    """ env of the session with the time of every step / render and the intervals of its frames """
+
+    def __init__(self, env, timings):
+        super(TimedEnv, self).__init__(env)
+        self.timings = timings
+        self._t_frame = None
+
+    def reset(self, **kwargs):
+        self._t_frame = None  # no interval across episodes
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        t0 = time.perf_counter()
+        result = self.env.step(action)
+        self.timings['step'].append(time.perf_counter() - t0)
+        return result
+
+    def render(self, mode='human', **kwargs):
+        t0 = time.perf_counter()
+        result = self.env.render(mode, **kwargs)
+        t1 = time.perf_counter()
+        self.timings['render'].append(t1 - t0)
+        if self._t_frame is not None:
+            self.timings['frame'].append(t1 - self._t_frame)
+        self._t_frame = t1
+        return result
+
+
+def rss_bytes():
+    """ current resident set size (Linux), or the peak RSS elsewhere """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentiles(samples):
+    if len(samples) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'n': int(len(samples)), 'mean_ms': 1000 * float(np.mean(samples)), 'p50_ms': 1000 * float(p50),
+            'p95_ms': 1000 * float(p95), 'p99_ms': 1000 * float(p99), 'max_ms': 1000 * float(np.max(samples))}
+
+
+def run_session(part=0, session=1, n_blocks=1, realtime=False, presenter='null', seed=0, trace_memory=False):
+    direc = tempfile.mkdtemp(prefix='bench_headless_')
+    cwd = os.getcwd()
+    os.chdir(direc)  # result_save/, SESS_atari/ of the run
+    try:
+        from Session_atari import openAI_function_atari
+
+        random.seed(seed)
+        np.random.seed(seed)
+        clock = WallClock() if realtime else FastClock()
+        keys = ScriptedKeys(clock, seed)
+        ns = NullNetstation()
+        timings = {stage: [] for stage in STAGES}
+
+        if trace_memory:
+            tracemalloc.start()
+        rss_start = rss_bytes()
+        t_start = time.perf_counter()
+        openAI_function_atari(part, session, ns=ns, make_env=lambda env_name: TimedEnv(gym.make(env_name), timings),
+                              viewer_factory=NullImageViewer if presenter == 'null' else None,
+                              is_pressed=keys.is_pressed, clock=clock, n_blocks=n_blocks)
+        t_total = time.perf_counter() - t_start
+        rss_end = rss_bytes()
+        traced = tracemalloc.get_traced_memory() if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(direc, ignore_errors=True)
+
+    frame = np.array(timings['frame'])
+    report = {
+        'part': part, 'session': session, 'blocks': n_blocks, 'realtime': realtime, 'presenter': presenter,
+        'seconds': t_total, 'frames': len(timings['render']),
+        'fps': len(frame) / frame.sum() if len(frame) else float('nan'),
+        'skipped_wait_s': clock.skipped if not realtime else 0.0,
+        'stages': {stage: percentiles(timings[stage]) for stage in STAGES},
+        'events': ns.n_events, 'event_bytes': ns.n_bytes,
+        'rss_start_mb': rss_start / 2 ** 20, 'rss_end_mb': rss_end / 2 ** 20,
+        'rss_growth_mb': (rss_end - rss_start) / 2 ** 20,
+    }
+    if traced is not None:
+        report['python_alloc_current_mb'] = traced[0] / 2 ** 20
+        report['python_alloc_peak_mb'] = traced[1] / 2 ** 20
+    return report
+
+
+def print_report(report):
+    print("subject {0}, session {1}, {2} block(s) : {3} frames in {4:.1f} s, game loop {5:.1f} frames/s "
+          "({6} presenter{7})".format(report['part'], report['session'], report['blocks'], report['frames'],
+                                      report['seconds'], report['fps'], report['presenter'],
+                                      ', real time' if report['realtime'] else ''))
+    if not report['realtime']:
+        print("  waits skipped : {0:.1f} s".format(report['skipped_wait_s']))
+    for stage, s in report['stages'].items():
+        print("  {0:8s} mean {1:7.3f}  p50 {2:7.3f}  p95 {3:7.3f}  p99 {4:7.3f}  max {5:7.3f} ms".format(
+            stage, s['mean_ms'], s['p50_ms'], s['p95_ms'], s['p99_ms'], s['max_ms']))
+    print("  events sent: {0} ({1} bytes)".format(report['events'], report['event_bytes']))
+    print("  RSS {0:.1f} -> {1:.1f} MB (growth {2:.1f} MB)".format(
+        report['rss_start_mb'], report['rss_end_mb'], report['rss_growth_mb']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--part', type=int, default=0, help='subject number (schedule of the blocks)')
+    parser.add_argument('--session', type=int, default=1, help='session number, 1 - 3')
+    parser.add_argument('--blocks', type=int, default=1, help='blocks to run (4 min of game each)')
+    parser.add_argument('--realtime', action='store_true', help='real waits (WallClock) instead of FastClock')
+    parser.add_argument('--presenter', choices=('null', 'pyglet'), default='null',
+                        help="'pyglet' : real SimpleImageViewer on a headless (EGL) pyglet context")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help='also trace Python allocations')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    if args.presenter == 'pyglet':
+        import pyglet
+        pyglet.options['headless'] = True
+
+    report = run_session(args.part, args.session, args.blocks, args.realtime, args.presenter, args.seed,
+                         args.trace_memory)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+if __name__ == '__main__':
+    main()
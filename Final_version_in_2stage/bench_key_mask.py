@@ -0,0 +1,126 @@
+"""
+Micro-benchmark : reading the game keys once per frame with one keyboard.is_pressed call per key
+(the former KeyActionTable.read_mask, 6 calls and 12 lock acquisitions per frame) vs. the bitmask
+reader keyboard.pressed_mask_reader (scan codes resolved once, one lock acquisition per read).
+
+The key state is written into keyboard._pressed_events the way the listener thread does it
+(under keyboard._pressed_events_lock), so the benchmark runs without the OS hook (root on Linux) ;
+both readers are checked to give the same mask for every combination of the game keys first.
+
+  - idle      : nothing, two and all six game keys held,
+  - contended : a thread standing in for the listener presses / releases game keys at --event-rate
+                while the game loop reads ; per-read latency percentiles.
+
+    python bench_key_mask.py
+    python bench_key_mask.py --event-rate 2000 --seconds 2
+"""
+import time
+import timeit
+import random
+import argparse
+import threading
+import numpy as np
+
+import keyboard as pykb
+from keyboard._keyboard_event import KeyboardEvent, KEY_DOWN, KEY_UP
+from key_table import GAME_KEYS
+
+CODES = tuple(code for code, _ in GAME_KEYS)
+
+
+def _timing(samples):
+    """ mean / p50 / p99 / max in ms """
+    if len(samples) == 0:
+        return {}
+    p50, p99 = np.percentile(samples, [50, 99])
+    return {'n': len(samples), 'mean_ms': 1000 * float(np.mean(samples)), 'p50_ms': 1000 * float(p50),
+            'p99_ms': 1000 * float(p99), 'max_ms': 1000 * float(np.max(samples))}
+
+
+def set_keys(event_type, codes):
+    """ what the listener does with an OS event, for each of 'codes' """
+    with pykb._pressed_events_lock:
+        for code in codes:
+            if event_type == KEY_DOWN:
+                pykb._pressed_events[code] = KeyboardEvent(KEY_DOWN, code)
+            else:
+                pykb._pressed_events.pop(code, None)
+
+
+def per_key_mask():
+    """ the former KeyActionTable.read_mask """
+    mask = 0
+    for bit, code in enumerate(CODES):
+        if pykb.is_pressed(code):
+            mask |= 1 << bit
+    return mask
+
+
+def check(read_mask):
+    for mask in range(1 << len(CODES)):
+        set_keys(KEY_UP, CODES)
+        set_keys(KEY_DOWN, [code for bit, code in enumerate(CODES) if mask & (1 << bit)])
+        assert per_key_mask() == mask and read_mask() == mask, (mask, per_key_mask(), read_mask())
+    set_keys(KEY_UP, CODES)
+
+
+def listener(stop, rate, seed=0):
+    """ presses / releases a random game key 'rate' times per second """
+    rng = random.Random(seed)
+    period = 1.0 / rate
+    t_next = time.perf_counter()
+    while not stop.is_set():
+        code = rng.choice(CODES)
+        set_keys(KEY_UP if code in pykb._pressed_events else KEY_DOWN, [code])
+        t_next += period
+        delay = t_next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def contended(fn, seconds, rate):
+    stop = threading.Event()
+    thread = threading.Thread(target=listener, args=(stop, rate), daemon=True)
+    thread.start()
+    samples = []
+    t_end = time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    stop.set()
+    thread.join()
+    set_keys(KEY_UP, CODES)
+    return _timing(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('-n', type=int, default=20000, help='reads per timing')
+    parser.add_argument('--seconds', type=float, default=1.0, help='duration of each contended run')
+    parser.add_argument('--event-rate', type=float, default=1000, help='key events/s of the contended run')
+    args = parser.parse_args(argv)
+
+    # the OS hook is not needed : the key state is written directly
+    pykb._listener.listening = True
+    read_mask = pykb.pressed_mask_reader(CODES)
+    check(read_mask)
+    print("same mask for all {0} key combinations".format(1 << len(CODES)))
+
+    readers = (('is_pressed x{0}'.format(len(CODES)), per_key_mask), ('pressed_mask_reader', read_mask))
+    for held in (0, 2, len(CODES)):
+        set_keys(KEY_DOWN, CODES[:held])
+        times = [min(timeit.repeat(fn, number=args.n, repeat=5)) / args.n for _, fn in readers]
+        set_keys(KEY_UP, CODES)
+        print("{0} keys held : {1} {2:6.2f} us, {3} {4:6.2f} us ({5:.1f}x)".format(
+            held, readers[0][0], 1e6 * times[0], readers[1][0], 1e6 * times[1], times[0] / times[1]))
+
+    print("contended, {0:g} key events/s :".format(args.event_rate))
+    for name, fn in readers:
+        t = contended(fn, args.seconds, args.event_rate)
+        print("  {0:20s} mean {1:.4f} / p50 {2:.4f} / p99 {3:.4f} / max {4:.3f} ms".format(
+            name, t['mean_ms'], t['p50_ms'], t['p99_ms'], t['max_ms']))
+
+
+if __name__ == '__main__':
+    main()
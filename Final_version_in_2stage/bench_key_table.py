@@ -0,0 +1,138 @@
+"""
+Micro-benchmark : per-frame cost of the former list based key_processing() logic
+vs. the precompiled KeyActionTable (key_table.py).
+
+keyboard.is_pressed is replaced by a fake reading a random key state, so the
+benchmark runs without a keyboard hook ; both paths call it for the same keys
+(the table gets it as its 'is_pressed'). See bench_key_mask.py for the cost of the
+key reads themselves.
+The outputs of both paths are checked to be identical for every key combination.
+
+    python bench_key_table.py
+"""
+import random
+import timeit
+import numpy as np
+
+import keyboard as pykb
+from key_table import KeyActionTable, GAME_KEYS, NO_UP_DOWN, action_space_from_meanings
+
+# minimal action sets (ALE action meanings) of the games used in the sessions
+GAME_MEANINGS = {
+    'Seaquest-v0': ['NOOP', 'FIRE', 'UP', 'RIGHT', 'LEFT', 'DOWN', 'UPRIGHT', 'UPLEFT', 'DOWNRIGHT', 'DOWNLEFT',
+                    'UPFIRE', 'RIGHTFIRE', 'LEFTFIRE', 'DOWNFIRE', 'UPRIGHTFIRE', 'UPLEFTFIRE', 'DOWNRIGHTFIRE',
+                    'DOWNLEFTFIRE'],
+    'MsPacman-v0': ['NOOP', 'UP', 'RIGHT', 'LEFT', 'DOWN', 'UPRIGHT', 'UPLEFT', 'DOWNRIGHT', 'DOWNLEFT'],
+    'SpaceInvaders-v0': ['NOOP', 'FIRE', 'RIGHT', 'LEFT', 'RIGHTFIRE', 'LEFTFIRE'],
+}
+
+def legacy_key_processing(env_name, keyss, action_space):
+    """ the per-frame work of the former key_processing() (ns=None, uncertainty=0) """
+    if env_name != 'Enduro-v0' and env_name != 'SpaceInvaders-v0' and env_name != 'Breakout-v0':
+        if pykb.is_pressed(31):
+            keyss.append('s')
+        if pykb.is_pressed(17):
+            keyss.append('w')
+    if pykb.is_pressed(32):
+        keyss.append('d')
+    if pykb.is_pressed(30):
+        keyss.append('a')
+    if pykb.is_pressed(38):
+        keyss.append('l')
+    if pykb.is_pressed(35):
+        keyss.append('h')
+
+    if len(keyss) > 1:
+        if 'a' in keyss and 'd' in keyss:
+            keyss.remove('a')
+            keyss.remove('d')
+        if 'w' in keyss and 's' in keyss:
+            keyss.remove('w')
+            keyss.remove('s')
+
+    final_len = len(keyss)
+
+    ll = list(action_space.keys())
+    if 'l' not in keyss:
+        del_list = []
+        for key in ll:
+            l_key = list(key)
+            if 'l' in l_key:
+                del_list.append(key)
+        for i in del_list:
+            ll.remove(i)
+    ll_random = random.sample(ll, 1)
+    action_random = action_space[ll_random[0]]
+
+    if final_len == 0:
+        return 0, np.nan
+    elif final_len == 1:
+        if keyss[0] in action_space.keys():
+            return action_space[keyss[0]], keyss[0]
+        return 0, None
+    elif final_len == 2:
+        action_pre = [keyss[0], keyss[1]]
+        action_pre.sort()
+        if tuple(action_pre) in action_space.keys():
+            return action_space[tuple(action_pre)], (keyss[0], keyss[1])
+        return action_space[keyss[0]], keyss[0]
+    else:
+        action_pre = [keyss[0], keyss[1], keyss[2]]
+        action_pre.sort()
+        if tuple(action_pre) in action_space.keys():
+            return action_space[tuple(action_pre)], (keyss[0], keyss[1], keyss[2])
+        if 'l' in action_pre:
+            action_pre.remove('l')
+            for i in range(len(keyss)):
+                if keyss[i] == 'l':
+                    keyss.pop(i)
+                    break
+            actual_act = [keyss[0], 'l']
+            actual_act.sort()
+            return action_space[tuple(actual_act)], (keyss[0], 'l')
+        return action_space[keyss[0]], keyss[0]
+
+
+_pressed = set()
+
+
+def _fake_is_pressed(code):
+    return code in _pressed
+
+
+def check_parity(env_name, action_space, table):
+    for mask in range(len(table)):
+        _pressed.clear()
+        _pressed.update(code for bit, code in enumerate(table.scan_codes) if mask & (1 << bit))
+        try:
+            expected = legacy_key_processing(env_name, [], action_space)
+        except (KeyError, TypeError):
+            continue  # the former code raised here (e.g. 'h' alone) ; the table falls back to NOOP
+        action, log_label, _ = table.lookup(table.read_mask())
+        same_label = (log_label == expected[1]) or (isinstance(log_label, float) and isinstance(expected[1], float)
+                                                    and np.isnan(log_label) and np.isnan(expected[1]))
+        assert action == expected[0] and same_label, (env_name, mask, expected, (action, log_label))
+
+
+def main(n=20000):
+    pykb.is_pressed = _fake_is_pressed
+    rng = random.Random(0)
+    codes = [code for code, _ in GAME_KEYS]
+
+    for env_name, meanings in GAME_MEANINGS.items():
+        action_space = action_space_from_meanings(meanings)
+        table = KeyActionTable(env_name, action_space, is_pressed=_fake_is_pressed)
+        check_parity(env_name, action_space, table)
+
+        # a typical key state : one or two keys held
+        _pressed.clear()
+        _pressed.update(rng.sample([c for c in codes if c != 35 and (env_name not in NO_UP_DOWN or c not in (31, 17))], 2))
+
+        t_legacy = min(timeit.repeat(lambda: legacy_key_processing(env_name, [], action_space), number=n, repeat=5)) / n
+        t_table = min(timeit.repeat(lambda: table.lookup(table.read_mask()), number=n, repeat=5)) / n
+        print("{0:18s} legacy {1:6.2f} us/frame, table {2:6.2f} us/frame ({3:.1f}x), parity ok".format(
+            env_name, 1e6 * t_legacy, 1e6 * t_table, t_legacy / t_table))
+
+
+if __name__ == '__main__':
+    main()
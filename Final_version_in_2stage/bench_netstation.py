@@ -0,0 +1,170 @@
+"""
+Benchmark of the Netstation clients (egi3.simple, egi3.threaded) against the local ECI stand-in
+server (egi3/eci_server.py), without the amplifier.
+
+For every client :
+  - latency    : events at the game loop rate (--rate) ; time spent in send_event() by the caller,
+                 time from the call to the arrival at the server, and the command round trip,
+  - throughput : --burst events as fast as the client takes them ; events/s until the last reply
+                 (the threaded client waits for a free queue slot here instead of dropping),
+  - packets    : every event received by the server is compared field by field and byte by byte
+                 with egi3.simple._DataFormat.pack() of what was sent, in order.
+
+--reply-delay adds a delay before every reply of the server, standing in for the network and Netstation.
+
+    python bench_netstation.py
+    python bench_netstation.py --reply-delay 0.002 --events 1200 --json netstation.json
+"""
+import json
+import time
+import argparse
+import numpy as np
+
+from egi3 import simple, threaded
+from egi3.eci_server import EciServer
+
+CLIENTS = ('simple', 'threaded')
+LABELS = ('left', 'right', 'fire', 'reward', 'episode')
+
+
+def _timing(samples):
+    """ mean / p50 / p99 / max in ms """
+    if len(samples) == 0:
+        return {}
+    p50, p99 = np.percentile(samples, [50, 99])
+    return {'n': len(samples), 'mean_ms': 1000 * float(np.mean(samples)), 'p50_ms': 1000 * float(p50),
+            'p99_ms': 1000 * float(p99), 'max_ms': 1000 * float(np.max(samples))}
+
+
+def make_events(n, seed=0):
+    """ (key, timestamp, label) like the events of Session_atari ; the label ends with the event index """
+    rng = np.random.RandomState(seed)
+    t0 = simple.ms_localtime(warnme=False)
+    keys = ('act', 'epi', 'rewa')
+    return [(keys[i % 3] + str(i), t0 + 16 * i, LABELS[rng.randint(len(LABELS))] + str(i)) for i in range(n)]
+
+
+def make_client(name, reply_timeout):
+    if name == 'simple':
+        return simple.Netstation()
+    return threaded.Netstation(block_timeout=0.0, reply_timeout=reply_timeout)
+
+
+def check_packets(received, sent):
+    """ compare the events received by the server with the sent ones ; returns the list of problems """
+    data_fmt = simple._DataFormat()
+    problems = []
+    if len(received) != len(sent):
+        problems.append('{0} events sent, {1} received'.format(len(sent), len(received)))
+    for i, (record, (key, timestamp, label)) in enumerate(zip(received, sent)):
+        expected = data_fmt.pack(bytes(key, 'utf-8'), timestamp, label, None, None, False)
+        if record['raw'] != expected:
+            fields = (record['key'], record['timestamp'], record['label'])
+            problems.append('event {0}: received {1}, sent {2}'.format(i, fields, (key[:4], timestamp, label)))
+        if len(problems) > 10:
+            break
+    return problems
+
+
+def run_client(name, server, n_events, n_burst, rate, reply_timeout):
+    ns = make_client(name, reply_timeout)
+    ns.connect(server.host, server.port)
+    ns.sync()
+    ns.StartRecording()
+    server.clear()
+
+    # latency : one event per frame of the game loop
+    events = make_events(n_events)
+    call, t_call = [], []
+    period = 1.0 / rate if rate > 0 else 0.0
+    t_next = time.perf_counter()
+    sent = []
+    for key, timestamp, label in events:
+        t0 = time.perf_counter()
+        queued = ns.send_event(key, timestamp=timestamp, label=label)
+        t1 = time.perf_counter()
+        call.append(t1 - t0)
+        if queued is not False:  # simple.send_event returns the reply, threaded False on a full queue
+            sent.append((key, timestamp, label))
+            t_call.append(t0)
+        t_next += period
+        delay = t_next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    ns.StopRecording()  # waits for the events before it
+    received = server.events()
+    delivery = [r['t'] - t for r, t in zip(received, t_call)]
+    problems = check_packets(received, sent)
+    dropped = len(events) - len(sent)
+
+    # throughput : as fast as possible
+    server.clear()
+    ns.StartRecording()
+    if name == 'threaded':
+        ns.block_timeout = reply_timeout
+    burst = make_events(n_burst, seed=1)
+    t0 = time.perf_counter()
+    for key, timestamp, label in burst:
+        ns.send_event(key, timestamp=timestamp, label=label)
+    ns.StopRecording()
+    elapsed = time.perf_counter() - t0
+    problems += check_packets(server.events(), burst)
+
+    ns.EndSession()
+    ns.disconnect()
+
+    report = {'call': _timing(call), 'delivery': _timing(delivery), 'dropped': dropped,
+              'events_per_s': n_burst / elapsed, 'problems': problems}
+    if name == 'simple':
+        report['round_trip'] = report['call']  # send_event() waits for the reply
+    else:
+        report['round_trip'] = _timing(ns.rtt)
+        report['client'] = ns.stats()
+    return report
+
+
+def print_report(reports, args):
+    print("reply delay {0:.1f} ms, {1} events at {2} Hz, {3} burst events".format(
+        1000 * args.reply_delay, args.events, args.rate, args.burst))
+    print("{0:10s} {1:>26s} {2:>26s} {3:>26s} {4:>10s} {5:>8s} {6:>8s}".format(
+        'client', 'send_event mean/p99/max', 'call->server mean/p99', 'round trip mean/p99', 'events/s',
+        'dropped', 'packets'))
+    for name, r in reports.items():
+        print("{0:10s} {1:>26s} {2:>26s} {3:>26s} {4:10.0f} {5:8d} {6:>8s}".format(
+            name,
+            '{0:.3f} / {1:.3f} / {2:.3f} ms'.format(r['call']['mean_ms'], r['call']['p99_ms'], r['call']['max_ms']),
+            '{0:.3f} / {1:.3f} ms'.format(r['delivery']['mean_ms'], r['delivery']['p99_ms']),
+            '{0:.3f} / {1:.3f} ms'.format(r['round_trip']['mean_ms'], r['round_trip']['p99_ms']),
+            r['events_per_s'], r['dropped'], 'ok' if not r['problems'] else 'WRONG'))
+        for problem in r['problems']:
+            print("    " + problem)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clients', nargs='+', choices=CLIENTS, default=list(CLIENTS))
+    parser.add_argument('--events', type=int, default=600, help='events of the latency part')
+    parser.add_argument('--rate', type=float, default=60, help='events/s of the latency part (0 : no pause)')
+    parser.add_argument('--burst', type=int, default=5000, help='events of the throughput part')
+    parser.add_argument('--reply-delay', type=float, default=0.0, help='seconds before every server reply')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args(argv)
+
+    server = EciServer(reply_delay=args.reply_delay)
+    reports = {}
+    try:
+        for name in args.clients:
+            reports[name] = run_client(name, server, args.events, args.burst, args.rate, reply_timeout=30.0)
+    finally:
+        server.close()
+    if server.errors:
+        print("server errors : {0}".format(server.errors))
+
+    print_report(reports, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Frame rate of the numpy rasterizer (gym_task/envs/rasterizer.py) rendering rgb_array frames of the
+gym_task envs without GL : one frame per call (CartPoleEnv etc. with software_rendering) and the
+batched render() of the vector envs (VectorCartPole, VectorMountainCar, VectorAcrobot), into a
+preallocated (N, height, width, 3) uint8 array.
+
+First the frames of a vector env must be those of the single env in the same states. With --gl
+the software frames are also compared to the GL viewer (rendering.py, needs an OpenGL context,
+PYGLET_HEADLESS=true without display) : the pixels differ only on some edges and line joints.
+
+    python bench_rasterizer.py
+    PYGLET_HEADLESS=true python bench_rasterizer.py --gl --sizes 1 16 64
+"""
+import time
+import argparse
+import numpy as np
+
+from gym_task.envs import CartPoleEnv, MountainCarEnv, AcrobotEnv, VectorCartPole, VectorMountainCar, VectorAcrobot
+
+ENVS = {'cartpole': (CartPoleEnv, VectorCartPole), 'mountaincar': (MountainCarEnv, VectorMountainCar),
+        'acrobot': (AcrobotEnv, VectorAcrobot)}
+
+
+def make_env(make_scalar, software=True):
+    env = make_scalar()
+    env.software_rendering = software
+    env.reset()
+    return env
+
+
+def random_states(make_vector, n, n_steps=20, seed=0):
+    """ a vector env of n envs after n_steps random steps """
+    rng = np.random.RandomState(seed)
+    vector = make_vector(n)
+    vector.seed(seed)
+    vector.reset()
+    for _ in range(n_steps):
+        vector.step(rng.randint(vector.single_action_space.n, size=n))
+    return vector
+
+
+def check(name, n, gl):
+    """ vector frames == single env software frames ; (max, mean) pixels differing from GL """
+    make_scalar, make_vector = ENVS[name]
+    vector = random_states(make_vector, n)
+    frames = vector.render()
+    software = make_env(make_scalar)
+    opengl = make_env(make_scalar, software=False) if gl else None
+    differing = []
+    for i in range(n):
+        software.state = vector.state[i].copy()
+        frame = software.render(mode='rgb_array')
+        assert np.array_equal(frame, frames[i]), (name, i)
+        if opengl is not None:
+            opengl.state = vector.state[i].copy()
+            differing.append(int(np.any(opengl.render(mode='rgb_array') != frame, axis=2).sum()))
+    software.close()
+    vector.close()
+    if opengl is not None:
+        opengl.close()
+        return max(differing), float(np.mean(differing))
+
+
+def frame_time(render, seconds=0.5):
+    """ s per call of render(), after a first one """
+    render()
+    calls, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        render()
+        calls += 1
+    return (time.perf_counter() - t0) / calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--gl', action='store_true', help='compare with the frames of the GL viewer')
+    parser.add_argument('--envs', type=int, default=16, help='envs of the check')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 64], help='N of the vector renders')
+    args = parser.parse_args(argv)
+
+    for name in ENVS:
+        differing = check(name, args.envs, args.gl)
+        print("{0:12s} {1} vector frames == single env frames".format(name, args.envs), end='')
+        print(" ; GL differing pixels max {0} mean {1:.1f}".format(*differing) if args.gl else "")
+
+    for name, (make_scalar, make_vector) in ENVS.items():
+        env = make_env(make_scalar)
+        t_single = frame_time(lambda: env.render(mode='rgb_array'))
+        height, width = env.viewer.height, env.viewer.width
+        env.close()
+        print("{0:12s} {1}x{2} single env {3:7.3f} ms/frame".format(name, width, height, 1e3 * t_single))
+        for n in args.sizes:
+            vector = random_states(make_vector, n)
+            out = np.empty((n, height, width, 3), dtype=np.uint8)
+            t = frame_time(lambda: vector.render(out=out))
+            vector.close()
+            print("{0:12s} N {1:4d} : {2:8.2f} ms/render, {3:7.3f} ms/frame ({4:6.0f} frames/s)".format(
+                name, n, 1e3 * t, 1e3 * t / n, n / t))
+
+
+if __name__ == '__main__':
+    main()
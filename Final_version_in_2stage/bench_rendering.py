@@ -0,0 +1,193 @@
+"""
+Frame time of the gym_task Viewer : retained mode (vertex arrays of the geoms built once,
+transformed on the CPU and drawn with a few glDrawElements per frame, see _RetainedGeoms)
+vs. the former immediate mode (retained=False, glBegin / glVertex for every geom every
+frame), offscreen at the viewer size.
+
+Scenes : an empty 1920x1080 viewer (clear only : the floor of the GL implementation), the
+mountain car env (1920x1080 viewer) and a synthetic 1920x1080 scene of --geoms capsules,
+polylines and lines that move every frame. Both modes must give the same pixels first
+(rgb_array of a few frames) ; then per frame :
+
+  - submit   : Viewer.render() alone (CPU time of the frame, the GPU may still be drawing),
+  - draw     : Viewer.render() + glFinish (the GPU work is waited for),
+  - readback : Viewer.render(return_rgb_array=True, out=...) into a preallocated array.
+
+The target of a frame "well under a millisecond at 1920x1080" is NOT met on a software
+renderer. On llvmpipe (1 core, python -O, --frames 100, mean) :
+
+                       submit retained / immediate   draw retained / immediate
+    empty                   0.05 / 0.04 ms                0.8 / 1.2 ms
+    mountaincar             0.64 / 0.64 ms                1.9 / 2.4 ms
+    synthetic x200          4.0 / 14.5 ms                 8.1 / 21.6 ms
+
+so clearing the 1920x1080 frame alone takes most of the millisecond there. Retained mode
+takes the per-geom GL calls off the CPU (the synthetic scene alternates filled and line
+geoms, 200 draw calls of about 5000 vertices, ~1 ms of numpy for 267 Transforms) ; whether a
+frame is well under a millisecond depends on the GPU, so run this bench on the machine of
+the experiment.
+
+Needs an OpenGL context ; on a machine without display PYGLET_HEADLESS=true. pyglet checks
+glGetError after every GL call unless python runs with -O (pyglet.options['debug_gl']), which
+costs more in immediate mode (several GL calls per geom) than in retained mode.
+
+    PYGLET_HEADLESS=true python -O bench_rendering.py
+    PYGLET_HEADLESS=true python bench_rendering.py --geoms 500 --frames 300
+"""
+import math
+import time
+import argparse
+import numpy as np
+
+from gym_task.envs import rendering
+from gym_task.envs.mountaincar import MountainCarEnv
+
+
+def _timing(samples):
+    """ mean / p50 / p99 / max in ms """
+    if len(samples) == 0:
+        return {}
+    p50, p99 = np.percentile(samples, [50, 99])
+    return {'n': len(samples), 'mean_ms': 1000 * float(np.mean(samples)), 'p50_ms': 1000 * float(p50),
+            'p99_ms': 1000 * float(p99), 'max_ms': 1000 * float(np.max(samples))}
+
+
+class MountainCarScene(object):
+    """ MountainCarEnv.render, offscreen ; the car moves along the track """
+
+    def __init__(self, retained):
+        self.env = MountainCarEnv()
+        self.env.seed(0)
+        self.env.reset()
+        # the env builds its viewer in the first render() ; retained=False is passed through
+        viewer_class = rendering.Viewer
+        rendering.Viewer = lambda *args, **kwargs: viewer_class(*args, retained=retained, **kwargs)
+        try:
+            self.env.render(mode='rgb_array')
+        finally:
+            rendering.Viewer = viewer_class
+        self.viewer = self.env.viewer
+
+    def update(self, t):
+        self.env.state = np.array([-0.5 + 0.6 * math.sin(0.05 * t), 0.0])
+
+    def render(self, return_rgb_array=False, out=None):
+        return self.viewer.render(return_rgb_array=return_rgb_array, out=out)
+
+    def close(self):
+        self.env.close()
+
+
+class EmptyScene(object):
+    """ a viewer without geoms : clear and (readback) read the frame """
+
+    def __init__(self, retained, width=1920, height=1080):
+        self.viewer = rendering.Viewer(width, height, visible=False, retained=retained)
+
+    def update(self, t):
+        pass
+
+    def render(self, return_rgb_array=False, out=None):
+        return self.viewer.render(return_rgb_array=return_rgb_array, out=out)
+
+    def close(self):
+        self.viewer.close()
+
+
+class SyntheticScene(object):
+    """ n geoms (capsules, closed polylines, lines) with their own Transform, in 1920x1080 """
+
+    def __init__(self, retained, n, width=1920, height=1080, seed=0):
+        rng = np.random.RandomState(seed)
+        self.viewer = rendering.Viewer(width, height, visible=False, retained=retained)
+        self.transforms = []
+        self.positions = rng.uniform((0, 0), (width, height), size=(n, 2))
+        self.speeds = rng.uniform(-0.05, 0.05, size=n)
+        for i in range(n):
+            kind = i % 3
+            if kind == 0:
+                geom = rendering.make_capsule(rng.uniform(20, 80), rng.uniform(6, 20))
+            elif kind == 1:
+                geom = rendering.make_polygon(rng.uniform(-30, 30, size=(6, 2)).tolist(), filled=False)
+                geom.set_linewidth(2)
+            else:
+                geom = rendering.Line((0, 0), tuple(rng.uniform(-60, 60, size=2)))
+            geom.set_color(*rng.uniform(0, 1, size=3))
+            transform = rendering.Transform(translation=self.positions[i])
+            geom.add_attr(transform)
+            self.viewer.add_geom(geom)
+            self.transforms.append(transform)
+
+    def render(self, return_rgb_array=False, out=None):
+        return self.viewer.render(return_rgb_array=return_rgb_array, out=out)
+
+    def update(self, t):
+        for transform, speed in zip(self.transforms, self.speeds):
+            transform.set_rotation(speed * t)
+
+    def close(self):
+        self.viewer.close()
+
+
+def check(make_scene, frames=5):
+    """ number of differing pixels between retained and immediate mode over a few frames """
+    scenes = make_scene(True), make_scene(False)
+    differing = 0
+    for t in range(frames):
+        arrs = []
+        for scene in scenes:
+            scene.update(t)
+            arrs.append(scene.render(return_rgb_array=True))
+        differing += int(np.any(arrs[0] != arrs[1], axis=2).sum())
+    for scene in scenes:
+        scene.close()
+    return differing, arrs[0].shape
+
+
+def run(scene, frames, timing):
+    """ timing : 'submit', 'draw' or 'readback' """
+    out = np.empty((scene.viewer.height, scene.viewer.width, 3), dtype=np.uint8) if timing == 'readback' else None
+    samples = []
+    for t in range(frames + 10):
+        scene.update(t)
+        rendering.glFinish()  # the former frame is not timed
+        t0 = time.perf_counter()
+        if timing == 'readback':
+            scene.render(return_rgb_array=True, out=out)
+        else:
+            scene.render()
+            if timing == 'draw':
+                rendering.glFinish()
+        if t >= 10:  # warm-up
+            samples.append(time.perf_counter() - t0)
+    return _timing(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--geoms', type=int, default=200, help='geoms of the synthetic scene')
+    parser.add_argument('--frames', type=int, default=200, help='frames per timing')
+    args = parser.parse_args(argv)
+
+    renderer = rendering.gl_info.get_renderer()
+    print("GL renderer : {0}".format(renderer))
+    scenes = (('empty', EmptyScene),
+              ('mountaincar', MountainCarScene),
+              ('synthetic x{0}'.format(args.geoms), lambda retained: SyntheticScene(retained, args.geoms)))
+
+    for name, make_scene in scenes:
+        differing, shape = check(make_scene)
+        assert differing == 0, (name, differing)
+        print("{0} {1}x{2} : retained and immediate mode give the same pixels".format(name, shape[1], shape[0]))
+        for timing in ('submit', 'draw', 'readback'):
+            for retained in (False, True):
+                scene = make_scene(retained)
+                t = run(scene, args.frames, timing)
+                scene.close()
+                print("  {0:8s} {1:9s} mean {2:7.3f} / p50 {3:7.3f} / p99 {4:7.3f} / max {5:7.3f} ms".format(
+                    timing, 'retained' if retained else 'immediate',
+                    t['mean_ms'], t['p50_ms'], t['p99_ms'], t['max_ms']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Parity check and throughput of the vectorized gym_task environments (VectorCartPole,
+VectorMountainCar, VectorAcrobot) against the single-env classes (CartPoleEnv, MountainCarEnv,
+AcrobotEnv).
+
+Parity : N scalar envs (in gym.wrappers.TimeLimit when --max-steps is given) start from the
+states of the vector env and get the same actions ; every step the observations, rewards and
+done flags must agree (observations to --atol), the terminal observations of auto-reset
+episodes included. A scalar env that is done continues from the state the vector env was
+reset to. Without auto-reset the envs keep stepping after done, as the scalar envs do.
+
+Throughput : env steps/s of a loop over N scalar envs vs. one vectorized call, for several N.
+
+    python bench_vector_envs.py
+    python bench_vector_envs.py --envs 256 --steps 2000 --sizes 1 64 1024 16384
+"""
+import time
+import argparse
+import numpy as np
+
+import gym
+from gym.wrappers import TimeLimit
+from gym_task.envs.cartpole import CartPoleEnv, VectorCartPole
+from gym_task.envs.mountaincar import MountainCarEnv, VectorMountainCar
+from gym_task.envs.acrobot import AcrobotEnv, VectorAcrobot
+
+ENVS = {'cartpole': (CartPoleEnv, VectorCartPole, 2), 'mountaincar': (MountainCarEnv, VectorMountainCar, 3),
+        'acrobot': (AcrobotEnv, VectorAcrobot, 3)}
+
+
+def policy(name, obs, rng, n_actions):
+    """ random actions ; for mountain car mostly pushing along the velocity, so episodes end """
+    actions = rng.randint(n_actions, size=len(obs))
+    if name == 'mountaincar':
+        pump = np.where(obs[:, 1] >= 0, 2, 0)
+        actions = np.where(rng.uniform(size=len(obs)) < 0.9, pump, actions)
+    return actions
+
+
+def check_parity(name, n_envs, n_steps, max_steps, autoreset, atol, seed=0):
+    """ returns (steps compared, episodes ended) ; raises AssertionError on the first difference """
+    make_scalar, make_vector, n_actions = ENVS[name]
+    rng = np.random.RandomState(seed)
+    vector = make_vector(n_envs, autoreset=autoreset, max_episode_steps=max_steps)
+    vector.seed(seed)
+    obs = vector.reset()
+
+    scalars = []
+    for i in range(n_envs):
+        env = make_scalar()
+        if max_steps is not None:
+            env = TimeLimit(env, max_episode_steps=max_steps)
+        env.reset()
+        env.unwrapped.state = vector.state[i].copy()
+        scalars.append(env)
+
+    n_done = 0
+    for t in range(n_steps):
+        actions = policy(name, obs, rng, n_actions)
+        obs, rewards, dones, info = vector.step(actions)
+        last = info.get('terminal_observation', obs)
+        for i, env in enumerate(scalars):
+            o, r, d, env_info = env.step(int(actions[i]))
+            where = '{0} step {1} env {2}'.format(name, t, i)
+            assert np.allclose(o, last[i], rtol=0, atol=atol), (where, o, last[i])
+            assert r == rewards[i] and d == dones[i], (where, (r, d), (rewards[i], dones[i]))
+            if max_steps is not None:
+                assert env_info.get('TimeLimit.truncated', False) == info['TimeLimit.truncated'][i], where
+            if d and autoreset:
+                env.reset()
+                env.unwrapped.state = vector.state[i].copy()
+        n_done += int(dones.sum())
+    return n_steps * n_envs, n_done
+
+
+def throughput(name, n_envs, seconds=0.5, seed=0):
+    """ env steps/s of the scalar loop and of the vector env """
+    make_scalar, make_vector, n_actions = ENVS[name]
+    rng = np.random.RandomState(seed)
+    actions = rng.randint(n_actions, size=(64, n_envs))
+
+    scalars = [make_scalar() for _ in range(n_envs)]
+    for env in scalars:
+        env.reset()
+    steps, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        row = actions[steps % len(actions)]
+        for i, env in enumerate(scalars):
+            _, _, d, _ = env.step(int(row[i]))
+            if d:
+                env.reset()
+        steps += 1
+    t_scalar = (time.perf_counter() - t0) / (steps * n_envs)
+
+    vector = make_vector(n_envs)
+    vector.seed(seed)
+    vector.reset()
+    steps, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        vector.step(actions[steps % len(actions)])
+        steps += 1
+    t_vector = (time.perf_counter() - t0) / (steps * n_envs)
+    return 1 / t_scalar, 1 / t_vector
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--envs', type=int, default=64, help='envs of the parity check')
+    parser.add_argument('--steps', type=int, default=1000, help='steps of the parity check')
+    parser.add_argument('--max-steps', type=int, default=200, help='episode step limit of the parity check')
+    parser.add_argument('--atol', type=float, default=1e-9)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 256, 4096], help='N of the throughput part')
+    args = parser.parse_args(argv)
+    gym.logger.set_level(gym.logger.ERROR)  # the scalar envs warn when stepped after done
+
+    for name in ENVS:
+        for autoreset, max_steps in ((True, args.max_steps), (True, None), (False, None)):
+            n, n_done = check_parity(name, args.envs, args.steps, max_steps, autoreset, args.atol)
+            print("{0:12s} autoreset {1!s:5s} max steps {2!s:4s} : {3} steps, {4} done, parity ok".format(
+                name, autoreset, max_steps, n, n_done))
+
+    for name in ENVS:
+        for n_envs in args.sizes:
+            scalar, vector = throughput(name, n_envs)
+            print("{0:12s} N {1:6d} : scalar {2:10.0f} steps/s, vector {3:12.0f} steps/s ({4:.1f}x)".format(
+                name, n_envs, scalar, vector, vector / scalar))
+
+
+if __name__ == '__main__':
+    main()
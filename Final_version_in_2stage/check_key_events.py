@@ -0,0 +1,113 @@
+"""
+Check of key_events.py on a recorded evdev key stream (resource/key_stream_fixture.evdev).
+
+The fixture holds presses, releases and key repeats (value 2) of the game keys, a key that is
+not a game key, EV_SYN records, overlapping keys and a key held across the start of an
+episode ; its records are written by write_fixture() from FIXTURE. The check asserts
+
+  - the press / release times of replay_evdev (relative to the first key event), with the
+    key repeats and the other key dropped,
+  - that a 60 Hz poll feeding the stream like key_processing() gets the time of the press of
+    the held key at every poll from the first one after the press until the release, on the
+    episode clock of mark(),
+  - that a key held from before mark() (the episode start) gives no press time.
+
+    python check_key_events.py
+    python check_key_events.py --write-fixture     # rewrite the fixture from FIXTURE
+"""
+import os
+import struct
+import argparse
+import numpy as np
+
+from keyboard._nixcommon import EV_KEY, EV_SYN, event_bin_format
+from key_events import KeyEventStream, read_evdev, replay_evdev
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resource', 'key_stream_fixture.evdev')
+T0 = 1700000000.0  # time.time() of the first record
+
+# (seconds after T0, scan code, value : 1 down / 0 up / 2 repeat)
+FIXTURE = [(0.100, 30, 1), (0.250, 38, 1), (0.400, 38, 0), (0.600, 30, 2), (0.633, 30, 2), (0.700, 30, 0),
+           (1.000, 32, 1), (1.100, 57, 1), (1.150, 57, 0), (1.500, 32, 2), (1.600, 32, 0),
+           (1.900, 30, 1), (2.200, 30, 0), (2.400, 30, 1), (2.450, 30, 2), (2.450, 30, 0)]
+
+# (scan code, down, seconds after the first key event) of the stream
+EXPECTED_EVENTS = [(30, True, 0.0), (38, True, 0.15), (38, False, 0.3), (30, False, 0.6), (32, True, 0.9),
+                   (32, False, 1.5), (30, True, 1.8), (30, False, 2.1), (30, True, 2.3), (30, False, 2.35)]
+MARKS = (-0.04, 1.805)  # episode starts : key 30 is pressed at 1.8, just before the second one
+T_EPISODE = 100.0  # the episode clock at every mark
+EXPECTED_PRESSES = [0.0, 0.15, 0.9, 2.3]
+SCAN_CODES = (31, 17, 32, 30, 38, 35)  # key_table.GAME_KEYS
+
+
+def write_fixture(path):
+    with open(path, 'wb') as f:
+        for t, code, value in FIXTURE:
+            seconds, microseconds = divmod(int(round((T0 + t) * 1e6)), 1000000)
+            f.write(struct.pack(event_bin_format, seconds, microseconds, EV_KEY, code, value))
+            f.write(struct.pack(event_bin_format, seconds, microseconds, EV_SYN, 0, 0))
+
+
+def check_events(path):
+    events = replay_evdev(path, KeyEventStream(scan_codes=SCAN_CODES, hook=None))
+    got = [(e.scan_code, e.down) for e in events]
+    assert got == [(code, down) for code, down, _ in EXPECTED_EVENTS], got
+    times = np.array([e.t for e in events])
+    assert np.allclose(times, [t for _, _, t in EXPECTED_EVENTS], atol=1e-6), times
+    return events
+
+
+def check_polls(path, period=1 / 60.):
+    """ press times given by press_time() at every poll ; (poll time, press time on the episode clock) """
+    keyboard_events = list(read_evdev(path))
+    clock_offset = keyboard_events[0].time
+    stream = KeyEventStream(scan_codes=SCAN_CODES, hook=None)
+    marks = list(MARKS)
+    t_mark = None
+    presses = []
+    i = 0
+    for t_poll in np.arange(MARKS[0], 2.6, period):
+        if marks and t_poll >= marks[0]:
+            t_mark = marks.pop(0)
+            stream.mark(T_EPISODE, t_mark)
+        while i < len(keyboard_events) and keyboard_events[i].time - clock_offset <= t_poll:
+            stream.feed(keyboard_events[i], clock_offset)  # the listener thread
+            i += 1
+        stream.update()
+        mask = sum(1 << bit for bit, code in enumerate(SCAN_CODES) if code in stream.down)
+        t_press = stream.press_time(mask, SCAN_CODES)
+        if t_press is not None:
+            presses.append((t_poll, stream.episode_time(t_press) - T_EPISODE + t_mark))
+        elif mask:
+            # only the key held across the second mark is down without a press time
+            assert MARKS[1] <= t_poll < EXPECTED_EVENTS[7][2], t_poll
+
+    times = np.array([t for _, t in presses])
+    distinct = np.unique(np.round(times, 6))
+    assert np.allclose(distinct, EXPECTED_PRESSES, atol=1e-6), distinct
+    for t_press in EXPECTED_PRESSES:
+        polls = [t_poll for t_poll, t in presses if abs(t - t_press) < 1e-6]
+        assert 0 <= polls[0] - t_press < period, (polls[0], t_press)  # the first poll after the press
+    return presses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--write-fixture', action='store_true', help='rewrite the fixture from FIXTURE')
+    parser.add_argument('--path', default=FIXTURE_PATH, help='evdev stream')
+    args = parser.parse_args(argv)
+
+    if args.write_fixture:
+        write_fixture(args.path)
+
+    events = check_events(args.path)
+    n_records = sum(1 for _, code, _ in FIXTURE if code in SCAN_CODES)
+    print("{0} key events of {1} game key records (repeats dropped), times as expected".format(
+        len(events), n_records))
+    presses = check_polls(args.path)
+    print("60 Hz poll : {0} rows of {1} presses, each from the first poll after it, none held from before "
+          "mark()".format(len(presses), len(EXPECTED_PRESSES)))
+
+
+if __name__ == '__main__':
+    main()
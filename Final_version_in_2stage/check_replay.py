@@ -0,0 +1,136 @@
+"""
+Check of replay.py : episodes with rewards are regenerated frame for frame by ReplayEngine.
+
+Like the game loop of Session_atari, the episodes are played on a pooled env (env_pool.py,
+one reset in acquire(), the ROM stays loaded between episodes) and logged by
+ReplayRecorder(..., reset=False), with random actions until the episode has collected
+--rewards nonzero rewards. Every shown frame is kept and compared with the frames of
+ReplayEngine (which has no viewer : AtariEnv.step must not update one on a reward).
+The second and later episodes run on the warm env.
+
+Then an episode is interrupted after --resume-at steps and resumed like Session_atari does
+after a crash : a new ReplayRecorder on a freshly acquired env, restored from the snapshot()
+and the step counter of the interrupted log. With the same actions, the resumed frames must be
+those of the uninterrupted episode from that step on (no extra step), and the replay of the
+resumed log must give them at the same step numbers.
+
+Needs gym with atari_py and the AtariEnv of environment.py.
+
+    python check_replay.py
+    python check_replay.py --env MsPacman-v0 --episodes 3 --rewards 5
+"""
+import os
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+from env_pool import EnvPool
+from replay import ReplayRecorder, ReplayEngine
+
+
+def record(env_pool, env_name, path, rng, n_rewards, max_steps, checkpoint_every):
+    """ one logged episode ; (shown frames, number of nonzero rewards) """
+    env = env_pool.acquire(env_name)
+    replay_log = ReplayRecorder(path, env, env_name, seed=rng.randint(2 ** 31 - 1),
+                                checkpoint_every=checkpoint_every, reset=False)
+    frames, rewards = [], 0
+    for _ in range(max_steps):
+        observation, reward, done, info = replay_log.step(rng.randint(env.action_space.n))
+        replay_log.mark_frame()
+        frames.append(observation.copy())
+        rewards += reward != 0
+        if done or rewards >= n_rewards:
+            break
+    replay_log.close()
+    env_pool.release(env)
+    return np.array(frames, dtype=np.uint8), rewards
+
+
+def check_resume(env_pool, env_name, direc, seed, n_steps, resume_at, checkpoint_every):
+    """ uninterrupted vs. interrupted + resumed episode with the same actions ; number of resumed frames """
+    rng = np.random.RandomState(seed)
+    env = env_pool.acquire(env_name)
+    replay_log = ReplayRecorder(os.path.join(direc, 'resume.npz'), env, env_name, seed=seed,
+                                checkpoint_every=checkpoint_every, reset=False)
+    actions, frames = [], []
+    for step in range(n_steps):
+        if step == resume_at:
+            # a 'stage' checkpoint of Session_atari
+            ale_state, replay_step = replay_log.snapshot(), len(replay_log)
+        actions.append(rng.randint(env.action_space.n))
+        observation, reward, done, info = replay_log.step(actions[-1])
+        replay_log.mark_frame()
+        frames.append(observation.copy())
+        if done:
+            break
+    replay_log.close()
+    env_pool.release(env)
+    assert len(actions) > resume_at, 'episode ended before --resume-at'
+
+    env = env_pool.acquire(env_name)
+    resumed = ReplayRecorder(os.path.join(direc, 'resume_resumed.npz'), env, env_name, seed=seed + 1,
+                             checkpoint_every=checkpoint_every, restore=ale_state, reset=False,
+                             first_step=replay_step)
+    resumed_frames = []
+    for action in actions[resume_at:]:
+        observation, reward, done, info = resumed.step(action)
+        resumed.mark_frame()
+        resumed_frames.append(observation.copy())
+    resumed.close()
+    env_pool.release(env)
+
+    assert len(resumed) == len(actions), (len(resumed), len(actions))
+    assert np.array_equal(np.array(resumed_frames), np.array(frames[resume_at:])), 'resumed frames differ'
+    engine = ReplayEngine(resumed.path)
+    assert engine.frame_steps[0] == resume_at, engine.frame_steps[0]
+    assert np.array_equal(engine.frames(), np.array(frames[resume_at:])), 'replay of the resumed log differs'
+    engine.close()
+    return len(resumed_frames)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--env', default='Seaquest-v0', help='gym env name')
+    parser.add_argument('--episodes', type=int, default=2, help='episodes on the same pooled env')
+    parser.add_argument('--rewards', type=int, default=3, help='nonzero rewards per episode')
+    parser.add_argument('--max-steps', type=int, default=20000, help='steps per episode at most')
+    parser.add_argument('--checkpoint-every', type=int, default=200, help='steps between checkpoints')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the actions and of np_random')
+    parser.add_argument('--resume-at', type=int, default=500, help='step of the interruption of the resume check')
+    args = parser.parse_args(argv)
+
+    rng = np.random.RandomState(args.seed)
+    env_pool = EnvPool()
+    direc = tempfile.mkdtemp(prefix='check_replay_')
+    try:
+        for i_episode in range(args.episodes):
+            path = os.path.join(direc, 'episode{0:03d}.npz'.format(i_episode))
+            frames, rewards = record(env_pool, args.env, path, rng, args.rewards, args.max_steps,
+                                     args.checkpoint_every)
+            assert rewards > 0, 'episode {0} without reward, raise --max-steps'.format(i_episode)
+
+            engine = ReplayEngine(path)
+            replayed = engine.frames()
+            assert replayed.shape == frames.shape, (i_episode, replayed.shape, frames.shape)
+            differing = np.flatnonzero(np.any(replayed != frames, axis=(1, 2, 3)))
+            assert len(differing) == 0, 'episode {0} : frames {1} differ'.format(i_episode, differing[:10].tolist())
+
+            # a range in the middle, from a later checkpoint
+            start = len(frames) // 2
+            assert np.array_equal(engine.frames(start, start + 30), frames[start:start + 30]), i_episode
+            engine.close()
+            print("episode {0} ({1}) : {2} frames, {3} rewards, replay == recorded".format(
+                i_episode, 'cold' if i_episode == 0 else 'warm', len(frames), rewards))
+
+        n = check_resume(env_pool, args.env, direc, args.seed, 2 * args.resume_at, args.resume_at,
+                         args.checkpoint_every)
+        print("resumed at step {0} : {1} frames, == uninterrupted episode, replay == recorded".format(
+            args.resume_at, n))
+    finally:
+        env_pool.close()
+        shutil.rmtree(direc, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+    Clock synchronization of the event timestamps with the amplifier .
+
+    ms_localtime() is time.time() in ms modulo 10^9 : it follows every step and slew of the
+    system clock, wraps, and the only link to the amplifier clock is the single 'T' sent by
+    sync() at the start of a block -- with 50 ppm between the crystals that is already
+    24 ms after an 8-minute block .
+
+    ClockSync instead
+    -- counts the session time on time.perf_counter() (monotonic, sub-microsecond) from its
+       creation, so the 32-bit ms timestamps do not wrap for 24 days ;
+    -- runs periodic NTP-style exchanges (SNTP over UDP, RFC 4330) with the amplifier
+       (NetAmp 300/400 serve NTP) or the local stand-in (eci_server.NtpServer) on a
+       background thread ; every exchange is a burst of probes of which the one with the
+       smallest round trip is kept, and a line is fitted through the last 'window' offsets :
+       offset and drift (ppm) of the amplifier clock against the session clock ;
+    -- stamps every event with the corrected session time : the local time plus the change of
+       the offset since the anchor, so the events follow the amplifier clock between anchors ;
+    -- anchors the Netstation clients with 'A' + 'T' (attach()) : the 'T' carries the corrected
+       time at which it is expected to arrive (half the round trip of the 'A' later) ;
+    -- exports the model (exchanges, fit, anchors and marks such as the start of the game clocks)
+       so EEG epochs can be put on the time base of the game frames offline .
+
+    Without an NTP host the offset stays zero and only the monotonic clock and anchors are used .
+
+    usage :
+        clock_sync = ClockSync(ntp_host='10.10.10.51')
+        clock_sync.start()                              # periodic exchanges
+        ns.connect("10.10.10.42", 55513)
+        clock_sync.attach(ns)                           # instead of ns.sync()
+        ns.send_event('epi0', label="episode")          # stamped with clock_sync.stamp()
+        clock_sync.mark('episode0', t_ep.getTime())     # (session time, game clock) pair
+        clock_sync.export('clock_sync.json')
+        clock_sync.close()
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import threading
+
+NTP_PORT = 123
+
+_NTP_PACKET = struct.Struct('!B3xLL4xQQQQ')  # flags, root delay / dispersion, ref id, 4 timestamps
+_NTP_EPOCH = 2208988800  # 1900-01-01 -> 1970-01-01, s
+_FRACTION = 2.0 ** 32
+
+
+def _to_ntp(t):
+    """ unix time (s) -> 64-bit NTP timestamp """
+    return int((t + _NTP_EPOCH) * _FRACTION)
+
+
+def fit_line(samples):
+    """ least squares offset = a + b * (t - t_ref) through (t, offset) ; returns (a, b, t_ref) """
+    n = len(samples)
+    t_ref = sum(t for t, _ in samples) / n
+    mean = sum(o for _, o in samples) / n
+    sxx = sum((t - t_ref) ** 2 for t, _ in samples)
+    if n < 2 or sxx <= 0:
+        return mean, 0.0, t_ref
+    sxy = sum((t - t_ref) * (o - mean) for t, o in samples)
+    return mean, sxy / sxx, t_ref
+
+
+class ClockSync(object):
+    """
+    Session clock (time.perf_counter() since creation) with the offset / drift model of the
+    amplifier clock ; all times of the model are in seconds of the session clock .
+    """
+
+    def __init__(self, ntp_host=None, ntp_port=NTP_PORT, interval=10.0, n_probe=4, window=60, timeout=0.25):
+        self.perf_origin = time.perf_counter()
+        self.wall_origin = time.time()  # exported (to find the session in other logs), base of the NTP times
+
+        self.ntp_host = ntp_host
+        self.ntp_port = ntp_port
+        self.interval = interval
+        self.n_probe = n_probe
+        self.window = window
+        self.timeout = timeout
+
+        self.exchanges = []  # (t, offset, delay, n_replies) per exchange, s
+        self.anchors = []  # (T sent in ms, t before 'A', t before 'T', t of the 'T' reply)
+        self.marks = []  # (label, t, stamp in ms, other clock)
+        self._model = (0.0, 0.0, 0.0)  # (a, b, t_ref) of offset(t) - offset0
+        self.offset0 = None  # offset of the first exchange, s ; absorbed by the anchor
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._socket = None
+        self._ntp_origin = _to_ntp(self.wall_origin)  # NTP times are taken relative to it, for precision
+
+    ## -----------------------------------------------------------
+
+    def now(self, t=None):
+        """ session time in s (of a time.perf_counter() value t, default : now) """
+        return (time.perf_counter() if t is None else t) - self.perf_origin
+
+    def local_ms(self, t=None):
+        return 1000.0 * self.now(t)
+
+    def offset(self, t=None):
+        """ change of the amplifier offset since the first exchange at session time t (s), in s """
+        a, b, t_ref = self._model
+        return a + b * ((self.now() if t is None else t) - t_ref)
+
+    def stamp(self, t=None):
+        """ corrected session time in ms of a time.perf_counter() value t (default : now), for send_event() """
+        s = self.now(t)
+        a, b, t_ref = self._model
+        return int(round(1000.0 * (s + a + b * (s - t_ref))))
+
+    ## -----------------------------------------------------------
+
+    def probe(self):
+        """ one SNTP request ; (session time of the midpoint, offset, round trip) in s, or None """
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.settimeout(self.timeout)
+        t0 = time.perf_counter()
+        origin = self._ntp_origin + int(self.now(t0) * _FRACTION)
+        request = _NTP_PACKET.pack(0x23, 0, 0, 0, 0, 0, origin)  # LI 0, version 4, mode 3 (client)
+        try:
+            self._socket.sendto(request, (self.ntp_host, self.ntp_port))
+            while True:
+                data = self._socket.recv(512)
+                t3 = time.perf_counter()
+                if len(data) >= _NTP_PACKET.size:
+                    fields = _NTP_PACKET.unpack_from(data)
+                    if fields[4] == origin:  # a reply to this request, not a late one
+                        break
+        except (socket.timeout, OSError):
+            return None
+        flags, _, _, _, _, receive, transmit = fields
+        if flags & 0x07 not in (4, 5) or transmit == 0:  # server / broadcast, with a time
+            return None
+        # server times as seconds since wall_origin, local times as session time
+        t1 = (receive - self._ntp_origin) / _FRACTION
+        t2 = (transmit - self._ntp_origin) / _FRACTION
+        l0, l3 = self.now(t0), self.now(t3)
+        offset = ((t1 - l0) + (t2 - l3)) / 2
+        delay = (l3 - l0) - (t2 - t1)
+        return (l0 + l3) / 2, offset, delay
+
+    def update(self):
+        """ one exchange : a burst of probes, the one with the smallest round trip is kept and the model refitted """
+        probes = []
+        for _ in range(self.n_probe):
+            p = self.probe()
+            if p is not None:
+                probes.append(p)
+        if not probes:
+            return None
+        t, offset, delay = min(probes, key=lambda p: p[2])
+        with self._lock:
+            if self.offset0 is None:
+                self.offset0 = offset
+            self.exchanges.append((t, offset, delay, len(probes)))
+            recent = self.exchanges[-self.window:]
+            self._model = fit_line([(e[0], e[1] - self.offset0) for e in recent])
+        return t, offset, delay
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.update()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """ exchanges every 'interval' seconds on a background thread (no-op without an NTP host) """
+        if self.ntp_host is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='ClockSync', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + self.n_probe * self.timeout)
+            self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    ## -----------------------------------------------------------
+
+    def attach(self, ns):
+        """ anchor a connected Netstation client ('A' + 'T') and stamp its events with this clock """
+        ns.clock = self
+        t_a = time.perf_counter()
+        ns.SendAttentionCommand()
+        t_t = time.perf_counter()
+        # the 'T' arrives about half a round trip of the 'A' after it is sent
+        ms_time = self.stamp(t_t + (t_t - t_a) / 2)
+        ns.SendLocalTime(ms_time)
+        t_reply = time.perf_counter()
+        self.anchors.append((ms_time, self.now(t_a), self.now(t_t), self.now(t_reply)))
+        return ms_time
+
+    def mark(self, label, other=None):
+        """ note the session time now together with the reading of another clock (e.g. t_ep.getTime()) """
+        t = time.perf_counter()
+        self.marks.append((label, self.now(t), self.stamp(t), other))
+
+    def model(self):
+        a, b, t_ref = self._model
+        return {'wall_origin': self.wall_origin, 'ntp_host': self.ntp_host,
+                'offset0_s': self.offset0, 'offset_s': a, 'drift_ppm': 1e6 * b, 't_ref_s': t_ref,
+                'exchanges': {'t_s': [e[0] for e in self.exchanges], 'offset_s': [e[1] for e in self.exchanges],
+                              'delay_s': [e[2] for e in self.exchanges], 'n_replies': [e[3] for e in self.exchanges]},
+                'anchors': {'ms_time': [x[0] for x in self.anchors], 't_attention_s': [x[1] for x in self.anchors],
+                            't_send_s': [x[2] for x in self.anchors], 't_reply_s': [x[3] for x in self.anchors]},
+                'marks': [{'label': m[0], 't_s': m[1], 'stamp_ms': m[2], 'other': m[3]} for m in self.marks]}
+
+    def export(self, path):
+        """ write model() as JSON (atomically) """
+        direc = os.path.dirname(path)
+        if direc and not os.path.exists(direc):
+            os.makedirs(direc)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.model(), f, indent=1)
+        os.replace(tmp, path)
+        return path
@@ -0,0 +1,310 @@
+"""
+    A local stand-in for the Netstation side of the ECI (Experimental Control Interface)
+    protocol, to run egi3 without the amplifier .
+
+    Implements the subset used by simple.py / threaded.py ( ref.: App.G "Experimental Control Protocol" ) :
+
+        'Q' + 4-byte system spec        -> 'I' + version byte
+        'X', 'B', 'E', 'A'              -> 'Z'
+        'T' + 32-bit local time (ms)    -> 'Z'
+        'D' + event (header "=cHLL4s", label and description as Pascal strings,
+                     key / data table)  -> 'Z'
+        anything else                   -> 'F' + error code, and the connection is closed
+
+    Every command is recorded with the time it was read (time.perf_counter(), so a client in
+    the same process can compute latencies) ; 'D' packets are decoded field by field and the
+    raw bytes are kept for a byte-wise comparison with _DataFormat.pack() .
+
+    usage :
+        server = EciServer(reply_delay=0.001)     # port 0 : any free port
+        ns.connect('127.0.0.1', server.port)
+        ...
+        server.received                           # list of dicts
+        server.close()
+
+        python -m egi3.eci_server --port 55513    # stand-alone, prints what it receives
+
+    NtpServer is an SNTP server with a configurable offset and drift, standing in for the
+    NTP server of the amplifier (clock_sync.py) .
+"""
+
+import sys
+import time
+import struct
+import socket
+import argparse
+import threading
+from collections import deque
+
+from .simple import _Format
+
+PROTOCOL_VERSION = 1
+
+_EVENT_HEADER = struct.Struct('=LL4s')  # timestamp, duration, key ; after 'D' and the length
+_DATA_FORMATS = {b'bool': '=?', b'long': '=l', b'shor': '=h', b'sing': '=f', b'doub': '!d'}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def decode_event(body):
+    """ the fields of a 'D' packet, 'body' being everything after 'D' and the length field """
+    timestamp, duration, key = _EVENT_HEADER.unpack_from(body, 0)
+    pos = _EVENT_HEADER.size
+
+    def pstring():
+        nonlocal pos
+        n = body[pos]
+        s = body[pos + 1:pos + 1 + n]
+        pos += 1 + n
+        return s.decode('utf-8', 'replace')
+
+    label = pstring()
+    description = pstring()
+    table = {}
+    nkeys = body[pos]
+    pos += 1
+    for _ in range(nkeys):
+        k, desctype, length = struct.unpack_from('=4s4sH', body, pos)
+        pos += 10
+        data = body[pos:pos + length]
+        pos += length
+        if desctype == b'TEXT':
+            table[k.decode('utf-8', 'replace')] = data.decode('utf-8', 'replace')
+        elif desctype in _DATA_FORMATS:
+            table[k.decode('utf-8', 'replace')] = struct.unpack(_DATA_FORMATS[desctype], data)[0]
+        else:
+            table[k.decode('utf-8', 'replace')] = data
+    if pos != len(body):
+        raise ProtocolError('event length field %d, content %d bytes' % (len(body), pos))
+    return {'timestamp': timestamp, 'duration': duration, 'key': key, 'label': label,
+            'description': description, 'table': table}
+
+
+class EciServer(object):
+    """
+    Serves one client connection at a time on a background thread ;
+    every reply is sent 'reply_delay' (s) after its command was read, to stand in for the
+    network and Netstation -- the commands behind it are read meanwhile, as over a real link .
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reply_delay=0.0, verbose=False):
+        self.reply_delay = reply_delay
+        self.verbose = verbose
+        self._fmt = _Format()
+        self._listener = socket.create_server((host, port))
+        self.host, self.port = self._listener.getsockname()[:2]
+
+        self.received = []  # {'t', 'code', 'raw', ...} per command, in arrival order
+        self.errors = []
+        self.recording = False
+        self.local_time = None  # (ms from 'T', time it was read)
+        self._lock = threading.Lock()
+        self._closing = False
+        self._conn = None
+        self._thread = threading.Thread(target=self._serve, name='EciServer', daemon=True)
+        self._thread.start()
+
+    def events(self):
+        with self._lock:
+            return [r for r in self.received if r['code'] == 'D']
+
+    def clear(self):
+        with self._lock:
+            self.received = []
+            self.errors = []
+
+    def _serve(self):
+        while not self._closing:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._conn = conn
+            try:
+                self._handle(conn)
+            except (OSError, ProtocolError) as e:
+                if not self._closing:
+                    self.errors.append(e)
+            finally:
+                conn.close()
+                self._conn = None
+
+    def _reply_loop(self, conn, replies, ready):
+        """ send the replies when they are due """
+        while True:
+            with ready:
+                ready.wait_for(lambda: replies)
+                t_due, reply = replies.popleft()
+            if reply is None:
+                return
+            delay = t_due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                conn.sendall(reply)
+            except OSError:
+                return
+
+    def _handle(self, conn):
+        replies = deque()
+        ready = threading.Condition()
+        sender = threading.Thread(target=self._reply_loop, args=(conn, replies, ready), daemon=True)
+        sender.start()
+
+        def send(reply, t_due):
+            with ready:
+                replies.append((t_due, reply))
+                ready.notify()
+
+        try:
+            self._read_commands(conn, send)
+        finally:
+            send(None, 0)
+            sender.join()
+
+    def _read_commands(self, conn, send):
+        stream = conn.makefile('rb')
+
+        def read(n):
+            data = stream.read(n)
+            if len(data) < n:
+                raise EOFError
+            return data
+
+        while True:
+            try:
+                code = stream.read(1)
+                if not code:
+                    return
+                t = time.perf_counter()
+                record = {'t': t, 'code': code.decode('latin-1')}
+                if code == b'Q':
+                    spec = read(4)
+                    record['raw'] = code + spec
+                    record['system_spec'] = spec.decode('latin-1')
+                    reply = self._fmt.pack('I', PROTOCOL_VERSION)
+                elif code in (b'X', b'B', b'E', b'A'):
+                    record['raw'] = code
+                    self.recording = {b'B': True, b'E': False}.get(code, self.recording)
+                    reply = b'Z'
+                elif code == b'T':
+                    data = read(4)
+                    record['raw'] = code + data
+                    record['ms_time'] = self._fmt.unpack('T', data)[0]
+                    self.local_time = (record['ms_time'], t)
+                    reply = b'Z'
+                elif code == b'D':
+                    length = read(2)
+                    body = read(struct.unpack('=H', length)[0])
+                    record['raw'] = code + length + body
+                    record.update(decode_event(body))
+                    reply = b'Z'
+                else:
+                    raise ProtocolError('unknown command %r' % (code,))
+            except EOFError:
+                return
+            except ProtocolError as e:
+                self.errors.append(e)
+                send(b'F' + struct.pack('=h', 1) + b'\x00\x00', 0)
+                return
+
+            with self._lock:
+                self.received.append(record)
+            if self.verbose:
+                print(record['code'], {k: v for k, v in record.items() if k not in ('raw', 'code')})
+            send(reply, t + self.reply_delay)
+
+    def close(self):
+        self._closing = True
+        self._listener.close()
+        conn = self._conn
+        if conn is not None:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join(2)
+
+
+class NtpServer(object):
+    """
+    SNTP server (RFC 4330, mode 4) standing in for the NTP server of the amplifier, for
+    clock_sync.ClockSync : its clock is time.time() at start plus 'offset' s and runs
+    'drift_ppm' faster than time.perf_counter() .
+    """
+
+    _PACKET = struct.Struct('!BBbbLL4sQQQQ')
+
+    def __init__(self, host='127.0.0.1', port=0, offset=0.0, drift_ppm=0.0):
+        self.offset = offset
+        self.drift_ppm = drift_ppm
+        self.perf_origin = time.perf_counter()
+        self.wall_origin = time.time()
+        self._ntp_origin = int((self.wall_origin + offset + 2208988800) * 2 ** 32)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self.host, self.port = self._socket.getsockname()[:2]
+        self.n_requests = 0
+        self._thread = threading.Thread(target=self._serve, name='NtpServer', daemon=True)
+        self._thread.start()
+
+    def ntp_time(self, t=None):
+        """ the server clock at time.perf_counter() value t, as a 64-bit NTP timestamp """
+        elapsed = ((time.perf_counter() if t is None else t) - self.perf_origin) * (1 + 1e-6 * self.drift_ppm)
+        return self._ntp_origin + int(elapsed * 2 ** 32)
+
+    def _serve(self):
+        while True:
+            try:
+                data, address = self._socket.recvfrom(512)
+            except OSError:
+                return
+            receive = self.ntp_time()
+            if len(data) < self._PACKET.size:
+                continue
+            request_transmit = self._PACKET.unpack_from(data)[10]
+            reply = self._PACKET.pack(0x24, 1, 6, -20, 0, 0, b'LOCL', receive, request_transmit, receive,
+                                      self.ntp_time())
+            self.n_requests += 1
+            try:
+                self._socket.sendto(reply, address)
+            except OSError:
+                return
+
+    def close(self):
+        self._socket.close()
+        self._thread.join(2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='local stand-in for the Netstation ECI server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=55513)
+    parser.add_argument('--reply-delay', type=float, default=0.0, help='seconds before every reply')
+    parser.add_argument('--ntp-port', type=int, help='also serve SNTP on this UDP port')
+    parser.add_argument('--ntp-drift', type=float, default=0.0, help='drift of the SNTP clock, ppm')
+    args = parser.parse_args(argv)
+
+    server = EciServer(args.host, args.port, args.reply_delay, verbose=True)
+    print("ECI stand-in listening on {0}:{1}".format(server.host, server.port))
+    ntp = None
+    if args.ntp_port is not None:
+        ntp = NtpServer(args.host, args.ntp_port, drift_ppm=args.ntp_drift)
+        print("SNTP stand-in on {0}:{1}, drift {2} ppm".format(ntp.host, ntp.port, ntp.drift_ppm))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    server.close()
+    if ntp is not None:
+        ntp.close()
+    print("{0} commands, {1} events received".format(len(server.received), len(server.events())))
+    sys.exit(1 if server.errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -582,6 +582,72 @@ class _DataFormat(object):
         return result_str
 
 
+class EventEncoder(object):
+    """
+    _DataFormat.pack() for the events of the game loop, without re-deriving anything per event :
+
+    -- the header is packed by one precompiled struct.Struct ;
+    -- the 4-byte keys and the label / description / empty table tail are encoded once
+       per distinct string and kept (each cache is cleared when it grows past 'max_cached') ;
+    -- the event is packed into a reusable bytearray, encode() returns a memoryview of it .
+
+    Events with a table, and timestamps that are not plain 31-bit ints, go through
+    _DataFormat.pack() as before ; the output is byte-identical in every case .
+    """
+
+    _HEADER = struct.Struct("=cHLL4s")  # 'D', length of the rest, timestamp, duration, key
+
+    def __init__(self, max_cached=4096):
+        self.max_cached = max_cached
+        self._data_fmt = _DataFormat()
+        self._keys = {}
+        self._tails = {}
+        self._buf = bytearray(self._HEADER.size + 2 * 256 + 1)
+        self._view = memoryview(self._buf)
+
+    def _key(self, key):
+        k = self._keys.get(key)
+        if k is None:
+            if len(self._keys) >= self.max_cached:
+                self._keys.clear()
+            k = struct.pack("4s", key if isinstance(key, bytes) else bytes(key, "utf-8"))
+            self._keys[key] = k
+        return k
+
+    def _tail(self, label, description):
+        tail = self._tails.get((label, description))
+        if tail is None:
+            if len(self._tails) >= self.max_cached:
+                self._tails.clear()
+            # label, description (see the 'bugfix' comment in _DataFormat.pack) and zero table keys
+            tail = pstring(label or '') + pstring(description or '') + struct.pack('B', 0)
+            self._tails[(label, description)] = tail
+        return tail
+
+    def encode(self, key, timestamp=None, label=None, description=None, table=None, pad=False):
+        """ the event packet as a memoryview, valid until the next call """
+        if timestamp is None:
+            timestamp = ms_localtime()
+        if table or type(timestamp) is not int or not 0 <= timestamp <= 0x7FFFFFFF:
+            k = key if isinstance(key, bytes) else bytes(key, "utf-8")
+            packed = self._data_fmt.pack(k, timestamp, label, description, table, pad)
+            return memoryview(packed)
+
+        tail = self._tail(label, description)
+        start = self._HEADER.size
+        end = start + len(tail)
+        if end > len(self._buf):  # labels longer than 255 characters
+            self._buf = bytearray(end)
+            self._view = memoryview(self._buf)
+        self._HEADER.pack_into(self._buf, 0, b'D', end - 3, timestamp, 1, self._key(key))
+        self._buf[start:end] = tail
+        return self._view[:end]
+
+    def pack(self, key, timestamp=None, label=None, description=None, table=None, pad=False):
+        """ the event packet as bytes """
+        return bytes(self.encode(key, timestamp, label, description, table, pad))
+
+
 class Netstation(object):
     """
     Provides Python interface for a connection with the Netstation via
@@ -592,6 +658,8 @@ class Netstation(object):
         self._system_spec = _get_endianness_string()
         self._fmt = _Format()
         self._data_fmt = _DataFormat()
+        self._encoder = EventEncoder()
+        self.clock = None  # stamps the events sent without a timestamp (clock_sync.ClockSync.attach)
 
     def connect(self, str_address, port_no):
         """
@@ -749,7 +817,9 @@ class Netstation(object):
         #     zero_entry = { '\x00' * 4: 0 }
 
         # message = self._data_fmt.pack(key, timestamp, label, description, table, pad)
-        message = self._data_fmt.pack(bytes(key, "utf-8"), timestamp, label, description, table, pad)
+        if timestamp is None and self.clock is not None:
+            timestamp = self.clock.stamp()
+        message = self._encoder.encode(key, timestamp, label, description, table, pad)
         self._socket.write(message)
 
         return self.GetServerResponse()
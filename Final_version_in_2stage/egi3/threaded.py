@@ -1,465 +1,418 @@
-#!/usr/bin/python
-# -*- coding: cp1251 -*-
-
 """
-
     A threaded implementation of the "egi.netstation" component .
 
+    simple.Netstation writes every command and then waits for the server reply,
+    so every send_event() inside the game loop costs one network round trip .
+    Here the calls only put the command into a bounded queue :
+
+    -- a writer thread packs the queued commands (simple.EventEncoder) and sends everything
+       that is waiting in one write, without waiting for the replies (pipelining) ;
+       at most 'max_in_flight' commands are sent but not answered yet ;
+    -- a reader thread matches the replies ('Z', 'F' + error code, 'I' + version) with
+       the sent commands -- the server answers the commands in the order they came ;
+    -- send_event() never blocks : when the queue is full the event is dropped and counted
+       (or the caller waits at most 'block_timeout' seconds for a free slot) ;
+    -- error replies to events are collected in 'failed' ; a broken connection is raised
+       as EgiError by the next control command, send_event() then returns False and counts
+       the event in 'lost' (summary(), 'error' at the end of the block) ; the threads never wait on the server for longer than
+       'reply_timeout' without checking whether the connection failed or is being closed .
+
+    The control commands (BeginSession, EndSession, StartRecording, StopRecording, sync)
+    go through the same queue, so they stay in order with the events, and wait for their
+    reply like in simple.py -- they are not meant to be called inside the game loop .
+
+    usage :
+        ns = Netstation()
+        ns.connect("10.10.10.42", 55513)
+        ns.sync()
+        ns.StartRecording()
+        ns.send_event('epi0', label="episode", timestamp=ms_localtime())    # returns at once
+        ...
+        ns.StopRecording()
+        ns.EndSession()
+        ns.disconnect()        # sends what is still queued and waits for the replies
+        print(ns.summary())
 """
 
-# -----------------------------------------------------------------------------
-# -----------------------------------------------------------------------------
+import time
+import queue
+import socket
+import threading
+from collections import deque
 
-import simple as internal # Netstation object, mostly
-from socket_wrapper import Socket
+from . import simple as internal
 
 #
 # "forward" these names to be used from outside
 #
 
-Error = internal.EgiError
+Error = EgiError = internal.EgiError
 ms_localtime = internal.ms_localtime
 
-#
-# the name(s) to be used internally
-#
+_STOP = None
 
-## _Netstation = internal.Netstation
 
-## import types # MethodType, FunctionType
-## import inspect # .ismethod()
-## from StringIO import StringIO
+class _Request(object):
+    """ a queued command : the name of the message, its arguments, and the reply once it came """
 
-# -----------------------------------------------------------------------------
+    __slots__ = ('name', 'args', 't_queued', 't_sent', 'done', 'result')
 
-from threading import Thread
-from Queue import Queue
+    def __init__(self, name, args, wait=False):
+        self.name = name
+        self.args = args
+        self.t_queued = time.perf_counter()
+        self.t_sent = None
+        self.done = threading.Event() if wait else None  # only the control commands are waited for
+        self.result = None
 
-import time # time() for 'soft timeouts'
 
-# -----------------------------------------------------------------------------
-# -----------------------------------------------------------------------------
+def _timing(samples):
+    """ n / mean / p99 / max in ms """
+    if not samples:
+        return {}
+    s = sorted(samples)
+    return {'n': len(s), 'mean_ms': 1000 * sum(s) / len(s), 'p99_ms': 1000 * s[int(0.99 * (len(s) - 1))],
+            'max_ms': 1000 * s[-1]}
 
-#
-# an internal helper class -- a very thin wrapper around 'a message' between two threads
-#
-class _Command:
-    """
-        a command is simply the name of the method to call --
-        -- and a dictionary with the argument name / value pairs
 
+class Netstation(object):
+    """
+    Provides Python interface for a connection with the Netstation via a TCP/IP socket ;
+    same calls as simple.Netstation, but send_event() does not wait for the network .
     """
 
-    #
-    # there are three things to implement: (1) pack op., (2) unpack op., (3) helper methods .
-    #
-
-    # (1) " packing ":
-
-    def __init__(self, method_name, kwargs=None):
-
-        if kwargs is None:  kwargs = {}
-
-        self._func_name = method_name
-        self._kwargs = kwargs
-
-    # (2) " unpacking ":
-
-    def name(self):
-        """ returns the name of the function (method, actually) to call """
-
-        return self._func_name
-
-    def kwargs(self):
-        """ returns the key/value set of the arguments to pass to the function (ugh, "to the method", I wanted to say) """
-
-        return self._kwargs
-
-    # (3) " helper method ":
-
-    @staticmethod
-    def call(obj, attrname, kwargs):
-        """ call the given method with the arguments specified """
-
-        '''
-        bound = getattr(obj, attrname, None)
-        if bound is not None:
-            # assert callable(bound)
-
-            return bound(**kwargs)
-
-        # else return None
-        '''
-
-        # it is better not to eat exceptions here
-
-        bound = getattr(obj, attrname)
-        return bound(**kwargs)
-
-
-    def invoke(self, obj):
-        """ invoke the 'attrname' with 'kwargs' (both stored here) on the object 'obj' """
-
-        return self.call(obj, self.name(), self.kwargs())
-
-
-
-
-# -----------------------------------------------------------------------------
-
-class _NetstationThread(Thread):
-
-    """ Class implementing the thread instance that be sending the messages """
-
-    def __init__(self, to_send, received):
-        """
-            the thread will send the strings from the 'to_send' queue,
-            read the response with the read functions packed together with the strings to send,
-            put the result in the 'received' queue
-        """
-
-        Thread.__init__(self)
-
-        self.setName("Netstation Thread") # =%:-)
-
-        self._netstation_object      =  internal.Netstation()
-
-        self._to_send   =  to_send
-        self._received  =  received
-
-    ## -----------------------------------------------------------
-
-    @staticmethod
-    def is_end_marker(packet):
-        """ is this enry from the queue an end marker ? """
-
-        return (packet is None)
-
-
-    def _process(self, packet):
-        """ pass the received information to internal 'netstation' object to make a method call """
-
-        return packet.invoke(self._netstation_object)
-
-
-    ## -----------------------------------------------------------
-
-    def run(self):
-
-        # # debug
-        # print self.getName(), ":  start "
-
-        while True:
-
-            packet = self._to_send.get()
-
-            if self.is_end_marker(packet):
-
-                # # debug
-                # print self.getName(), ":  we're done ! "
-
-                # we are assuming that the 'None' "packet" is an absolute "end marker" --
-                # -- so it is safe to disconnect now
-                self._disconnect()
-
-                break
-
-            #
-            # we could change the packet format and add some timestamps and/or packet numbers ...
-            #
-
-            ret = self._process(packet)
-
-            self._received.put(ret) # also could have added the input timestamp, output timestamp and the packet number
-
-
-        # # debug
-        # print self.getName(), ":  closing() "
+    def __init__(self, maxsize=256, max_in_flight=64, block_timeout=0.0, reply_timeout=5.0):
+        self._system_spec = internal._get_endianness_string()
+        self._fmt = internal._Format()
+        self._encoder = internal.EventEncoder()
+        self._batch = bytearray()  # the messages of one write, reused
+        self.clock = None  # stamps the events sent without a timestamp (clock_sync.ClockSync.attach)
+
+        self.block_timeout = block_timeout
+        self.reply_timeout = reply_timeout
+        self._queue = queue.Queue(maxsize)
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = deque()
+        self._lock = threading.Condition()
+
+        self._socket = None
+        self._writer = None
+        self._reader = None
+        self._closing = False
+        self._error = None
+
+        self.failed = []  # (command name, EgiError) of the events the server (or the packing) rejected
+        self.dropped = []  # names of the events dropped on a full queue
+        self.lost = []  # names of the events not sent because the connection had failed
+        self.n_sent = 0
+        self.n_acked = 0
+        self.max_queued = 0
+        self.max_in_flight = 0
+        self.rtt = []  # seconds from the write to the reply, per command
+        self.protocol_version = None
 
     ## -----------------------------------------------------------
 
-    #
-    # let's call the 'self._netstation_object.connect()' method directly
-    #
-
     def connect(self, str_address, port_no):
-        """ "forward" this method to the inner 'netstation' object """
-
-        return self._netstation_object.connect(str_address, port_no)
-
-
-    def _disconnect(self):
-        """ this method is intended to be called internally and automatically) """
-
-        return self._netstation_object.disconnect()
-
-
-
-# -----------------------------------------------------------------------------
-
-#
-# the simplest version without "packet stamping" and "back synchronization" (needed for good sync()-ing)
-#
-
-#
-# TODOtodo: (a) wrap the process of starting of the new thread (and finalization) in separate functions ;
-#           (b) re-use (a) ;
-#           (c) syncronize in single-threaded mode .
-#
-
-class Netstation:
-
-    """ Provides Python interface for a connection with the Netstation via a TCP/IP socket. """
+        """ connect to the Netstation machine and start the writer / reader threads """
+        self._socket = socket.create_connection((str_address, port_no))
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._writer = threading.Thread(target=self._write_loop, name='Netstation writer', daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name='Netstation reader', daemon=True)
+        self._writer.start()
+        self._reader.start()
+
+    def disconnect(self, timeout=5.0):
+        """
+        send what is still queued, wait for the replies (at most 'timeout' s) and close the connection ;
+        the commands still unanswered then go to 'failed' (or raise in their caller) and the threads stop
+        """
+        if self._socket is None:
+            return
+        stop_queued = False
+        if self._writer.is_alive():
+            stop_queued = self._put(_STOP, timeout)
+            self._writer.join(timeout)
+        with self._lock:
+            self._lock.wait_for(lambda: not self._in_flight or self._error is not None, timeout)
+            self._closing = True
+            unanswered = len(self._in_flight)
+        if unanswered:
+            # Netstation stopped replying : fail the commands in flight, which also frees the writer
+            self._fail(EgiError("no reply from Netstation to %d commands within %s s" % (unanswered, timeout)))
+        if self._writer.is_alive():
+            # the writer fails what is still queued (the connection failed or is closed) and stops
+            if not stop_queued:
+                self._put(_STOP, timeout)
+            self._writer.join(timeout)
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._reader.join(timeout)
+        self._socket.close()
+        self._socket = None
 
     ## -----------------------------------------------------------
 
-    def __init__(self):
-
-        self._to_send = Queue()
-        self._to_receive = Queue()
-
-        self._netstation_thread = _NetstationThread(self._to_send, self._to_receive)
+    def _check(self):
+        if self._error is not None:
+            raise EgiError("connection to Netstation failed: %s" % (self._error,)) from self._error
+
+    def _put(self, request, timeout):
+        """ queue a request ; False if the queue stayed full for 'timeout' seconds """
+        try:
+            if timeout > 0:
+                self._queue.put(request, timeout=timeout)
+            else:
+                self._queue.put_nowait(request)
+        except queue.Full:
+            return False
+        self.max_queued = max(self.max_queued, self._queue.qsize())
+        return True
+
+    def _call(self, name, args=()):
+        """ queue a control command and wait for its reply """
+        self._check()
+        request = _Request(name, args, wait=True)
+        if not self._put(request, self.reply_timeout):
+            raise EgiError("'%s': the send queue stayed full for %s s" % (name, self.reply_timeout))
+        if not request.done.wait(self.reply_timeout):
+            raise EgiError("'%s': no reply from Netstation within %s s" % (name, self.reply_timeout))
+        if isinstance(request.result, Exception):
+            raise request.result
+        return request.result
+
+    def _pack(self, request):
+        name, args = request.name, request.args
+        if name == 'D':
+            key, timestamp, label, description, table, pad = args
+            return self._encoder.encode(key, timestamp, label, description, table, pad)
+        if name == 'Q':
+            return self._fmt.pack('Q', bytes(self._system_spec, "utf-8"))
+        if name == 'T':
+            return self._fmt.pack('T', args[0])
+        return name.encode()  # 'X', 'B', 'E', 'A'
+
+    def _closed_error(self):
+        if self._error is not None:
+            return EgiError("connection to Netstation failed: %s" % (self._error,))
+        return EgiError("connection to Netstation closed")
+
+    def _finish(self, request, result):
+        request.result = result
+        if request.done is not None:
+            request.done.set()
+        elif isinstance(result, Exception):
+            self.failed.append((request.name if request.name != 'D' else request.args[0], result))
 
     ## -----------------------------------------------------------
 
-    def _put(self, data):
-        """ a shortcut to put sth in the 'to-send' queue """
-
-        self._to_send.put(data)
-
-        # return None
-
     def _get(self):
-        """ a shortcut to get sth from the 'to-receive' queue ; nb.: blocks ! """
-
-        data = self._to_receive.get()
+        """ next queued request ; _STOP once disconnect() closed the connection """
+        while True:
+            try:
+                return self._queue.get(timeout=self.reply_timeout)
+            except queue.Empty:
+                if self._closing:
+                    return _STOP
+
+    def _acquire_window(self):
+        """ wait for a free in-flight slot ; False once the connection failed or is closed """
+        while not self._window.acquire(timeout=self.reply_timeout):
+            if self._closing or self._error is not None:
+                return False
+        if self._error is not None:  # woken by _fail()
+            self._window.release()
+            return False
+        return True
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            requests = [self._get()]
+            while True:  # everything that is waiting goes out in one write
+                try:
+                    requests.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = self._batch
+            n_batch = 0
+            for request in requests:
+                if request is _STOP:
+                    stop = True
+                    break
+                if self._error is not None or self._closing:
+                    self._finish(request, self._closed_error())
+                    continue
+                try:
+                    message = self._pack(request)
+                except Exception as e:
+                    self._finish(request, e if isinstance(e, EgiError) else EgiError(repr(e)))
+                    continue
+                if not self._window.acquire(blocking=False):
+                    # max_in_flight commands are unanswered : send what we have, then wait for a reply
+                    self._send(batch, n_batch)
+                    n_batch = 0
+                    if not self._acquire_window():
+                        self._finish(request, self._closed_error())
+                        continue
+                request.t_sent = time.perf_counter()
+                with self._lock:
+                    self._in_flight.append(request)
+                    self.max_in_flight = max(self.max_in_flight, len(self._in_flight))
+                batch += message  # copied now, the encoder reuses its buffer
+                n_batch += 1
+            self._send(batch, n_batch)
+
+    def _send(self, batch, n_batch):
+        try:
+            if n_batch and self._error is None:
+                self._socket.sendall(batch)
+                self.n_sent += n_batch
+        except OSError as e:
+            self._fail(e)
+        finally:
+            del batch[:]
+
+    def _read(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self._socket.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError('connection closed by Netstation')
+            data += chunk
         return data
 
-    ## -----------------------------------------------------------
-
-    def enumerate_responses(self):
-        """ (1) check .qsize() ; (2) .get() all these elements """
-
-        n_available = self._to_receive.qsize()
-
-        for i in xrange(n_available):
-
-            data = self._get()
-            yield data
-
-        # ''' return None '''
-
-    ## # a shortcut to be exported
-    ## enumerate_responses = _enumerate_received
-
-
-    # a simple 'dummy processor' made for convenience
-    ## def process_responces(self, resp_handler = lambda resp: pass):
-    def process_responces(self):
-
-        for resp in self.enumerate_responses():
-
-            # resp_handler(resp)
-            pass
-
-        # return None
-
-        ## change the return value depending on the resp_handler() return result ?
-        ## (e.g. break the loop on True ?)
-
-        # don't need all these complifications at the moment)
-
-    ## -----------------------------------------------------------
-
-
-    def _ns_thread_is_running(self):
-        """ returns True if our 'postman' thread is stil busy with doing something """
-
-        return self._netstation_thread.isAlive()
-
-    ## -----------------------------------------------------------
-
-    '''
-
-    def _connect(self, str_address, port_no):
-        """ connect to the Netstaton machine """
-
-        self._socket.connect(str_address, port_no)
-
-        # return None
-
-    def _disconnect(self):
-        """ close the connection """
-
-        self._socket.disconnect()
-
-        # return None
-
-    '''
-
-
-    ## -----------------------------------------------------------
-
-    def initialize(self, str_address, port_no):
-        """ open the socket /and/ start the 'Mr. Postman' thread """
-
-        ## # this could be in __init__() as well
-
-        self._netstation_thread.connect(str_address, port_no)
-
-        self._netstation_thread.start() # starting thread
-
-        # return None
-
-    def finalize(self, seconds_timeout = 2):
-        """ send the thread the 'Done' message and wait until it finishes """
-
-        self._put(None)
-
-        t_start = time.time()
-
-        # if the timeout termination will be of real use,
-        # we'll probably want to handle the exception in the 'postman' thread
-        while (time.time() - t_start) < seconds_timeout:
-
-            self.process_responces()
-
-        # debug
-        print(" egi: stopping ... ")
-
-        ## self._disconnect()
-
+    def _read_loop(self):
+        while True:
+            try:
+                code = self._read(1).decode()
+                if code == 'Z':
+                    result = True
+                elif code == 'F':
+                    info = self._fmt.unpack(code, self._read(self._fmt.format_length(code)))
+                    result = EgiError("server returned an error: " + repr(info))
+                elif code == 'I':
+                    self.protocol_version = self._fmt.unpack(code, self._read(self._fmt.format_length(code)))[0]
+                    result = self.protocol_version
+                else:
+                    raise EgiError("unexpected character code returned from server: '%s'" % (code,))
+            except (OSError, EgiError) as e:
+                if not self._closing:
+                    self._fail(e)
+                return
+
+            t = time.perf_counter()
+            with self._lock:
+                if not self._in_flight:
+                    self._error = EgiError("reply '%s' without a sent command" % (code,))
+                    self._lock.notify_all()
+                    return
+                request = self._in_flight.popleft()
+                self.n_acked += 1
+                self._lock.notify_all()
+            self._window.release()
+            self.rtt.append(t - request.t_sent)
+            self._finish(request, result)
+
+    def _fail(self, error):
+        """ the connection is broken : fail the commands in flight and wake their callers """
+        with self._lock:
+            if self._error is None:
+                self._error = error
+            pending = list(self._in_flight)
+            self._in_flight.clear()
+            self._lock.notify_all()
+        for request in pending:
+            self._window.release()
+            self._finish(request, EgiError("connection to Netstation failed: %s" % (error,)))
 
     ## -----------------------------------------------------------
 
     def BeginSession(self):
         """ say 'hi!' to the server """
-
-        packet = _Command('BeginSession')
-        # return self._process(packet)
-        self._put(packet)
-
+        return self._call('Q')
 
     def EndSession(self):
         """ say 'bye' to the server """
-
-        packet = _Command('EndSession')
-        self._put(packet)
-
-
-    ## -----------------------------------------------------------
+        return self._call('X')
 
     def StartRecording(self):
         """ start recording to the selected (externally) file """
-
-        packet = _Command('StartRecording')
-        self._put(packet)
-
+        return self._call('B')
 
     def StopRecording(self):
-        """ stop recording to the selected file;
-            the recording can be resumed with the BeginRecording() command
-            if the session is not closed yet .
-        """
-
-        packet = _Command('StopRecording')
-        self._put(packet)
-
-    ## -----------------------------------------------------------
-
-    #
-    # the next two are not supposed to be used "manually" (by the user) --
-    # -- especially becuase at least our version of the Netstation software
-    # often crashes if the delay between the 'attention' and the 'time' commands
-    # exceeds some dark secretly defined timeout value
-    #
-
-    def _SendAttentionCommand(self):
-        """ Sends and 'Attention' command """ # also pauses the recording ?
-
-        packet = _Command('SendAttentionCommand')
-        self._put(packet)
-
-
-    def _SendLocalTime(self, ms_time = None):
-        """ Send the local time (in ms) to Netstation; usually this happens after an 'Attention' command """
-
-        packet = _Command('SendAttentionCommand', { 'ms_time': ms_time })
-        self._put(packet)
-
-    ## -----------------------------------------------------------
-
-    def sync(self, timestamp = None):
-        """ a shortcut for sending the 'attention' command and the time info """
-
-        # in the simplest form ,
-        # we just send the instructions (and hope they won't be delayed too much) ;
-        # though it might be a good idea to wait for the reponse here
-
-        ## self.SendAttentionCommand()
-        ## self.SendLocalTime(timestamp)
-
-        # TODO/todo: change the code so that we'll wait for the result in the calling thread
-
-        packet = _Command('sync', { 'timestamp': timestamp })
-        self._put(packet)
-
-    ## -----------------------------------------------------------
-
-    # send_event, send_simple_event
-
-    def send_event(self, key, timestamp = None, label = None, description = None, table = None, pad = False):
+        """ stop recording to the selected file """
+        return self._call('E')
+
+    def SendAttentionCommand(self):
+        """ sends an 'Attention' command """
+        return self._call('A')
+
+    def SendLocalTime(self, ms_time=None):
+        """ send the local time (in ms) to Netstation, usually right after an 'Attention' command """
+        if ms_time is None:
+            ms_time = ms_localtime()
+        return self._call('T', (ms_time,))
+
+    def sync(self, timestamp=None):
+        """ the 'attention' command and the time info, sent back to back ; waits for both replies """
+        self._check()
+        if timestamp is None:
+            # 'A' and 'T' are written together right after this, the time is not taken
+            # on the writer thread to keep ms_localtime() to one thread
+            timestamp = ms_localtime()
+        attention = _Request('A', (), wait=True)
+        local_time = _Request('T', (timestamp,), wait=True)
+        for request in (attention, local_time):
+            if not self._put(request, self.reply_timeout):
+                raise EgiError("sync: the send queue stayed full for %s s" % (self.reply_timeout,))
+        for request in (attention, local_time):
+            if not request.done.wait(self.reply_timeout) or request.result is not True:
+                raise EgiError("sync command failed!")
+        return True
+
+    def send_event(self, key, timestamp=None, label=None, description=None, table=None, pad=False):
         """
-            Send an event ; note that before sending any events a sync() has to be called
-            to make the sent events effective .
-
-            Arguments:
-            -- 'id' -- a four-character identifier of the event ;
-            -- 'timestamp' -- the local time when event has happened, in milliseconds ;
-                              note that the "clock" used to produce the timestamp should be the same
-                              as for the sync() method, and, ideally,
-                              should be obtained via a call to the same function ;
-                              if 'timestamp' is None, a time.time() wrapper is used .
-            -- 'label' -- a string with any additional information, up to 256 characters .
-            -- 'description' -- more additional information can go here (same limit applies) .
-            -- 'table' -- a standart Python dictionary, where keys are 4-byte identifiers,
-                          not more than 256 in total ;
-                          there are no special conditions on the values,
-                          but the size of every value entry in bytes should not exceed 2 ^ 16 .
-
-            Note A: due to peculiarity of the implementation, our particular version of NetStation
-                    was not able to record more than 2^15 events per session .
-
-            Note B: it is *strongly* recommended to send as less data as possible .
-
+        Queue an event (see simple.Netstation.send_event for the arguments) ; returns at once --
+        -- True if it was queued, False if it was dropped because the queue is full or lost
+        because the connection failed (never raises : the game loop goes on without Netstation) .
+        The timestamp is taken here if it is None (from 'clock' if one is attached), not when
+        the event is written .
         """
-
-
-        kwargs = {                             \
-                   'key'        : key         ,
-                   'timestamp'  : timestamp   ,
-                   'label'      : label       ,
-                   'description': description ,
-                   'table'      : table       ,
-                   'pad'        : pad         \
-                }
-
-        packet = _Command('send_event', kwargs)
-        self._put(packet)
-
+        if self._error is not None:
+            self.lost.append(key)
+            return False
+        if timestamp is None:
+            timestamp = self.clock.stamp() if self.clock is not None else ms_localtime()
+        request = _Request('D', (key, timestamp, label, description, table, pad))
+        if self._put(request, self.block_timeout):
+            return True
+        self.dropped.append(key)
+        return False
 
     ## -----------------------------------------------------------
 
-
-
-# -----------------------------------------------------------------------------
-# -----------------------------------------------------------------------------
-
-if __name__ == "__main__":
-
-    print (__doc__)
-    print ("\n === \n")
-    # print "module dir() listing: ", __dict__.keys()
-    print ("module dir() listing: ", dir())
-
-
+    @property
+    def error(self):
+        """ the error that broke the connection, None while it works """
+        return self._error
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {'sent': self.n_sent, 'acked': self.n_acked, 'in_flight': in_flight, 'queued': self._queue.qsize(),
+                'failed': len(self.failed), 'dropped': len(self.dropped), 'lost': len(self.lost), 'max_queued': self.max_queued,
+                'max_in_flight': self.max_in_flight, 'rtt': _timing(self.rtt)}
+
+    def summary(self):
+        s = self.stats()
+        line = "netstation: {0} sent, {1} acked, {2} failed, {3} dropped, {4} lost, queue max {5}, in flight max {6}".format(
+            s['sent'], s['acked'], s['failed'], s['dropped'], s['lost'], s['max_queued'], s['max_in_flight'])
+        if s['rtt']:
+            line += ", reply {0:.2f} ms mean / {1:.2f} ms p99".format(s['rtt']['mean_ms'], s['rtt']['p99_ms'])
+        if self._error is not None:
+            line += ", connection failed: %s" % (self._error,)
+        return line
@@ -0,0 +1,70 @@
+"""
+Pool of Atari environments kept alive across the blocks and episodes of a session.
+
+gym.make() loads the ROM and the first render() opens the pyglet window ; both are
+done once per game. Between episodes an environment is only reset (ALE reset_game)
+and its viewer is hidden and re-initialised (AtariEnv.release() / render()), so
+switching to the next episode takes milliseconds instead of seconds.
+"""
+import time
+import gym
+
+
+class EnvPool(object):
+    """
+    usage :
+        env_pool = EnvPool()
+        env = env_pool.acquire('Seaquest-v0')     # reset, ready to step
+        ...
+        reward_close = env_pool.release(env)      # instead of env.close()
+        ...
+        env_pool.close()                          # end of the session
+    """
+
+    def __init__(self, make=gym.make):
+        self._make = make
+        self._envs = {}
+        self._in_use = set()
+        self.switch_latency = []  # (env_name, 'cold' / 'warm', seconds)
+
+    def acquire(self, env_name):
+        """ return a reset environment for 'env_name', creating it only the first time """
+        t0 = time.perf_counter()
+
+        if env_name in self._in_use:
+            raise ValueError('%s is already in use, release() it first' % (env_name,))
+
+        env = self._envs.get(env_name)
+        if env is None:
+            env = self._make(env_name)
+            self._envs[env_name] = env
+            kind = 'cold'
+        else:
+            kind = 'warm'
+        env.reset()
+        self._in_use.add(env_name)
+
+        latency = time.perf_counter() - t0
+        self.switch_latency.append((env_name, kind, latency))
+        print("env switch latency for {0}: {1:.1f} ms ({2})".format(env_name, 1000 * latency, kind))
+        return env
+
+    def release(self, env):
+        """ end of an episode ; returns what env.close() used to return """
+        self._in_use.discard(env.spec.id)
+        return env.release()
+
+    def stats(self):
+        """ {'cold' / 'warm': (number of switches, mean latency in s)} """
+        stats = {}
+        for kind in ('cold', 'warm'):
+            latencies = [lat for _, k, lat in self.switch_latency if k == kind]
+            if latencies:
+                stats[kind] = (len(latencies), sum(latencies) / len(latencies))
+        return stats
+
+    def close(self):
+        for env in self._envs.values():
+            env.close()
+        self._envs.clear()
+        self._in_use.clear()
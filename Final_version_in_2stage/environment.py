@@ -57,6 +57,9 @@ class AtariEnv(gym.Env, utils.EzPickle):
         self.frameskip = frameskip
         self.ale = atari_py.ALEInterface()
         self.viewer = None
+        self._viewer_released = False
+        # callable building the viewer on the first render() ; None -> rendering.SimpleImageViewer
+        self.viewer_factory = None
 
         # Tune (or disable) ALE's action repeat:
         # https://github.com/openai/gym/issues/349
@@ -143,7 +146,8 @@ class AtariEnv(gym.Env, utils.EzPickle):
 
 
             reward = int(reward/normalize_factor)
-            self.viewer.update(reward)
+            if self.viewer is not None:  # no viewer : replay (replay.py) or steps before the first render()
+                self.viewer.update(reward)
 
 
         return ob, reward, self.ale.game_over(), {"ale.lives": self.ale.lives()}
@@ -175,10 +179,16 @@ class AtariEnv(gym.Env, utils.EzPickle):
         if mode == 'rgb_array':
             return img
         elif mode == 'human':
-            from gym.envs.classic_control import rendering
             if self.viewer is None:
+                if self.viewer_factory is None:
+                    from gym.envs.classic_control import rendering
+                    self.viewer_factory = rendering.SimpleImageViewer
                 # self.viewer = rendering.SimpleImageViewer()
-                self.viewer = rendering.SimpleImageViewer(width=1920, height=1080, prev=prev, seq=seq, game=game, order=order)
+                self.viewer = self.viewer_factory(width=1920, height=1080, prev=prev, seq=seq, game=game, order=order)
+            elif self._viewer_released:
+                # viewer kept by release() : reuse the window for the new episode
+                self.viewer.reset(prev=prev, seq=seq, game=game, order=order)
+            self._viewer_released = False
 
             self.viewer.imshow(img)
             return self.viewer.isopen
@@ -191,6 +201,14 @@ class AtariEnv(gym.Env, utils.EzPickle):
 
         self.viewer.img_update(seq, prev, order)
 
+    def release(self):
+        """ end of an episode : same return value as close(), but the ROM and the viewer stay loaded """
+        reward = 0
+        if self.viewer is not None:
+            reward = self.viewer.release()
+            self._viewer_released = True
+        return reward
+
     def close(self):
         # if self.viewer is not None:
         #     self.viewer.close()
@@ -0,0 +1,118 @@
+"""
+Columnar per-episode log of the key rows and frame times of the Atari game loop.
+
+The game loop used to build a Python list per key row (info_key) and keep info_keys, ots
+and reward_per_images as growing lists of Python objects. Here the rows go into typed
+numpy structured arrays that are allocated in chunks of 'chunk_len' rows :
+
+    key rows   : mask (key bitmask, see key_table.py), action, rt (t_ep time of the latest press of
+                 the held keys, OS time stamp ; the poll time if the key stream missed it), uncertainty,
+                 complexity, order, poll (t_ep time of the 60 Hz poll that logged the row)
+    time rows  : time (t_ep), reward, frame (False for the fixation / episode start time points)
+
+The arrays are saved as they are (result_log.py, session_checkpoint.py) and only turned into
+the MATLAB layout of the former lists when the .mat files are written :
+    info_keys         - [label, rt, uncertainty, complexity, order] per key row ; the label of a
+                        row comes from the key table entry of its mask
+    observation_time  - time of all time rows
+    rewards_per_image - reward of the frame rows
+"""
+import numpy as np
+
+KEY_DTYPE = np.dtype([('mask', 'u1'), ('action', 'i2'), ('rt', 'f8'), ('uncertainty', 'u1'),
+                      ('complexity', 'i4'), ('order', 'u1'), ('poll', 'f8')])
+TIME_DTYPE = np.dtype([('time', 'f8'), ('reward', 'f8'), ('frame', '?')])
+
+
+class ColumnLog(object):
+    """ append-only structured array, grown by chunks of 'chunk_len' rows """
+
+    def __init__(self, dtype, chunk_len=4096):
+        self.dtype = np.dtype(dtype)
+        self.chunk_len = chunk_len
+        self._chunks = []
+        self._row = chunk_len  # row of the next append in the last chunk
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def append(self, values):
+        """ append one row given as a tuple in the field order of the dtype """
+        if self._row == self.chunk_len:
+            self._chunks.append(np.empty(self.chunk_len, dtype=self.dtype))
+            self._row = 0
+        self._chunks[-1][self._row] = values
+        self._row += 1
+        self.n += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row.item())
+
+    def array(self, start=0):
+        """ copy of the rows start ... n - 1 """
+        start = min(start, self.n)
+        if start == self.n:
+            return np.empty(0, dtype=self.dtype)
+        # only the chunks of the rows start ... n - 1 (a stage checkpoint takes the last few rows)
+        first = start // self.chunk_len
+        rows = np.concatenate(self._chunks[first:])
+        return rows[start - first * self.chunk_len:self.n - first * self.chunk_len]
+
+    def prepend(self, rows):
+        """ put 'rows' before the current rows (used once when an episode is resumed) """
+        current = self.array()
+        self._chunks = []
+        self._row = self.chunk_len
+        self.n = 0
+        self.extend(rows)
+        self.extend(current)
+
+
+class EpisodeLog(object):
+    """
+    usage :
+        episode_log = EpisodeLog(key_table)
+        episode_log.key(mask, action, rt, uncertainty, complexity, order, poll)    # key_processing()
+        episode_log.mark(t_ep.getTime())                                            # fixation / episode start
+        episode_log.frame(t_ep.getTime(), reward)                                   # every rendered frame
+    """
+
+    def __init__(self, key_table, chunk_len=4096):
+        # log label of every key bitmask (np.nan : nothing pressed)
+        self.labels = tuple(entry[1] for entry in key_table.entries)
+        self.keys = ColumnLog(KEY_DTYPE, chunk_len)
+        self.times = ColumnLog(TIME_DTYPE, chunk_len)
+
+    def key(self, mask, action, rt, uncertainty, complexity, order, poll=np.nan):
+        self.keys.append((mask, action, rt, uncertainty, complexity, order, poll))
+
+    def mark(self, t):
+        self.times.append((t, 0.0, False))
+
+    def frame(self, t, reward):
+        self.times.append((t, reward, True))
+
+    def rows(self, key_start=0, time_start=0):
+        """ {'key_rows', 'time_rows', 'key_labels'} from the given rows on, as saved """
+        return {'key_rows': self.keys.array(key_start), 'time_rows': self.times.array(time_start),
+                'key_labels': self.labels}
+
+    def prepend(self, key_rows, time_rows):
+        self.keys.prepend(key_rows)
+        self.times.prepend(time_rows)
+
+
+def to_info_keys(key_rows, key_labels):
+    """ key rows -> info_keys as key_processing() used to build it """
+    return [[key_labels[row['mask']], float(row['rt']), int(row['uncertainty']), int(row['complexity']),
+             int(row['order'])] for row in key_rows]
+
+
+def to_ots(time_rows):
+    return time_rows['time'].tolist()
+
+
+def to_rewards_per_image(time_rows):
+    return time_rows['reward'][time_rows['frame']].tolist()
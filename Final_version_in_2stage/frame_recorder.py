@@ -0,0 +1,177 @@
+"""
+Streaming frame recorder for the Atari sessions.
+
+Frames are handed over from the game loop through a bounded queue and written by a
+background thread into preallocated, memory-mapped .npy chunks on disk.
+Memory use does not grow with the length of a block, and frames that were already
+played are on disk even if the experiment code dies in the middle of a block.
+
+layout of one recording directory :
+    index.json          - frame shape, chunk length and number of frames written so far
+    chunk_00000.npy     - (chunk_len, 210, 160, 3) uint8, opened with np.lib.format.open_memmap
+    chunk_00001.npy     - ...
+"""
+import os
+import json
+import queue
+import threading
+import numpy as np
+
+FRAME_SHAPE = (210, 160, 3)  # ALE getScreenRGB2()
+
+_STOP = None
+
+
+def _chunk_path(direc, chunk_i):
+    return os.path.join(direc, 'chunk_{0:05d}.npy'.format(chunk_i))
+
+
+def _index_path(direc):
+    return os.path.join(direc, 'index.json')
+
+
+class FrameRecorder(object):
+    """
+    Record frames of one episode into 'direc'.
+
+    append() only blocks when the writer thread is more than 'max_queue' frames behind,
+    so the game loop never holds more than 'max_queue' frames in RAM.
+    """
+
+    def __init__(self, direc, frame_shape=FRAME_SHAPE, chunk_len=1024, max_queue=256, flush_every=60):
+        self.direc = direc
+        self.frame_shape = tuple(frame_shape)
+        self.chunk_len = chunk_len
+        self.flush_every = flush_every
+
+        self.n_frames = 0  # frames handed over by the game loop
+        self.n_written = 0  # frames written and flushed by the writer thread
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._chunk = None
+        self._chunk_i = -1
+        self._error = None
+        self._closed = False
+
+        if not os.path.exists(direc):
+            os.makedirs(direc)
+        self._write_index()
+
+        self._thread = threading.Thread(target=self._run, name='FrameRecorder', daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return self.n_frames
+
+    def append(self, frame):
+        """ hand one frame over to the writer thread """
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError('FrameRecorder for %s is already closed' % (self.direc,))
+
+        self._queue.put(frame)
+        self.n_frames += 1
+
+    def close(self):
+        """ wait until all frames are on disk and stop the writer thread """
+        if self._closed:
+            return self.n_written
+
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        return self.n_written
+
+    # ------------------------------------------------------------------
+    # writer thread
+
+    def _run(self):
+        unflushed = 0
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is _STOP:
+                    break
+
+                pos = self.n_written + unflushed
+                chunk_i, row = divmod(pos, self.chunk_len)
+                if chunk_i != self._chunk_i:
+                    self._open_chunk(chunk_i)
+
+                self._chunk[row] = frame
+                unflushed += 1
+
+                if unflushed >= self.flush_every or row == self.chunk_len - 1:
+                    self._flush(unflushed)
+                    unflushed = 0
+
+            self._flush(unflushed)
+            self._chunk = None
+
+        except Exception as e:
+            self._error = e
+            # keep draining so that append() never blocks on a dead writer
+            while self._queue.get() is not _STOP:
+                pass
+
+    def _open_chunk(self, chunk_i):
+        if self._chunk is not None:
+            self._chunk.flush()
+        self._chunk = np.lib.format.open_memmap(_chunk_path(self.direc, chunk_i), mode='w+', dtype=np.uint8,
+                                                shape=(self.chunk_len,) + self.frame_shape)
+        self._chunk_i = chunk_i
+
+    def _flush(self, unflushed):
+        if unflushed == 0:
+            return
+        self._chunk.flush()
+        self.n_written += unflushed
+        self._write_index()
+
+    def _write_index(self):
+        # written to a temporary file and renamed, so a crash never leaves a broken index
+        index = {'frame_shape': list(self.frame_shape), 'chunk_len': self.chunk_len, 'n_frames': self.n_written}
+        tmp = _index_path(self.direc) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, _index_path(self.direc))
+
+
+def read_index(direc):
+    with open(_index_path(direc), 'r') as f:
+        return json.load(f)
+
+
+def num_frames(direc):
+    return read_index(direc)['n_frames']
+
+
+def iter_frames(direc, start=0, stop=None):
+    """ yield the recorded frames [start, stop) of 'direc' one by one, without loading whole chunks """
+    index = read_index(direc)
+    chunk_len = index['chunk_len']
+    n = index['n_frames'] if stop is None else min(stop, index['n_frames'])
+
+    chunk_i = -1
+    chunk = None
+    for pos in range(start, n):
+        c, row = divmod(pos, chunk_len)
+        if c != chunk_i:
+            chunk = np.load(_chunk_path(direc, c), mmap_mode='r')
+            chunk_i = c
+        yield chunk[row]
+
+
+def load_frames(direc, start=0, stop=None):
+    """ recorded frames [start, stop) of 'direc' as one (n, 210, 160, 3) array """
+    index = read_index(direc)
+    n = index['n_frames'] if stop is None else min(stop, index['n_frames'])
+    frames = np.empty((max(n - start, 0),) + tuple(index['frame_shape']), dtype=np.uint8)
+    for i, frame in enumerate(iter_frames(direc, start, n)):
+        frames[i] = frame
+    return frames
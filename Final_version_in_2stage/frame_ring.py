@@ -0,0 +1,108 @@
+"""
+Shared-memory ring of Atari frames between the simulation and the presenter process.
+
+The simulation writes every rendered frame with the state of the score display into the
+next slot of a multiprocessing.shared_memory block ; the presenter only reads the latest
+slot, so a slow flip never blocks env.step and no frame goes through a pipe.
+
+layout of the shared memory block :
+    header   - int64 [counter (sequence number of the latest complete frame), visible]
+    meta     - n_slots x META_DTYPE (sequence number, write time, score display state)
+    frames   - n_slots x frame_shape uint8
+
+A slot is marked with sequence number -1 while it is written ; the reader checks the
+sequence number before and after copying a frame (seqlock) and retries on a torn read.
+"""
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+from frame_recorder import FRAME_SHAPE
+
+META_DTYPE = np.dtype([('seq', 'i8'), ('t_write', 'f8'), ('game', 'i4'), ('comp', 'i4'), ('order', 'i4'),
+                       ('prev', 'f8'), ('cur', 'f8')])
+
+_HEADER_BYTES = 64
+
+
+class FrameRing(object):
+    """
+    name=None creates the shared memory block (simulation side), otherwise it is attached
+    (presenter side) ; the creator unlinks it in close().
+    """
+
+    def __init__(self, n_slots=4, frame_shape=FRAME_SHAPE, name=None):
+        self.n_slots = n_slots
+        self.frame_shape = tuple(frame_shape)
+        frame_bytes = int(np.prod(self.frame_shape))
+        meta_bytes = n_slots * META_DTYPE.itemsize
+        size = _HEADER_BYTES + meta_bytes + n_slots * frame_bytes
+
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+
+        buf = self._shm.buf
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=buf, offset=0)
+        self.meta = np.ndarray((n_slots,), dtype=META_DTYPE, buffer=buf, offset=_HEADER_BYTES)
+        self.frames = np.ndarray((n_slots,) + self.frame_shape, dtype=np.uint8, buffer=buf,
+                                 offset=_HEADER_BYTES + meta_bytes)
+        if self._owner:
+            self._header[:] = 0
+            self.meta['seq'] = 0
+
+    # simulation side
+
+    def write(self, frame, game, comp, order, prev, cur):
+        """ publish a frame and the score display state ; returns its sequence number """
+        k = int(self._header[0]) + 1
+        slot = k % self.n_slots
+        meta = self.meta[slot:slot + 1]
+        meta['seq'] = -1
+        np.copyto(self.frames[slot], frame)
+        meta['t_write'] = time.perf_counter()
+        meta['game'] = game
+        meta['comp'] = comp
+        meta['order'] = order
+        meta['prev'] = prev
+        meta['cur'] = cur
+        meta['seq'] = k
+        self._header[0] = k
+        return k
+
+    def set_visible(self, visible):
+        self._header[1] = 1 if visible else 0
+
+    # presenter side
+
+    @property
+    def latest(self):
+        return int(self._header[0])
+
+    @property
+    def visible(self):
+        return bool(self._header[1])
+
+    def read_latest(self, out):
+        """ copy the latest frame into 'out' ; returns (sequence number, meta record) or (0, None) """
+        for _ in range(self.n_slots * 4):
+            k = int(self._header[0])
+            if k == 0:
+                return 0, None
+            slot = k % self.n_slots
+            if self.meta['seq'][slot] != k:
+                continue  # overwritten since the counter was read
+            np.copyto(out, self.frames[slot])
+            meta = self.meta[slot].copy()
+            if self.meta['seq'][slot] == k and meta['seq'] == k:
+                return k, meta
+        return 0, None
+
+    def close(self):
+        self._header = self.meta = self.frames = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -1 +1,3 @@
-from gym_task.envs.mountaincar import MountainCarEnv
+from gym_task.envs.mountaincar import MountainCarEnv, VectorMountainCar
+from gym_task.envs.cartpole import CartPoleEnv, VectorCartPole
+from gym_task.envs.acrobot import AcrobotEnv, VectorAcrobot
@@ -1,4 +1,5 @@
 """classic Acrobot task"""
+import math
 import numpy as np
 from numpy import sin, cos, pi
 
@@ -85,11 +86,14 @@ class AcrobotEnv(core.Env):
 
     def __init__(self):
         self.viewer = None
+        self._viewer_key = None  # (visible, software, link lengths) of the viewer
+        self.software_rendering = False  # rgb_array frames drawn by rasterizer.py (no GL context)
         high = np.array([1.0, 1.0, 1.0, 1.0, self.MAX_VEL_1, self.MAX_VEL_2], dtype=np.float32)
         low = -high
         self.observation_space = spaces.Box(low=low, high=high, dtype=np.float32)
         self.action_space = spaces.Discrete(3)
         self.state = None
+        self._rk4 = None  # built in step() from the constants above, again when they change
         self.seed()
 
     def seed(self, seed=None):
@@ -108,23 +112,15 @@ class AcrobotEnv(core.Env):
         if self.torque_noise_max > 0:
             torque += self.np_random.uniform(-self.torque_noise_max, self.torque_noise_max)
 
-        # Now, augment the state with our force action so it can be passed to
-        # _dsdt
-        s_augmented = np.append(s, torque)
-
-        ns = rk4(self._dsdt, s_augmented, [0, self.dt])
-        # only care about final timestep of integration returned by integrator
-        ns = ns[-1]
-        ns = ns[:4]  # omit action
+        # RK4 of _dsdt over dt, specialized to these equations (was rk4(self._dsdt, ...)),
+        # then the angles wrapped and the velocities bounded
         # ODEINT IS TOO SLOW!
         # ns_continuous = integrate.odeint(self._dsdt, self.s_continuous, [0, self.dt])
         # self.s_continuous = ns_continuous[-1] # We only care about the state
         # at the ''final timestep'', self.dt
-
-        ns[0] = wrap(ns[0], -pi, pi)
-        ns[1] = wrap(ns[1], -pi, pi)
-        ns[2] = bound(ns[2], -self.MAX_VEL_1, self.MAX_VEL_1)
-        ns[3] = bound(ns[3], -self.MAX_VEL_2, self.MAX_VEL_2)
+        if self._rk4 is None or self._rk4.params != _rk4_params(self):
+            self._rk4 = AcrobotRK4(self)
+        ns = self._rk4.step_one(s, torque)
         self.state = ns
         terminal = self._terminal()
         reward = -1. if not terminal else 0.
@@ -174,37 +170,26 @@ class AcrobotEnv(core.Env):
         return (dtheta1, dtheta2, ddtheta1, ddtheta2, 0.)
 
     def render(self, mode='human'):
-        from gym.envs.classic_control import rendering
-
         s = self.state
 
-        if self.viewer is None:
-            self.viewer = rendering.Viewer(500,500)
-            bound = self.LINK_LENGTH_1 + self.LINK_LENGTH_2 + 0.2  # 2.2 for default
-            self.viewer.set_bounds(-bound,bound,-bound,bound)
+        # a new viewer for a window after rgb_array frames, or for new link lengths ;
+        # once open, the window also gives the rgb_array frames
+        visible = mode == 'human' or (self._viewer_key is not None and self._viewer_key[0])
+        software = self.software_rendering and not visible
+        key = (visible, software, self.LINK_LENGTH_1, self.LINK_LENGTH_2)
+        if key != self._viewer_key:
+            self.close()
+            if software:
+                from gym_task.envs import rasterizer as rendering
+            else:
+                from gym_task.envs import rendering
+            self.viewer, self._place = _make_viewer(rendering, self.LINK_LENGTH_1, self.LINK_LENGTH_2,
+                                                    visible=visible)
+            self._viewer_key = key
 
         if s is None: return None
 
-        p1 = [-self.LINK_LENGTH_1 *
-              cos(s[0]), self.LINK_LENGTH_1 * sin(s[0])]
-
-        p2 = [p1[0] - self.LINK_LENGTH_2 * cos(s[0] + s[1]),
-              p1[1] + self.LINK_LENGTH_2 * sin(s[0] + s[1])]
-
-        xys = np.array([[0,0], p1, p2])[:,::-1]
-        thetas = [s[0]- pi/2, s[0]+s[1]-pi/2]
-        link_lengths = [self.LINK_LENGTH_1, self.LINK_LENGTH_2]
-
-        self.viewer.draw_line((-2.2, 1), (2.2, 1))
-        for ((x,y),th,llen) in zip(xys, thetas, link_lengths):
-            l,r,t,b = 0, llen, .1, -.1
-            jtransform = rendering.Transform(rotation=th, translation=(x,y))
-            link = self.viewer.draw_polygon([(l,b), (l,t), (r,t), (r,b)])
-            link.add_attr(jtransform)
-            link.set_color(0,.8, .8)
-            circ = self.viewer.draw_circle(.1)
-            circ.set_color(.8, .8, 0)
-            circ.add_attr(jtransform)
+        self._place(s[0], s[1])
 
         return self.viewer.render(return_rgb_array = mode=='rgb_array')
 
@@ -212,6 +197,45 @@ class AcrobotEnv(core.Env):
         if self.viewer:
             self.viewer.close()
             self.viewer = None
+        self._viewer_key = None
+
+def _make_viewer(rendering, link_length_1, link_length_2, **kwargs):
+    """
+    The acrobot scene in a 'rendering' Viewer (rendering.py, or rasterizer.py without GL) ;
+    returns (viewer, place) : place(theta1, theta2) moves the links (arrays of one value per
+    frame in a batched rasterizer Viewer).
+    """
+    viewer = rendering.Viewer(500,500, **kwargs)
+    bound = link_length_1 + link_length_2 + 0.2  # 2.2 for default
+    viewer.set_bounds(-bound,bound,-bound,bound)
+
+    # links and joints added once (retained) ; every frame only moves their transforms
+    viewer.add_geom(rendering.Line((-2.2, 1), (2.2, 1)))
+    link_transforms = []
+    for llen in [link_length_1, link_length_2]:
+        l,r,t,b = 0, llen, .1, -.1
+        jtransform = rendering.Transform()
+        link = rendering.make_polygon([(l,b), (l,t), (r,t), (r,b)])
+        link.add_attr(jtransform)
+        link.set_color(0,.8, .8)
+        viewer.add_geom(link)
+        circ = rendering.make_circle(.1)
+        circ.set_color(.8, .8, 0)
+        circ.add_attr(jtransform)
+        viewer.add_geom(circ)
+        link_transforms.append(jtransform)
+
+    def place(theta1, theta2):
+        p1 = [-link_length_1 * cos(theta1), link_length_1 * sin(theta1)]
+        xys = [(0, 0), (p1[1], p1[0])]
+        thetas = [theta1 - pi/2, theta1 + theta2 - pi/2]
+
+        for ((x,y),th,jtransform) in zip(xys, thetas, link_transforms):
+            jtransform.set_rotation(th)
+            jtransform.set_translation(x, y)
+
+    return viewer, place
+
 
 def wrap(x, m, M):
     """Wraps ``x`` so m <= x <= M; but unlike ``bound()`` which
@@ -291,9 +315,9 @@ def rk4(derivs, y0, t, *args, **kwargs):
     try:
         Ny = len(y0)
     except TypeError:
-        yout = np.zeros((len(t),), np.float_)
+        yout = np.zeros((len(t),), np.float64)
     else:
-        yout = np.zeros((len(t), Ny), np.float_)
+        yout = np.zeros((len(t), Ny), np.float64)
 
     yout[0] = y0
 
@@ -311,3 +335,303 @@ def rk4(derivs, y0, t, *args, **kwargs):
         k4 = np.asarray(derivs(y0 + dt * k3, thist + dt, *args, **kwargs))
         yout[i + 1] = y0 + dt / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
     return yout
+
+
+def _rk4_params(p):
+    """ the attributes of an AcrobotEnv (or the class) folded into an AcrobotRK4 """
+    return (p.LINK_MASS_1, p.LINK_MASS_2, p.LINK_LENGTH_1, p.LINK_COM_POS_1, p.LINK_COM_POS_2, p.LINK_MOI,
+            p.dt, p.book_or_nips, p.MAX_VEL_1, p.MAX_VEL_2)
+
+
+class AcrobotRK4(object):
+    """
+    RK4 step of the acrobot equations (AcrobotEnv._dsdt) for (N, 4) arrays of
+    states [theta1, theta2, dtheta1, dtheta2], with the constant torque of
+    each state over the step.
+
+    The physical constants are taken once from 'params' (an AcrobotEnv, or
+    the class for the defaults) and folded into the coefficients of the
+    equations ; 'self.params' keeps them (_rk4_params) so that AcrobotEnv
+    builds a new one when they change. The stages work on (4, N) buffers that are allocated once per
+    N, so a step does not allocate. step_one() is the same integration (same
+    operations, same results) on Python floats for a single state, where the
+    cost of the ~130 numpy calls of step() would dominate; AcrobotEnv uses it.
+
+    usage :
+        rk4_step = AcrobotRK4(env)
+        states = rk4_step.step(states, torques)     # wrapped / bounded as in AcrobotEnv.step
+    """
+
+    def __init__(self, params=None):
+        p = AcrobotEnv if params is None else params
+        m1, m2 = p.LINK_MASS_1, p.LINK_MASS_2
+        l1 = p.LINK_LENGTH_1
+        lc1, lc2 = p.LINK_COM_POS_1, p.LINK_COM_POS_2
+        I1 = I2 = p.LINK_MOI
+        g = 9.8
+
+        self.params = _rk4_params(p)
+        self.dt = p.dt
+        self.book = p.book_or_nips != "nips"
+        self.max_vel_1, self.max_vel_2 = p.MAX_VEL_1, p.MAX_VEL_2
+        # d1 = d1_0 + d1_c * cos(theta2), d2 = d2_0 + d2_c * cos(theta2)
+        self.d1_0 = m1 * lc1 ** 2 + m2 * (l1 ** 2 + lc2 ** 2) + I1 + I2
+        self.d1_c = 2 * m2 * l1 * lc2
+        self.d2_0 = m2 * lc2 ** 2 + I2
+        self.d2_c = m2 * l1 * lc2
+        self.phi1_c = (m1 * lc1 + m2 * l1) * g
+        self.phi2_c = m2 * lc2 * g
+        self.coriolis = m2 * l1 * lc2
+        self.inertia_2 = m2 * lc2 ** 2 + I2
+        self.n = None
+
+    def _allocate(self, n):
+        self.n = n
+        self._y0 = np.empty((4, n))
+        self._y = np.empty((4, n))
+        self._k = np.empty((4, 4, n))
+        self._tmp = np.empty((7, n))
+        self._torque = np.empty(n)
+        self._mask = np.empty(n, dtype=bool)
+
+    def _derivs(self, y, a, dydt):
+        """ time derivative of the (4, N) states y into dydt """
+        theta1, theta2, dtheta1, dtheta2 = y
+        c2, s2, d1, d2, phi1, phi2, tmp = self._tmp
+
+        np.cos(theta2, out=c2)
+        np.sin(theta2, out=s2)
+        np.multiply(c2, self.d1_c, out=d1)
+        d1 += self.d1_0
+        np.multiply(c2, self.d2_c, out=d2)
+        d2 += self.d2_0
+
+        # phi2 = m2 * lc2 * g * cos(theta1 + theta2 - pi / 2)
+        np.add(theta1, theta2, out=phi2)
+        phi2 -= pi / 2.
+        np.cos(phi2, out=phi2)
+        phi2 *= self.phi2_c
+        # phi1 = - m2 * l1 * lc2 * sin(theta2) * dtheta2 * (dtheta2 + 2 * dtheta1)
+        #        + (m1 * lc1 + m2 * l1) * g * cos(theta1 - pi / 2) + phi2
+        np.subtract(theta1, pi / 2, out=tmp)
+        np.cos(tmp, out=tmp)
+        tmp *= self.phi1_c
+        np.multiply(dtheta1, 2, out=phi1)
+        phi1 += dtheta2
+        phi1 *= dtheta2
+        phi1 *= s2
+        phi1 *= -self.coriolis
+        phi1 += tmp
+        phi1 += phi2
+
+        ddtheta1, ddtheta2 = dydt[2], dydt[3]
+        np.divide(d2, d1, out=tmp)
+        np.multiply(tmp, phi1, out=ddtheta2)
+        ddtheta2 += a
+        ddtheta2 -= phi2
+        if self.book:
+            # - m2 * l1 * lc2 * dtheta1 ** 2 * sin(theta2) ; c2 is free from here on
+            np.multiply(dtheta1, dtheta1, out=c2)
+            c2 *= s2
+            c2 *= self.coriolis
+            ddtheta2 -= c2
+        # / (m2 * lc2 ** 2 + I2 - d2 ** 2 / d1)
+        tmp *= d2
+        np.subtract(self.inertia_2, tmp, out=tmp)
+        ddtheta2 /= tmp
+        # ddtheta1 = -(d2 * ddtheta2 + phi1) / d1
+        np.multiply(d2, ddtheta2, out=ddtheta1)
+        ddtheta1 += phi1
+        ddtheta1 /= d1
+        np.negative(ddtheta1, out=ddtheta1)
+        dydt[0] = dtheta1
+        dydt[1] = dtheta2
+
+    def _integrate(self, s, torque):
+        """ RK4 over dt from the (N, 4) states s ; the result stays in self._y as (4, N) """
+        s = np.asarray(s, dtype=np.float64)
+        if s.shape[0] != self.n:
+            self._allocate(s.shape[0])
+        y0, y, a = self._y0, self._y, self._torque
+        k1, k2, k3, k4 = self._k
+        dt = self.dt
+        np.copyto(y0, s.T)
+        np.copyto(a, torque)
+
+        self._derivs(y0, a, k1)
+        np.multiply(k1, dt / 2.0, out=y)
+        y += y0
+        self._derivs(y, a, k2)
+        np.multiply(k2, dt / 2.0, out=y)
+        y += y0
+        self._derivs(y, a, k3)
+        np.multiply(k3, dt, out=y)
+        y += y0
+        self._derivs(y, a, k4)
+        # y0 + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        np.add(k2, k3, out=y)
+        y *= 2
+        y += k1
+        y += k4
+        y *= dt / 6.0
+        y += y0
+        return y
+
+    def integrate(self, s, torque, out=None):
+        """ (N, 4) states after dt with the (N,) torques, without wrapping / bounding """
+        y = self._integrate(s, torque)
+        if out is None:
+            out = np.empty((self.n, 4))
+        np.copyto(out, y.T)
+        return out
+
+    def step(self, s, torque, out=None):
+        """ integrate(), then the angles wrapped to [-pi, pi] and the velocities bounded as in AcrobotEnv.step """
+        y = self._integrate(s, torque)
+        mask = self._mask
+        for theta in (y[0], y[1]):
+            while np.greater(theta, pi, out=mask).any():
+                np.subtract(theta, 2 * pi, out=theta, where=mask)
+            while np.less(theta, -pi, out=mask).any():
+                np.add(theta, 2 * pi, out=theta, where=mask)
+        np.clip(y[2], -self.max_vel_1, self.max_vel_1, out=y[2])
+        np.clip(y[3], -self.max_vel_2, self.max_vel_2, out=y[3])
+        if out is None:
+            out = np.empty((self.n, 4))
+        np.copyto(out, y.T)
+        return out
+
+    def _derivs_one(self, theta1, theta2, dtheta1, dtheta2, a, cos_=math.cos, sin_=math.sin):
+        c2 = cos_(theta2)
+        s2 = sin_(theta2)
+        d1 = self.d1_0 + self.d1_c * c2
+        d2 = self.d2_0 + self.d2_c * c2
+        phi2 = self.phi2_c * cos_(theta1 + theta2 - pi / 2.)
+        phi1 = -self.coriolis * (s2 * (dtheta2 * (dtheta1 * 2 + dtheta2))) \
+            + self.phi1_c * cos_(theta1 - pi / 2) + phi2
+        r = d2 / d1
+        ddtheta2 = r * phi1 + a - phi2
+        if self.book:
+            ddtheta2 -= self.coriolis * (s2 * (dtheta1 * dtheta1))
+        ddtheta2 /= self.inertia_2 - r * d2
+        ddtheta1 = -(d2 * ddtheta2 + phi1) / d1
+        return dtheta1, dtheta2, ddtheta1, ddtheta2
+
+    def step_one(self, s, torque):
+        """ step() of a single state (sequence of 4 floats) ; returns a (4,) array """
+        theta1, theta2, dtheta1, dtheta2 = s.tolist() if isinstance(s, np.ndarray) else map(float, s)
+        a = float(torque)
+        dt = self.dt
+        h = dt / 2.0
+        derivs = self._derivs_one
+        k1 = derivs(theta1, theta2, dtheta1, dtheta2, a)
+        k2 = derivs(theta1 + h * k1[0], theta2 + h * k1[1], dtheta1 + h * k1[2], dtheta2 + h * k1[3], a)
+        k3 = derivs(theta1 + h * k2[0], theta2 + h * k2[1], dtheta1 + h * k2[2], dtheta2 + h * k2[3], a)
+        k4 = derivs(theta1 + dt * k3[0], theta2 + dt * k3[1], dtheta1 + dt * k3[2], dtheta2 + dt * k3[3], a)
+        w = dt / 6.0
+        theta1 += w * ((k2[0] + k3[0]) * 2 + k1[0] + k4[0])
+        theta2 += w * ((k2[1] + k3[1]) * 2 + k1[1] + k4[1])
+        dtheta1 += w * ((k2[2] + k3[2]) * 2 + k1[2] + k4[2])
+        dtheta2 += w * ((k2[3] + k3[3]) * 2 + k1[3] + k4[3])
+        return np.array([wrap(theta1, -pi, pi), wrap(theta2, -pi, pi),
+                         bound(dtheta1, -self.max_vel_1, self.max_vel_1),
+                         bound(dtheta2, -self.max_vel_2, self.max_vel_2)])
+
+
+class VectorAcrobot(object):
+    """
+    N independent acrobots stepped in one vectorized call (AcrobotRK4.step),
+    for offline rollouts. The dynamics, observations and termination rule are
+    those of AcrobotEnv ; the states are the rows of the (N, 4) array
+    self.state.
+
+    With autoreset=True the envs whose episode ends in a step are reset in the
+    same call : the returned observation is the first one of the new episode
+    and the last one of the finished episode is in
+    info['terminal_observation']. max_episode_steps ends the episodes after
+    that many steps, as the TimeLimit wrapper of gym.make does
+    (info['TimeLimit.truncated']).
+
+    usage :
+        envs = VectorAcrobot(1024, max_episode_steps=500)
+        envs.seed(0)
+        obs = envs.reset()
+        obs, rewards, dones, info = envs.step(actions)    # actions : (N,) of 0 / 1 / 2
+    """
+
+    def __init__(self, num_envs, autoreset=True, max_episode_steps=None, params=None):
+        self.num_envs = num_envs
+        self.autoreset = autoreset
+        self.max_episode_steps = max_episode_steps
+        p = AcrobotEnv if params is None else params
+        self.torque_noise_max = p.torque_noise_max
+        self.avail_torque = np.array(p.AVAIL_TORQUE, dtype=np.float64)
+        self.link_length_1, self.link_length_2 = p.LINK_LENGTH_1, p.LINK_LENGTH_2
+        self._rk4 = AcrobotRK4(p)
+
+        high = np.array([1.0, 1.0, 1.0, 1.0, p.MAX_VEL_1, p.MAX_VEL_2], dtype=np.float32)
+        self.single_observation_space = spaces.Box(low=-high, high=high, dtype=np.float32)
+        self.single_action_space = spaces.Discrete(3)
+        self.observation_space = spaces.Box(low=-np.tile(high, (num_envs, 1)), high=np.tile(high, (num_envs, 1)),
+                                            dtype=np.float32)
+        self.action_space = spaces.MultiDiscrete([3] * num_envs)
+
+        self.seed()
+        self.viewer = None
+        self.state = np.zeros((num_envs, 4))
+        self.elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def reset(self, mask=None):
+        """ new episodes for the envs of the boolean 'mask' (default : all) ; observations of all envs """
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        self.state[mask] = self.np_random.uniform(low=-0.1, high=0.1, size=(int(np.count_nonzero(mask)), 4))
+        self.elapsed_steps[mask] = 0
+        return self._get_ob()
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        assert actions.shape == (self.num_envs,) and np.all((actions >= 0) & (actions <= 2)), \
+            "%r invalid" % (actions,)
+        torque = self.avail_torque[actions]
+        if self.torque_noise_max > 0:
+            torque += self.np_random.uniform(-self.torque_noise_max, self.torque_noise_max, size=self.num_envs)
+
+        s = self._rk4.step(self.state, torque, out=self.state)
+        dones = -cos(s[:, 0]) - cos(s[:, 1] + s[:, 0]) > 1.
+        rewards = np.where(dones, 0., -1.)
+
+        info = {}
+        self.elapsed_steps += 1
+        if self.max_episode_steps is not None:
+            truncated = (self.elapsed_steps >= self.max_episode_steps) & ~dones
+            info['TimeLimit.truncated'] = truncated
+            dones = dones | truncated
+        obs = self._get_ob()
+        if self.autoreset and dones.any():
+            info['terminal_observation'] = obs
+            obs = self.reset(dones)
+        return obs, rewards, dones, info
+
+    def _get_ob(self):
+        s = self.state
+        return np.stack([cos(s[:, 0]), sin(s[:, 0]), cos(s[:, 1]), sin(s[:, 1]), s[:, 2], s[:, 3]], axis=1)
+
+    def render(self, mode='rgb_array', out=None):
+        """ (N, 500, 500, 3) uint8 frames of all envs, drawn by rasterizer.py (no GL) into 'out' if given """
+        assert mode == 'rgb_array', mode
+        if self.viewer is None:
+            from gym_task.envs import rasterizer
+            self.viewer, self._place = _make_viewer(rasterizer, self.link_length_1, self.link_length_2,
+                                                    batch=self.num_envs)
+        self._place(self.state[:, 0], self.state[:, 1])
+        return self.viewer.render(return_rgb_array=True, out=out)
+
+    def close(self):
+        if self.viewer:
+            self.viewer.close()
+            self.viewer = None
@@ -91,7 +91,9 @@ class CartPoleEnv(gym.Env):
 
         self.seed()
         self.viewer = None
+        self._viewer_key = None  # (visible, software, length, x_threshold) of the viewer
         self.state = None
+        self.software_rendering = False  # rgb_array frames drawn by rasterizer.py (no GL context)
 
         self.steps_beyond_done = None
 
@@ -159,56 +161,26 @@ class CartPoleEnv(gym.Env):
         return np.array(self.state)
 
     def render(self, mode='human'):
-        screen_width = 600
-        screen_height = 400
-
-        world_width = self.x_threshold * 2
-        scale = screen_width/world_width
-        carty = 100  # TOP OF CART
-        polewidth = 10.0
-        polelen = scale * (2 * self.length)
-        cartwidth = 50.0
-        cartheight = 30.0
-
-        if self.viewer is None:
-            from gym.envs.classic_control import rendering
-            self.viewer = rendering.Viewer(screen_width, screen_height)
-            l, r, t, b = -cartwidth / 2, cartwidth / 2, cartheight / 2, -cartheight / 2
-            axleoffset = cartheight / 4.0
-            cart = rendering.FilledPolygon([(l, b), (l, t), (r, t), (r, b)])
-            self.carttrans = rendering.Transform()
-            cart.add_attr(self.carttrans)
-            self.viewer.add_geom(cart)
-            l, r, t, b = -polewidth / 2, polewidth / 2, polelen - polewidth / 2, -polewidth / 2
-            pole = rendering.FilledPolygon([(l, b), (l, t), (r, t), (r, b)])
-            pole.set_color(.8, .6, .4)
-            self.poletrans = rendering.Transform(translation=(0, axleoffset))
-            pole.add_attr(self.poletrans)
-            pole.add_attr(self.carttrans)
-            self.viewer.add_geom(pole)
-            self.axle = rendering.make_circle(polewidth/2)
-            self.axle.add_attr(self.poletrans)
-            self.axle.add_attr(self.carttrans)
-            self.axle.set_color(.5, .5, .8)
-            self.viewer.add_geom(self.axle)
-            self.track = rendering.Line((0, carty), (screen_width, carty))
-            self.track.set_color(0, 0, 0)
-            self.viewer.add_geom(self.track)
-
-            self._pole_geom = pole
+        # a new viewer for a window after rgb_array frames, or for a new length / x_threshold ;
+        # once open, the window also gives the rgb_array frames
+        visible = mode == 'human' or (self._viewer_key is not None and self._viewer_key[0])
+        software = self.software_rendering and not visible
+        key = (visible, software, self.length, self.x_threshold)
+        if key != self._viewer_key:
+            self.close()
+            if software:
+                from gym_task.envs import rasterizer as rendering
+            else:
+                from gym_task.envs import rendering
+            self.viewer, self._place = _make_viewer(rendering, self, visible=visible)
+            self._viewer_key = key
 
         if self.state is None:
             return None
 
-        # Edit the pole polygon vertex
-        pole = self._pole_geom
-        l, r, t, b = -polewidth / 2, polewidth / 2, polelen - polewidth / 2, -polewidth / 2
-        pole.v = [(l, b), (l, t), (r, t), (r, b)]
-
+        # the geometry stays in the viewer (retained), only the transforms change
         x = self.state
-        cartx = x[0] * scale + screen_width / 2.0  # MIDDLE OF CART
-        self.carttrans.set_translation(cartx, carty)
-        self.poletrans.set_rotation(-x[2])
+        self._place(x[0], x[2])
 
         return self.viewer.render(return_rgb_array=mode == 'rgb_array')
 
@@ -216,3 +188,188 @@ class CartPoleEnv(gym.Env):
         if self.viewer:
             self.viewer.close()
             self.viewer = None
+        self._viewer_key = None
+
+
+def _make_viewer(rendering, env, **kwargs):
+    """
+    The cart-pole scene of env (length, x_threshold) in a 'rendering' Viewer (rendering.py, or
+    rasterizer.py without GL) ; returns (viewer, place) : place(x, theta) moves the cart and
+    the pole (arrays of one value per frame in a batched rasterizer Viewer). The pole length is
+    fixed in the scene ; CartPoleEnv.render() builds a new viewer when env.length changes.
+    """
+    screen_width = 600
+    screen_height = 400
+
+    world_width = env.x_threshold * 2
+    scale = screen_width/world_width
+    carty = 100  # TOP OF CART
+    polewidth = 10.0
+    polelen = scale * (2 * env.length)
+    cartwidth = 50.0
+    cartheight = 30.0
+
+    viewer = rendering.Viewer(screen_width, screen_height, **kwargs)
+    l, r, t, b = -cartwidth / 2, cartwidth / 2, cartheight / 2, -cartheight / 2
+    axleoffset = cartheight / 4.0
+    cart = rendering.FilledPolygon([(l, b), (l, t), (r, t), (r, b)])
+    carttrans = rendering.Transform()
+    cart.add_attr(carttrans)
+    viewer.add_geom(cart)
+    l, r, t, b = -polewidth / 2, polewidth / 2, polelen - polewidth / 2, -polewidth / 2
+    pole = rendering.FilledPolygon([(l, b), (l, t), (r, t), (r, b)])
+    pole.set_color(.8, .6, .4)
+    poletrans = rendering.Transform(translation=(0, axleoffset))
+    pole.add_attr(poletrans)
+    pole.add_attr(carttrans)
+    viewer.add_geom(pole)
+    axle = rendering.make_circle(polewidth/2)
+    axle.add_attr(poletrans)
+    axle.add_attr(carttrans)
+    axle.set_color(.5, .5, .8)
+    viewer.add_geom(axle)
+    track = rendering.Line((0, carty), (screen_width, carty))
+    track.set_color(0, 0, 0)
+    viewer.add_geom(track)
+
+    def place(x, theta):
+        cartx = x * scale + screen_width / 2.0  # MIDDLE OF CART
+        carttrans.set_translation(cartx, carty)
+        poletrans.set_rotation(-theta)
+
+    return viewer, place
+
+
+class VectorCartPole(object):
+    """
+    Description:
+        N independent cart-poles stepped in one vectorized call, for offline
+        rollouts. The dynamics and termination rules are those of CartPoleEnv ;
+        the states are the rows of the (N, 4) array self.state.
+
+    Auto-reset:
+        With autoreset=True the envs whose episode ends in a step are reset in
+        the same call : the returned observation is the first one of the new
+        episode and the last one of the finished episode is in
+        info['terminal_observation']. Without it the finished envs go on with
+        reward 0 while out of bounds (as CartPoleEnv after done) until
+        reset(mask) is called.
+
+        max_episode_steps ends the episodes after that many steps, as the
+        TimeLimit wrapper of gym.make does (info['TimeLimit.truncated']).
+
+    usage :
+        envs = VectorCartPole(1024)
+        envs.seed(0)
+        obs = envs.reset()
+        obs, rewards, dones, info = envs.step(actions)    # actions : (N,) of 0 / 1
+    """
+
+    def __init__(self, num_envs, autoreset=True, max_episode_steps=None):
+        self.num_envs = num_envs
+        self.autoreset = autoreset
+        self.max_episode_steps = max_episode_steps
+
+        self.gravity = 9.8
+        self.masscart = 1.0
+        self.masspole = 0.1
+        self.total_mass = (self.masspole + self.masscart)
+        self.length = 0.5  # actually half the pole's length
+        self.polemass_length = (self.masspole * self.length)
+        self.force_mag = 10.0
+        self.tau = 0.02  # seconds between state updates
+        self.kinematics_integrator = 'euler'
+
+        self.theta_threshold_radians = 12 * 2 * math.pi / 360
+        self.x_threshold = 2.4
+
+        high = np.array([self.x_threshold * 2,
+                         np.finfo(np.float32).max,
+                         self.theta_threshold_radians * 2,
+                         np.finfo(np.float32).max],
+                        dtype=np.float32)
+
+        self.single_action_space = spaces.Discrete(2)
+        self.single_observation_space = spaces.Box(-high, high, dtype=np.float32)
+        self.action_space = spaces.MultiDiscrete([2] * num_envs)
+        self.observation_space = spaces.Box(-np.tile(high, (num_envs, 1)), np.tile(high, (num_envs, 1)),
+                                            dtype=np.float32)
+
+        self.seed()
+        self.viewer = None
+        self.state = np.zeros((num_envs, 4))
+        self.elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self.finished = np.zeros(num_envs, dtype=bool)  # done returned since the reset (steps_beyond_done)
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def reset(self, mask=None):
+        """ new episodes for the envs of the boolean 'mask' (default : all) ; observations of all envs """
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        self.state[mask] = self.np_random.uniform(low=-0.05, high=0.05, size=(int(np.count_nonzero(mask)), 4))
+        self.elapsed_steps[mask] = 0
+        self.finished[mask] = False
+        return self.state.copy()
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        assert actions.shape == (self.num_envs,) and np.all((actions == 0) | (actions == 1)), \
+            "%r invalid" % (actions,)
+
+        state = self.state
+        x, x_dot, theta, theta_dot = state[:, 0], state[:, 1], state[:, 2], state[:, 3]
+        force = np.where(actions == 1, self.force_mag, -self.force_mag)
+        costheta = np.cos(theta)
+        sintheta = np.sin(theta)
+
+        temp = (force + self.polemass_length * theta_dot ** 2 * sintheta) / self.total_mass
+        thetaacc = (self.gravity * sintheta - costheta * temp) / (self.length * (4.0 / 3.0 - self.masspole * costheta ** 2 / self.total_mass))
+        xacc = temp - self.polemass_length * thetaacc * costheta / self.total_mass
+
+        # in place : x, x_dot, ... are views of self.state
+        if self.kinematics_integrator == 'euler':
+            x += self.tau * x_dot
+            x_dot += self.tau * xacc
+            theta += self.tau * theta_dot
+            theta_dot += self.tau * thetaacc
+        else:  # semi-implicit euler
+            x_dot += self.tau * xacc
+            x += self.tau * x_dot
+            theta_dot += self.tau * thetaacc
+            theta += self.tau * theta_dot
+
+        dones = ((x < -self.x_threshold) | (x > self.x_threshold)
+                 | (theta < -self.theta_threshold_radians) | (theta > self.theta_threshold_radians))
+        rewards = np.where(dones & self.finished, 0.0, 1.0)
+        self.finished |= dones
+        return self._end_step(rewards, dones)
+
+    def _end_step(self, rewards, dones):
+        info = {}
+        self.elapsed_steps += 1
+        if self.max_episode_steps is not None:
+            truncated = (self.elapsed_steps >= self.max_episode_steps) & ~dones
+            info['TimeLimit.truncated'] = truncated
+            dones = dones | truncated
+        obs = self.state.copy()
+        if self.autoreset and dones.any():
+            info['terminal_observation'] = obs
+            obs = self.reset(dones)
+        return obs, rewards, dones, info
+
+    def render(self, mode='rgb_array', out=None):
+        """ (N, 400, 600, 3) uint8 frames of all envs, drawn by rasterizer.py (no GL) into 'out' if given """
+        assert mode == 'rgb_array', mode
+        if self.viewer is None:
+            from gym_task.envs import rasterizer
+            self.viewer, self._place = _make_viewer(rasterizer, self, batch=self.num_envs)
+        self._place(self.state[:, 0], self.state[:, 2])
+        return self.viewer.render(return_rgb_array=True, out=out)
+
+    def close(self):
+        if self.viewer:
+            self.viewer.close()
+            self.viewer = None
@@ -71,6 +71,8 @@ class MountainCarEnv(gym.Env):
     )
 
     self.viewer = None
+    self._viewer_key = None  # (visible, software, screen size, positions) of the viewer
+    self.software_rendering = False  # rgb_array frames drawn by rasterizer.py (no GL context)
 
     self.action_space = spaces.Discrete(3)
     self.observation_space = spaces.Box(
@@ -110,63 +112,24 @@ class MountainCarEnv(gym.Env):
     return np.sin(3 * xs) * .45 + .55
 
   def render(self, mode='human', screen_width=1920, screen_height=1080):
-    screen_width = screen_width
-    screen_height = screen_height
-
-    world_width = self.max_position - self.min_position
-    scale = screen_width / world_width
-    carwidth = 40
-    carheight = 20
-
-    if self.viewer is None:
-      from gym_task.envs import rendering
-      self.viewer = rendering.Viewer(screen_width, screen_height)
-      xs = np.linspace(self.min_position, self.max_position, 100)
-      ys = self._height(xs)
-      xys = list(zip((xs - self.min_position) * scale, ys * scale))
-
-      self.track = rendering.make_polyline(xys)
-      self.track.set_linewidth(4)
-      self.viewer.add_geom(self.track)
-
-      clearance = 10
-
-      l, r, t, b = -carwidth / 2, carwidth / 2, carheight, 0
-      car = rendering.FilledPolygon([(l, b), (l, t), (r, t), (r, b)])
-      car.add_attr(rendering.Transform(translation=(0, clearance)))
-      self.cartrans = rendering.Transform()
-      car.add_attr(self.cartrans)
-      self.viewer.add_geom(car)
-      frontwheel = rendering.make_circle(carheight / 2.5)
-      frontwheel.set_color(.5, .5, .5)
-      frontwheel.add_attr(
-        rendering.Transform(translation=(carwidth / 4, clearance))
-      )
-      frontwheel.add_attr(self.cartrans)
-      self.viewer.add_geom(frontwheel)
-      backwheel = rendering.make_circle(carheight / 2.5)
-      backwheel.add_attr(
-        rendering.Transform(translation=(-carwidth / 4, clearance))
+    # a new viewer for a window after rgb_array frames, or for a new screen size / track ;
+    # once open, the window also gives the rgb_array frames
+    visible = mode == 'human' or (self._viewer_key is not None and self._viewer_key[0])
+    software = self.software_rendering and not visible
+    key = (visible, software, screen_width, screen_height, self.min_position, self.max_position,
+           self.goal_position)
+    if key != self._viewer_key:
+      self.close()
+      if software:
+        from gym_task.envs import rasterizer as rendering
+      else:
+        from gym_task.envs import rendering
+      self.viewer, self._place = _make_viewer(
+        rendering, self, screen_width, screen_height, visible=visible
       )
-      backwheel.add_attr(self.cartrans)
-      backwheel.set_color(.5, .5, .5)
-      self.viewer.add_geom(backwheel)
-      flagx = (self.goal_position - self.min_position) * scale
-      flagy1 = self._height(self.goal_position) * scale
-      flagy2 = flagy1 + 50
-      flagpole = rendering.Line((flagx, flagy1), (flagx, flagy2))
-      self.viewer.add_geom(flagpole)
-      flag = rendering.FilledPolygon(
-        [(flagx, flagy2), (flagx, flagy2 - 10), (flagx + 25, flagy2 - 5)]
-      )
-      flag.set_color(.8, .8, 0)
-      self.viewer.add_geom(flag)
+      self._viewer_key = key
 
-    pos = self.state[0]
-    self.cartrans.set_translation(
-      (pos - self.min_position) * scale, self._height(pos) * scale
-    )
-    self.cartrans.set_rotation(math.cos(3 * pos))
+    self._place(self.state[0])
 
     return self.viewer.render(return_rgb_array=mode == 'rgb_array')
 
@@ -178,3 +141,187 @@ class MountainCarEnv(gym.Env):
     if self.viewer:
       self.viewer.close()
       self.viewer = None
+    self._viewer_key = None
+
+
+def _make_viewer(rendering, env, screen_width, screen_height, **kwargs):
+  """
+  The mountain car scene of env in a 'rendering' Viewer (rendering.py, or rasterizer.py
+  without GL) ; returns (viewer, place) : place(position) moves the car (an array of one
+  position per frame in a batched rasterizer Viewer).
+  """
+  world_width = env.max_position - env.min_position
+  scale = screen_width / world_width
+  carwidth = 40
+  carheight = 20
+
+  viewer = rendering.Viewer(screen_width, screen_height, **kwargs)
+  xs = np.linspace(env.min_position, env.max_position, 100)
+  ys = env._height(xs)
+  xys = list(zip((xs - env.min_position) * scale, ys * scale))
+
+  track = rendering.make_polyline(xys)
+  track.set_linewidth(4)
+  viewer.add_geom(track)
+
+  clearance = 10
+
+  l, r, t, b = -carwidth / 2, carwidth / 2, carheight, 0
+  car = rendering.FilledPolygon([(l, b), (l, t), (r, t), (r, b)])
+  car.add_attr(rendering.Transform(translation=(0, clearance)))
+  cartrans = rendering.Transform()
+  car.add_attr(cartrans)
+  viewer.add_geom(car)
+  frontwheel = rendering.make_circle(carheight / 2.5)
+  frontwheel.set_color(.5, .5, .5)
+  frontwheel.add_attr(
+    rendering.Transform(translation=(carwidth / 4, clearance))
+  )
+  frontwheel.add_attr(cartrans)
+  viewer.add_geom(frontwheel)
+  backwheel = rendering.make_circle(carheight / 2.5)
+  backwheel.add_attr(
+    rendering.Transform(translation=(-carwidth / 4, clearance))
+  )
+  backwheel.add_attr(cartrans)
+  backwheel.set_color(.5, .5, .5)
+  viewer.add_geom(backwheel)
+  flagx = (env.goal_position - env.min_position) * scale
+  flagy1 = env._height(env.goal_position) * scale
+  flagy2 = flagy1 + 50
+  flagpole = rendering.Line((flagx, flagy1), (flagx, flagy2))
+  viewer.add_geom(flagpole)
+  flag = rendering.FilledPolygon(
+    [(flagx, flagy2), (flagx, flagy2 - 10), (flagx + 25, flagy2 - 5)]
+  )
+  flag.set_color(.8, .8, 0)
+  viewer.add_geom(flag)
+
+  def place(pos):
+    cartrans.set_translation(
+      (pos - env.min_position) * scale, env._height(pos) * scale
+    )
+    cartrans.set_rotation(np.cos(3 * pos))
+
+  return viewer, place
+
+
+class VectorMountainCar(object):
+  """
+  Description:
+      N independent mountain cars stepped in one vectorized call, for offline
+      rollouts. The dynamics and termination rules are those of
+      MountainCarEnv ; the states are the rows of the (N, 2) array self.state.
+
+  Auto-reset:
+      With autoreset=True the envs whose episode ends in a step are reset in
+      the same call : the returned observation is the first one of the new
+      episode and the last one of the finished episode is in
+      info['terminal_observation']. Without it the finished envs go on (as
+      MountainCarEnv after done) until reset(mask) is called.
+
+      max_episode_steps ends the episodes after that many steps, as the
+      TimeLimit wrapper of gym.make does (info['TimeLimit.truncated']).
+
+  usage :
+      envs = VectorMountainCar(1024, max_episode_steps=200)
+      envs.seed(0)
+      obs = envs.reset()
+      obs, rewards, dones, info = envs.step(actions)    # actions : (N,) of 0 / 1 / 2
+  """
+
+  def __init__(self, num_envs, goal_velocity=0, autoreset=True, max_episode_steps=None):
+    self.num_envs = num_envs
+    self.autoreset = autoreset
+    self.max_episode_steps = max_episode_steps
+
+    self.min_position = -1.2
+    self.max_position = 0.6
+    self.max_speed = 0.07
+    self.goal_position = 0.5
+    self.goal_velocity = goal_velocity
+
+    self.force = 0.001
+    self.gravity = 0.0025
+
+    self.low = np.array(
+      [self.min_position, -self.max_speed], dtype=np.float32
+    )
+    self.high = np.array(
+      [self.max_position, self.max_speed], dtype=np.float32
+    )
+
+    self.single_action_space = spaces.Discrete(3)
+    self.single_observation_space = spaces.Box(
+      self.low, self.high, dtype=np.float32
+    )
+    self.action_space = spaces.MultiDiscrete([3] * num_envs)
+    self.observation_space = spaces.Box(
+      np.tile(self.low, (num_envs, 1)), np.tile(self.high, (num_envs, 1)), dtype=np.float32
+    )
+
+    self.seed()
+    self.viewer = None
+    self.state = np.zeros((num_envs, 2))
+    self.elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+
+  def seed(self, seed=None):
+    self.np_random, seed = seeding.np_random(seed)
+    return [seed]
+
+  def reset(self, mask=None):
+    """ new episodes for the envs of the boolean 'mask' (default : all) ; observations of all envs """
+    if mask is None:
+      mask = np.ones(self.num_envs, dtype=bool)
+    n = int(np.count_nonzero(mask))
+    self.state[mask, 0] = self.np_random.uniform(low=-0.6, high=-0.4, size=n)
+    self.state[mask, 1] = 0
+    self.elapsed_steps[mask] = 0
+    return self.state.copy()
+
+  def step(self, actions):
+    actions = np.asarray(actions)
+    assert actions.shape == (self.num_envs,) and np.all((actions >= 0) & (actions <= 2)), \
+      "%r invalid" % (actions,)
+
+    # in place : position and velocity are views of self.state
+    position, velocity = self.state[:, 0], self.state[:, 1]
+    velocity += (actions - 1) * self.force + np.cos(3 * position) * (-self.gravity)
+    np.clip(velocity, -self.max_speed, self.max_speed, out=velocity)
+    position += velocity
+    np.clip(position, self.min_position, self.max_position, out=position)
+    velocity[(position == self.min_position) & (velocity < 0)] = 0
+
+    dones = (position >= self.goal_position) & (velocity >= self.goal_velocity)
+    rewards = np.full(self.num_envs, -1.0)
+
+    info = {}
+    self.elapsed_steps += 1
+    if self.max_episode_steps is not None:
+      truncated = (self.elapsed_steps >= self.max_episode_steps) & ~dones
+      info['TimeLimit.truncated'] = truncated
+      dones = dones | truncated
+    obs = self.state.copy()
+    if self.autoreset and dones.any():
+      info['terminal_observation'] = obs
+      obs = self.reset(dones)
+    return obs, rewards, dones, info
+
+  def _height(self, xs):
+    return np.sin(3 * xs) * .45 + .55
+
+  def render(self, mode='rgb_array', out=None, screen_width=1920, screen_height=1080):
+    """ (N, screen_height, screen_width, 3) uint8 frames of all envs, drawn by rasterizer.py (no GL) into 'out' if given """
+    assert mode == 'rgb_array', mode
+    if self.viewer is None:
+      from gym_task.envs import rasterizer
+      self.viewer, self._place = _make_viewer(
+        rasterizer, self, screen_width, screen_height, batch=self.num_envs
+      )
+    self._place(self.state[:, 0])
+    return self.viewer.render(return_rgb_array=True, out=out)
+
+  def close(self):
+    if self.viewer:
+      self.viewer.close()
+      self.viewer = None
@@ -0,0 +1,405 @@
+"""
+2D software rendering with numpy, without pyglet / OpenGL
+
+The geoms and attributes of rendering.py (FilledPolygon, PolyLine, Line, Point, Compound,
+make_circle / make_polygon / make_polyline / make_capsule, Transform, Color, LineWidth) with
+the same interface, so the scene code of an env runs unchanged on either module ; Viewer
+rasterizes them into a preallocated uint8 frame buffer.
+
+Viewer(width, height, batch=n) draws n frames per render() : the values of a Transform can
+be arrays of n values (one per frame, e.g. the states of a vector env), constant values are
+shared by all frames. render(return_rgb_array=True) returns (n, height, width, 3).
+
+Rasterization is that of OpenGL without antialiasing, up to the pixels on the edges : a pixel
+is covered when its center is inside the (convex, as GL_POLYGON) polygon, top-left rule ; a
+line of width w is widened by w pixels across its major axis. LineStyle is drawn solid.
+"""
+import math
+import numpy as np
+
+from gym import error
+
+# (polygons x rows x columns) evaluated at a time
+_CHUNK = 1 << 21
+# the rectangles of the lines are moved down by this (pixels) : a line through pixel centers
+# covers the row under it (as OpenGL does), not the one above as a polygon edge would
+_LINE_BIAS = 1.0 / 256
+
+
+class Viewer(object):
+    """
+    batch=None : one frame, render(return_rgb_array=True) is (height, width, 3) as with the
+    GL viewer ; batch=n : n frames, (n, height, width, 3).
+    'display' / 'visible' are those of rendering.Viewer : there is no window here.
+    """
+
+    def __init__(self, width, height, display=None, visible=False, batch=None):
+        if visible:
+            raise error.Error("The software viewer has no window, use the rgb_array mode.")
+        self.width = width
+        self.height = height
+        self.batch = batch
+        self.frames = np.empty((1 if batch is None else batch, height, width, 3), dtype=np.uint8)
+        self.isopen = True
+        self.geoms = []
+        self.onetime_geoms = []
+        self.transform = Transform()
+
+    def close(self):
+        self.isopen = False
+
+    def set_bounds(self, left, right, bottom, top):
+        assert right > left and top > bottom
+        scalex = self.width / (right - left)
+        scaley = self.height / (top - bottom)
+        self.transform = Transform(
+            translation=(-left * scalex, -bottom * scaley), scale=(scalex, scaley)
+        )
+
+    def add_geom(self, geom):
+        self.geoms.append(geom)
+
+    def add_onetime(self, geom):
+        self.onetime_geoms.append(geom)
+
+    def render(self, return_rgb_array=False, out=None):
+        """ 'out' : array of the shape of the returned frames to draw into (instead of self.frames) """
+        if out is None:
+            frames = self.frames
+        else:
+            frames = out if self.batch is not None else out[None]
+            assert frames.shape == self.frames.shape and frames.dtype == np.uint8, frames.shape
+        frames.fill(255)
+        canvas = _Canvas(frames)
+        matrix = self.transform.matrix()
+        for geom in self.geoms:
+            geom.draw(canvas, matrix)
+        for geom in self.onetime_geoms:
+            geom.draw(canvas, matrix)
+        self.onetime_geoms = []
+        if not return_rgb_array:
+            return self.isopen
+        if out is not None:
+            return out
+        return self.get_array()
+
+    # Convenience
+    def draw_circle(self, radius=10, res=30, filled=True, **attrs):
+        geom = make_circle(radius=radius, res=res, filled=filled)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def draw_polygon(self, v, filled=True, **attrs):
+        geom = make_polygon(v=v, filled=filled)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def draw_polyline(self, v, **attrs):
+        geom = make_polyline(v=v)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def draw_line(self, start, end, **attrs):
+        geom = Line(start, end)
+        _add_attrs(geom, attrs)
+        self.add_onetime(geom)
+        return geom
+
+    def get_array(self):
+        """ a copy of the last frame(s) """
+        if self.batch is None:
+            return self.frames[0].copy()
+        return self.frames.copy()
+
+    def __del__(self):
+        self.close()
+
+
+def _add_attrs(geom, attrs):
+    if "color" in attrs:
+        geom.set_color(*attrs["color"])
+    if "linewidth" in attrs:
+        geom.set_linewidth(attrs["linewidth"])
+
+
+def _compose(outer, inner):
+    """ affine (k, 2, 3) matrices : outer applied after inner ; k of 1 broadcasts """
+    m = np.matmul(outer[:, :, :2], inner)
+    m[:, :, 2] += outer[:, :, 2]
+    return m
+
+
+class _Canvas(object):
+    """ frames being drawn : (n, height, width, 3) uint8 """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.n, self.height, self.width = frames.shape[:3]
+
+    def to_pixels(self, matrix, v):
+        """ (k, len(v), 2) positions in the frames (x to the right, y down) of the points v """
+        v = np.asarray(v, dtype=np.float64).reshape(-1, 2)
+        p = np.matmul(v, matrix[:, :, :2].transpose(0, 2, 1)) + matrix[:, None, :, 2]
+        p[:, :, 1] = self.height - p[:, :, 1]
+        return p
+
+    def fill(self, polygons, color):
+        """
+        polygons : (k, c, m, 2) c convex polygons of m points in pixels for each of the k = n
+        frames, or k = 1 : the same polygons in every frame
+        """
+        shared = len(polygons) == 1
+        index = np.repeat(np.arange(len(polygons)), polygons.shape[1])
+        polygons = polygons.reshape(-1, polygons.shape[2], 2)
+        k = len(polygons)
+
+        # pixels whose center can be inside : columns x0 <= x < x1, rows y0 <= y < y1
+        size = (self.width, self.height)
+        lo = np.clip(np.ceil(polygons.min(axis=1) - 0.5), 0, size).astype(np.intp)
+        hi = np.clip(np.floor(polygons.max(axis=1) - 0.5) + 1, 0, size).astype(np.intp)
+        w, h = (hi - lo).max(axis=0).tolist()
+        if w <= 0 or h <= 0:
+            return
+        x0, y0, x1, y1 = lo[:, 0], lo[:, 1], hi[:, 0], hi[:, 1]
+
+        # edges oriented so that the inside is on the positive side
+        a = polygons
+        b = np.concatenate([polygons[:, 1:], polygons[:, :1]], axis=1)
+        area = np.sum(a[:, :, 0] * b[:, :, 1] - b[:, :, 0] * a[:, :, 1], axis=1)
+        d = (b - a) * np.sign(area)[:, None, None]
+        top_left = (d[:, :, 1] < 0) | ((d[:, :, 1] == 0) & (d[:, :, 0] > 0))
+
+        color = _to_uint8(color)
+        m = polygons.shape[1]
+        step = max(1, _CHUNK // (m * w * h))
+        for start in range(0, k, step):
+            s = slice(start, start + step)
+            gx = x0[s, None] + np.arange(w)
+            gy = y0[s, None] + np.arange(h)
+            # (polygon, edge, row, column)
+            cx = (gx + 0.5)[:, None, None, :]
+            cy = (gy + 0.5)[:, None, :, None]
+            dx, dy = d[s, :, 0, None, None], d[s, :, 1, None, None]
+            ax, ay = a[s, :, 0, None, None], a[s, :, 1, None, None]
+            edge = dx * (cy - ay) - dy * (cx - ax)
+            covered = (edge > 0) | ((edge == 0) & top_left[s, :, None, None])
+            inside = covered.all(axis=1)
+            inside &= (gx < x1[s, None])[:, None, :] & (gy < y1[s, None])[:, :, None]
+            kk, yy, xx = np.nonzero(inside)
+            if len(kk) == 0:
+                continue
+            pixels = gy[kk, yy] * self.width + gx[kk, xx]
+            if shared:
+                pixels = (np.arange(self.n) * (self.height * self.width))[:, None] + pixels
+            else:
+                pixels += index[s][kk] * (self.height * self.width)
+            self._write(color, pixels.ravel())
+
+    def _write(self, color, pixels):
+        """ pixels : indices in the (n * height * width) pixels of the frames """
+        rgb, alpha = color
+        flat = self.frames.reshape(-1, 3)
+        if alpha >= 1:
+            flat[pixels] = rgb
+        elif alpha > 0:
+            blended = flat[pixels] * (1 - alpha) + rgb * alpha
+            flat[pixels] = np.floor(blended + 0.5).astype(np.uint8)
+
+    def lines(self, starts, ends, width, color):
+        """
+        segments (k, s, 2) -> (k, s, 2) in pixels, 'width' pixels wide : as OpenGL widens lines,
+        vertically those closer to horizontal, horizontally the others
+        """
+        d = np.abs(ends - starts)
+        x_major = d[:, :, 0] >= d[:, :, 1]
+        normal = np.zeros_like(d)
+        normal[:, :, 1] = np.where(x_major, 0.5 * width, 0)
+        normal[:, :, 0] = np.where(x_major, 0, 0.5 * width)
+        starts = starts + (0, _LINE_BIAS)
+        ends = ends + (0, _LINE_BIAS)
+        self.fill(np.stack([starts + normal, ends + normal, ends - normal, starts - normal], axis=2), color)
+
+
+def _to_uint8(vec4):
+    """ (rgb uint8, alpha) of a GL color """
+    rgb = np.floor(np.clip(np.asarray(vec4[:3], dtype=np.float64), 0, 1) * 255 + 0.5).astype(np.uint8)
+    return rgb, float(vec4[3]) if len(vec4) > 3 else 1.0
+
+
+class Geom(object):
+    def __init__(self):
+        self._color = Color((0, 0, 0, 1.0))
+        self.attrs = [self._color]
+
+    def draw(self, canvas, matrix, color=None):
+        """ matrix : (k, 2, 3) transform of the enclosing geoms ; color : that of a Compound """
+        linewidth = 1
+        for attr in reversed(self.attrs):
+            if isinstance(attr, Transform):
+                matrix = _compose(matrix, attr.matrix())
+            elif isinstance(attr, Color):
+                color = attr
+            elif isinstance(attr, LineWidth):
+                linewidth = attr.stroke
+        self.draw1(canvas, matrix, color.vec4, linewidth)
+
+    def draw1(self, canvas, matrix, vec4, linewidth):
+        raise NotImplementedError
+
+    def add_attr(self, attr):
+        self.attrs.append(attr)
+
+    def set_color(self, r, g, b):
+        self._color.vec4 = (r, g, b, 1)
+
+
+class Attr(object):
+    pass
+
+
+class Transform(Attr):
+    """ the values can be arrays of one value per frame of a batched Viewer """
+
+    def __init__(self, translation=(0.0, 0.0), rotation=0.0, scale=(1, 1)):
+        self.set_translation(*translation)
+        self.set_rotation(rotation)
+        self.set_scale(*scale)
+
+    def set_translation(self, newx, newy):
+        self.translation = (newx, newy)
+
+    def set_rotation(self, new):
+        self.rotation = new
+
+    def set_scale(self, newx, newy):
+        self.scale = (newx, newy)
+
+    def matrix(self):
+        """ (k, 2, 3) : translate(rotate(scale(p))) as Transform.enable of rendering.py """
+        values = self.translation + (self.rotation,) + self.scale
+        if all(np.ndim(x) == 0 for x in values):  # same in every frame
+            tx, ty, rotation, sx, sy = [float(x) for x in values]
+            cos, sin = math.cos(rotation), math.sin(rotation)
+            return np.array([[[cos * sx, -sin * sy, tx], [sin * sx, cos * sy, ty]]])
+        tx, ty, rotation, sx, sy = np.broadcast_arrays(*[np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in values])
+        cos, sin = np.cos(rotation), np.sin(rotation)
+        return np.stack([np.stack([cos * sx, -sin * sy, tx], axis=-1),
+                         np.stack([sin * sx, cos * sy, ty], axis=-1)], axis=1)
+
+
+class Color(Attr):
+    def __init__(self, vec4):
+        self.vec4 = vec4
+
+
+class LineStyle(Attr):
+    def __init__(self, style):
+        self.style = style
+
+
+class LineWidth(Attr):
+    def __init__(self, stroke):
+        self.stroke = stroke
+
+
+class Point(Geom):
+    def __init__(self):
+        Geom.__init__(self)
+
+    def draw1(self, canvas, matrix, vec4, linewidth):
+        p = canvas.to_pixels(matrix, [(0.0, 0.0)])
+        square = np.array([(-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5)])
+        canvas.fill(p[:, :, None] + square, vec4)
+
+
+class FilledPolygon(Geom):
+    def __init__(self, v):
+        Geom.__init__(self)
+        self.v = v
+
+    def draw1(self, canvas, matrix, vec4, linewidth):
+        canvas.fill(canvas.to_pixels(matrix, self.v)[:, None], vec4)
+
+
+def make_circle(radius=10, res=30, filled=True):
+    points = []
+    for i in range(res):
+        ang = 2 * math.pi * i / res
+        points.append((math.cos(ang) * radius, math.sin(ang) * radius))
+    if filled:
+        return FilledPolygon(points)
+    else:
+        return PolyLine(points, True)
+
+
+def make_polygon(v, filled=True):
+    if filled:
+        return FilledPolygon(v)
+    else:
+        return PolyLine(v, True)
+
+
+def make_polyline(v):
+    return PolyLine(v, False)
+
+
+def make_capsule(length, width):
+    l, r, t, b = 0, length, width / 2, -width / 2
+    box = make_polygon([(l, b), (l, t), (r, t), (r, b)])
+    circ0 = make_circle(width / 2)
+    circ1 = make_circle(width / 2)
+    circ1.add_attr(Transform(translation=(length, 0)))
+    geom = Compound([box, circ0, circ1])
+    return geom
+
+
+class Compound(Geom):
+    def __init__(self, gs):
+        Geom.__init__(self)
+        self.gs = gs
+        for g in self.gs:
+            g.attrs = [a for a in g.attrs if not isinstance(a, Color)]
+
+    def draw1(self, canvas, matrix, vec4, linewidth):
+        color = Color(vec4)
+        for g in self.gs:
+            g.draw(canvas, matrix, color)
+
+
+class PolyLine(Geom):
+    def __init__(self, v, close):
+        Geom.__init__(self)
+        self.v = v
+        self.close = close
+        self.linewidth = LineWidth(1)
+        self.add_attr(self.linewidth)
+
+    def draw1(self, canvas, matrix, vec4, linewidth):
+        p = canvas.to_pixels(matrix, self.v)
+        ends = np.roll(p, -1, axis=1)
+        if not (self.close and p.shape[1] > 2):
+            p, ends = p[:, :-1], ends[:, :-1]
+        if p.shape[1]:
+            canvas.lines(p, ends, linewidth, vec4)
+
+    def set_linewidth(self, x):
+        self.linewidth.stroke = x
+
+
+class Line(Geom):
+    def __init__(self, start=(0.0, 0.0), end=(0.0, 0.0)):
+        Geom.__init__(self)
+        self.start = start
+        self.end = end
+        self.linewidth = LineWidth(1)
+        self.add_attr(self.linewidth)
+
+    def draw1(self, canvas, matrix, vec4, linewidth):
+        p = canvas.to_pixels(matrix, [self.start, self.end])
+        canvas.lines(p[:, :1], p[:, 1:], linewidth, vec4)
+
+    def set_linewidth(self, x):
+        self.linewidth.stroke = x
@@ -1,8 +1,22 @@
 """
 2D rendering framework
+
+The Viewer keeps its geoms in retained mode : the vertices of consecutive geoms are kept in
+one client-side vertex array (_RetainedGeoms). A frame puts them through the Transforms of
+their geoms on the CPU (numpy, one 2x3 matrix per chain of Transforms) and draws them with
+one glDrawElements per run of geoms that need the same GL state (primitive, line width, line
+stipple) : a few draw calls per frame instead of one state change and draw call per geom.
+The arrays are rebuilt only when a geom changed (vertices, colors, attributes). The onetime
+geoms (draw_*) and the geoms without vertices (Image) are still drawn in immediate mode.
+A frame well under a millisecond at 1920x1080 is not reached on a software renderer (llvmpipe
+clears such a frame in about 1 ms) ; bench_rendering.py gives the frame times of a machine.
+
+Viewer(..., visible=False) renders offscreen into a framebuffer object of the viewer
+size ; with PYGLET_HEADLESS=true (pyglet >= 1.5, EGL) no X display is needed either.
 """
 import os
 import sys
+from ctypes import byref
 
 if "Apple" in sys.version:
     if "DYLD_FALLBACK_LIBRARY_PATH" in os.environ:
@@ -81,17 +95,30 @@ def get_window(width, height, display, **kwargs):
 
 
 class Viewer(object):
-    def __init__(self, width, height, display=None):
+    """
+    visible=False : offscreen, the window only holds the GL context and the frames are
+    drawn into a framebuffer object ; render(return_rgb_array=True) reads them back.
+    retained=False : every geom is drawn in immediate mode every frame (the former path).
+    """
+
+    def __init__(self, width, height, display=None, visible=True, retained=True):
         display = get_display(display)
 
         self.width = width
         self.height = height
-        self.window = get_window(width=width, height=height, display=display)
+        if visible:
+            self.window = get_window(width=width, height=height, display=display)
+        else:
+            self.window = pyglet.window.Window(width=width, height=height, display=display, visible=False)
         self.window.on_close = self.window_closed_by_user
         self.isopen = True
         self.geoms = []
         self.onetime_geoms = []
         self.transform = Transform()
+        self.retained = retained
+        self._draws = []  # draw of the runs of retained geoms, geom.render of the others, in order
+        self._retained = None  # _RetainedGeoms of the last run
+        self.framebuffer = None if visible else Framebuffer(width, height)
 
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
@@ -100,6 +127,7 @@ class Viewer(object):
         if self.isopen and sys.meta_path:
             # ^^^ check sys.meta_path to avoid 'ImportError: sys.meta_path is None, Python is likely shutting down'
             self.window.close()
+            self.framebuffer = None
             self.isopen = False
 
     def window_closed_by_user(self):
@@ -114,23 +142,46 @@ class Viewer(object):
         )
 
     def add_geom(self, geom):
+        """ the vertices are uploaded now ; the attributes (also those added later) are applied every frame """
         self.geoms.append(geom)
+        parts = geom._retained_parts() if self.retained else None
+        if parts is None:
+            self._draws.append(geom.render)
+            self._retained = None
+            return
+        if self._retained is None:
+            self._retained = _RetainedGeoms()
+            self._draws.append(self._retained.draw)
+        self._retained.add(parts)
 
     def add_onetime(self, geom):
         self.onetime_geoms.append(geom)
 
-    def render(self, return_rgb_array=False):
-        glClearColor(1, 1, 1, 1)
-        self.window.clear()
-        self.window.switch_to()
-        self.window.dispatch_events()
+    def render(self, return_rgb_array=False, out=None):
+        """ 'out' : (height, width, 3) uint8 array to read an offscreen frame into """
+        if self.framebuffer is None:
+            glClearColor(1, 1, 1, 1)
+            self.window.clear()
+            self.window.switch_to()
+            self.window.dispatch_events()
+        else:
+            self.window.switch_to()
+            self.framebuffer.bind()
+            glClearColor(1, 1, 1, 1)
+            glClear(GL_COLOR_BUFFER_BIT)
         self.transform.enable()
-        for geom in self.geoms:
-            geom.render()
+        for draw in self._draws:
+            draw()
         for geom in self.onetime_geoms:
             geom.render()
         self.transform.disable()
         arr = None
+        if self.framebuffer is not None:
+            if return_rgb_array:
+                arr = self.framebuffer.read(out)
+            self.framebuffer.unbind()
+            self.onetime_geoms = []
+            return arr if return_rgb_array else self.isopen
         if return_rgb_array:
             buffer = pyglet.image.get_buffer_manager().get_color_buffer()
             image_data = buffer.get_image_data()
@@ -173,12 +224,17 @@ class Viewer(object):
         return geom
 
     def get_array(self):
+        if self.framebuffer is not None:
+            self.window.switch_to()
+            arr = self.framebuffer.read()
+            self.framebuffer.unbind()
+            return arr
         self.window.flip()
         image_data = (
             pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
         )
         self.window.flip()
-        arr = np.fromstring(image_data.get_data(), dtype=np.uint8, sep="")
+        arr = np.frombuffer(image_data.get_data(), dtype=np.uint8)
         arr = arr.reshape(self.height, self.width, 4)
         return arr[::-1, :, 0:3]
 
@@ -186,6 +242,53 @@ class Viewer(object):
         self.close()
 
 
+class Framebuffer(object):
+    """
+    Offscreen RGBA color buffer of width x height (framebuffer object) with the
+    projection of a window of that size ; read() copies a frame out with glReadPixels
+    through a buffer allocated once.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.fbo = GLuint()
+        self.rbo = GLuint()
+        glGenRenderbuffers(1, byref(self.rbo))
+        glBindRenderbuffer(GL_RENDERBUFFER, self.rbo)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glGenFramebuffers(1, byref(self.fbo))
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.rbo)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise error.Error("Incomplete framebuffer for offscreen rendering: 0x{:x}".format(status))
+        self.pixels = np.empty((height, width, 3), dtype=np.uint8)
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        glOrtho(0, self.width, 0, self.height, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+
+    def unbind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+    def read(self, out=None):
+        """ the frame as a (height, width, 3) uint8 array, top row first (into 'out' if given) """
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(0, 0, self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, self.pixels.ctypes.data)
+        if out is None:
+            return self.pixels[::-1].copy()
+        np.copyto(out, self.pixels[::-1])
+        return out
+
+
 def _add_attrs(geom, attrs):
     if "color" in attrs:
         geom.set_color(*attrs["color"])
@@ -193,6 +296,131 @@ def _add_attrs(geom, attrs):
         geom.set_linewidth(attrs["linewidth"])
 
 
+# bumped by every change of a geom that the arrays of _RetainedGeoms hold (vertices, colors,
+# attributes added, line width / style) ; the Transforms are read every frame
+_retained_version = [0]
+
+
+def _retained_changed():
+    _retained_version[0] += 1
+
+
+class _RetainedGeoms(object):
+    """
+    Consecutive retained geoms of a Viewer, as client-side vertex / color / index arrays.
+
+    A part is a geom with vertices and its 'chain' (the geom, then the Compounds holding it) ;
+    its attributes apply as Geom.render() / Compound.render() enable them. The Transforms of
+    a chain are folded into one 2x3 matrix per frame and the vertices transformed with it ;
+    consecutive parts with the same primitive, line width and line stipple are one run, drawn
+    by one glDrawElements.
+    """
+
+    def __init__(self):
+        self.parts = []  # (geom, chain, Color of its vertices)
+        self._version = None
+
+    def add(self, parts):
+        self.parts += parts
+        self._version = None
+
+    def _build(self):
+        transforms = []  # the distinct Transforms of the parts
+        transform_index = {}
+        nodes = {}  # chain of transform indices -> node (one matrix per frame)
+        points, colors, vertex_node, indices = [], [], [], []
+        runs = []  # [mode, line width, line stipple, first index, number of indices]
+        for part, chain, color in self.parts:
+            mode, v, part_indices = part._vertices()
+            node_chain = []
+            width = style = None
+            for geom in reversed(chain):
+                for attr in reversed(geom.attrs):  # in the order of Geom.render()
+                    if isinstance(attr, Transform):
+                        if id(attr) not in transform_index:
+                            transform_index[id(attr)] = len(transforms)
+                            transforms.append(attr)
+                        node_chain.append(transform_index[id(attr)])
+                    elif isinstance(attr, LineWidth):
+                        width = attr.stroke
+                    elif isinstance(attr, LineStyle):
+                        style = attr.style
+            if mode != GL_LINES:
+                width = style = None
+            node = nodes.setdefault(tuple(node_chain), len(nodes))
+
+            first = len(indices)
+            indices += [len(points) + i for i in part_indices]
+            points += [(p[0], p[1]) for p in v]
+            colors += [tuple(color.vec4)] * len(v)
+            vertex_node += [node] * len(v)
+            if runs and runs[-1][:3] == [mode, width, style]:
+                runs[-1][4] += len(part_indices)
+            else:
+                runs.append([mode, width, style, first, len(part_indices)])
+
+        self.transforms = transforms
+        # node chains padded with the identity (the last matrix)
+        depth = max([len(c) for c in nodes] + [1])
+        self.node_chains = np.full((len(nodes), depth), len(transforms), dtype=np.intp)
+        for chain, node in nodes.items():
+            self.node_chains[node, :len(chain)] = chain
+        self.points = np.array(points, dtype=np.float64).reshape(-1, 2)
+        self.vertex_node = np.array(vertex_node, dtype=np.intp)
+        self.xy = np.empty((len(points), 2), dtype=np.float32)
+        self.colors = np.array(colors, dtype=np.float32).reshape(-1, 4)
+        self.indices = np.array(indices, dtype=np.uint32)
+        self.runs = [tuple(run) for run in runs]
+        self.matrices = np.zeros((len(transforms) + 1, 2, 3))
+        self.matrices[-1, 0, 0] = self.matrices[-1, 1, 1] = 1.0
+        self._version = _retained_version[0]
+
+    def _transform(self):
+        """ the vertices through the Transforms of their chain, into self.xy """
+        transforms = self.transforms
+        if transforms:
+            p = np.array([(t.translation[0], t.translation[1], t.rotation, t.scale[0], t.scale[1])
+                          for t in transforms])
+            c, s = np.cos(p[:, 2]), np.sin(p[:, 2])
+            m = self.matrices[:-1]  # translate(t) . rotate(r) . scale(s), as Transform.enable()
+            m[:, 0, 0], m[:, 0, 1], m[:, 0, 2] = c * p[:, 3], -s * p[:, 4], p[:, 0]
+            m[:, 1, 0], m[:, 1, 1], m[:, 1, 2] = s * p[:, 3], c * p[:, 4], p[:, 1]
+        chains = self.node_chains
+        node = self.matrices[chains[:, 0]]
+        for k in range(1, chains.shape[1]):  # outer . inner
+            inner = self.matrices[chains[:, k]]
+            a = np.matmul(node[:, :, :2], inner)
+            a[:, :, 2] += node[:, :, 2]
+            node = a
+        m = node[self.vertex_node]
+        x, y = self.points[:, 0], self.points[:, 1]
+        self.xy[:, 0] = m[:, 0, 0] * x + m[:, 0, 1] * y + m[:, 0, 2]
+        self.xy[:, 1] = m[:, 1, 0] * x + m[:, 1, 1] * y + m[:, 1, 2]
+
+    def draw(self):
+        if self._version != _retained_version[0]:
+            self._build()
+        if not self.runs:
+            return
+        self._transform()
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, self.xy.ctypes.data)
+        glColorPointer(4, GL_FLOAT, 0, self.colors.ctypes.data)
+        indices = self.indices.ctypes.data
+        for mode, width, style, first, count in self.runs:
+            if width is not None:
+                glLineWidth(width)
+            if style is not None:
+                glEnable(GL_LINE_STIPPLE)
+                glLineStipple(1, style)
+            glDrawElements(mode, count, GL_UNSIGNED_INT, indices + 4 * first)
+            if style is not None:
+                glDisable(GL_LINE_STIPPLE)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+
 class Geom(object):
     def __init__(self):
         self._color = Color((0, 0, 0, 1.0))
@@ -210,10 +438,21 @@ class Geom(object):
 
     def add_attr(self, attr):
         self.attrs.append(attr)
+        _retained_changed()
 
     def set_color(self, r, g, b):
         self._color.vec4 = (r, g, b, 1)
 
+    def _vertices(self):
+        """ (GL mode, [(x, y), ...], indices) of the geom in retained mode ; None : immediate mode only """
+        return None
+
+    def _retained_parts(self):
+        """ [(geom, chain of geoms whose attributes apply, Color of the vertices)] ; None : immediate mode """
+        if self._vertices() is None:
+            return None
+        return [(self, [self], self._color)]
+
 
 class Attr(object):
     def enable(self):
@@ -254,6 +493,15 @@ class Color(Attr):
     def __init__(self, vec4):
         self.vec4 = vec4
 
+    @property
+    def vec4(self):
+        return self._vec4
+
+    @vec4.setter
+    def vec4(self, vec4):
+        self._vec4 = vec4
+        _retained_changed()
+
     def enable(self):
         glColor4f(*self.vec4)
 
@@ -262,6 +510,15 @@ class LineStyle(Attr):
     def __init__(self, style):
         self.style = style
 
+    @property
+    def style(self):
+        return self._style
+
+    @style.setter
+    def style(self, style):
+        self._style = style
+        _retained_changed()
+
     def enable(self):
         glEnable(GL_LINE_STIPPLE)
         glLineStipple(1, self.style)
@@ -274,6 +531,15 @@ class LineWidth(Attr):
     def __init__(self, stroke):
         self.stroke = stroke
 
+    @property
+    def stroke(self):
+        return self._stroke
+
+    @stroke.setter
+    def stroke(self, stroke):
+        self._stroke = stroke
+        _retained_changed()
+
     def enable(self):
         glLineWidth(self.stroke)
 
@@ -287,12 +553,31 @@ class Point(Geom):
         glVertex3f(0.0, 0.0, 0.0)
         glEnd()
 
+    def _vertices(self):
+        return GL_POINTS, [(0.0, 0.0)], [0]
+
 
 class FilledPolygon(Geom):
     def __init__(self, v):
         Geom.__init__(self)
         self.v = v
 
+    @property
+    def v(self):
+        return self._v
+
+    @v.setter
+    def v(self, v):
+        self._v = v
+        _retained_changed()
+
+    def _vertices(self):
+        # a fan of triangles, as GL_QUADS / GL_POLYGON fill the (convex) polygon
+        indices = []
+        for i in range(1, len(self.v) - 1):
+            indices += [0, i, i + 1]
+        return GL_TRIANGLES, self.v, indices
+
     def render1(self):
         if len(self.v) == 4:
             glBegin(GL_QUADS)
@@ -349,15 +634,43 @@ class Compound(Geom):
         for g in self.gs:
             g.render()
 
+    def _retained_parts(self):
+        parts = []
+        for g in self.gs:
+            g_parts = g._retained_parts()
+            if g_parts is None:
+                return None
+            parts += [(part, chain + [self], self._color) for part, chain, _ in g_parts]
+        return parts
+
+
 
 class PolyLine(Geom):
     def __init__(self, v, close):
         Geom.__init__(self)
-        self.v = v
         self.close = close
+        self.v = v
         self.linewidth = LineWidth(1)
         self.add_attr(self.linewidth)
 
+    @property
+    def v(self):
+        return self._v
+
+    @v.setter
+    def v(self, v):
+        self._v = v
+        _retained_changed()
+
+    def _vertices(self):
+        n = len(self.v)
+        indices = []
+        for i in range(n - 1):
+            indices += [i, i + 1]
+        if self.close and n > 2:
+            indices += [n - 1, 0]
+        return GL_LINES, self.v, indices
+
     def render1(self):
         glBegin(GL_LINE_LOOP if self.close else GL_LINE_STRIP)
         for p in self.v:
@@ -371,7 +684,7 @@ class PolyLine(Geom):
 class Line(Geom):
     def __init__(self, start=(0.0, 0.0), end=(0.0, 0.0)):
         Geom.__init__(self)
-        self.start = start
+        self._start = start
         self.end = end
         self.linewidth = LineWidth(1)
         self.add_attr(self.linewidth)
@@ -382,6 +695,27 @@ class Line(Geom):
         glVertex2f(*self.end)
         glEnd()
 
+    @property
+    def start(self):
+        return self._start
+
+    @start.setter
+    def start(self, start):
+        self._start = start
+        _retained_changed()
+
+    @property
+    def end(self):
+        return self._end
+
+    @end.setter
+    def end(self, end):
+        self._end = end
+        _retained_changed()
+
+    def _vertices(self):
+        return GL_LINES, [self.start, self.end], [0, 1]
+
 
 class Image(Geom):
     def __init__(self, fname, width, height):
@@ -0,0 +1,111 @@
+"""
+End-of-block PNG export on a process pool.
+
+The frames of a block are already on disk (see frame_recorder.py); the export only
+turns them into obs_xxx.png files. It is started as soon as a block ends and runs
+while the score and rest screens are shown, so the experiment waits for it only if
+it is not finished when the next game is about to start.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from frame_recorder import iter_frames, num_frames
+
+
+def _export_range(direc_frames, direc_img, start, stop):
+    """ worker : encode frames [start, stop) of one episode as PNG files """
+    from PIL import Image
+
+    for ob, frame in enumerate(iter_frames(direc_frames, start, stop), start):
+        Image.fromarray(frame).save(direc_img + "/obs_{0:03d}.png".format(ob))
+    return stop - start
+
+
+class ImageExporter(object):
+    """
+    Export recorded episodes to PNG files with a pool of worker processes.
+
+    usage :
+        exporter = ImageExporter()
+        exporter.start([(direc_frames, direc_img), ...])   # returns immediately
+        ...                                                # score / rest screen
+        exporter.wait()                                    # blocks only if unfinished
+        exporter.shutdown()
+    """
+
+    def __init__(self, max_workers=None, batch_size=500):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._pool = None
+        self._futures = []
+        self.n_total = 0
+        self.t_start = None
+        self.t_end = None
+
+    def start(self, episodes):
+        """ queue all frames of the given (direc_frames, direc_img) pairs for export """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        self._futures = []
+        self.n_total = 0
+        self.t_start = time.time()
+        self.t_end = None
+
+        for direc_frames, direc_img in episodes:
+            if not os.path.exists(direc_img):
+                os.makedirs(direc_img)
+
+            n = num_frames(direc_frames)
+            for start in range(0, n, self.batch_size):
+                stop = min(start + self.batch_size, n)
+                self._futures.append(self._pool.submit(_export_range, direc_frames, direc_img, start, stop))
+            self.n_total += n
+
+        for f in self._futures:
+            f.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        if self.t_end is None and self.done():
+            self.t_end = time.time()
+
+    def n_done(self):
+        return sum(f.result() for f in self._futures if f.done() and f.exception() is None)
+
+    def done(self):
+        return all(f.done() for f in self._futures)
+
+    def progress(self):
+        """ (exported frames, total frames) """
+        return self.n_done(), self.n_total
+
+    def wait(self, timeout=None, report_every=5):
+        """
+        Block until the export is finished (or 'timeout' seconds passed) and print the
+        progress every 'report_every' seconds. Errors of the workers are raised here.
+        """
+        t_wait = time.time()
+        pending = [f for f in self._futures if not f.done()]
+
+        while pending:
+            left = None if timeout is None else timeout - (time.time() - t_wait)
+            if left is not None and left <= 0:
+                return False
+            step = report_every if left is None else min(report_every, left)
+            _, pending = wait(pending, timeout=step)
+            print("exporting images: {0} / {1}".format(*self.progress()))
+
+        for f in self._futures:
+            f.result()
+
+        if self.t_start is not None:
+            print("time for saving images per block: {} ".format((self.t_end or time.time()) - self.t_start))
+            self.t_start = None
+        return True
+
+    def shutdown(self):
+        if self._pool is not None:
+            self.wait()
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,226 @@
+"""
+Stream of key press / release events with the time the OS stamped on them.
+
+key_processing() used to take the reaction time as t_ep.getTime() at the 60 Hz poll that
+first saw keyboard.is_pressed, i.e. up to one frame plus the polling latency after the press.
+On Linux the keyboard listener reads the evdev events (_nixcommon.EventDevice.read_event,
+_nixkeyboard.listen), which carry the kernel time of the key (CLOCK_REALTIME) ; the
+KeyboardEvent handed to the keyboard hooks keeps it in event.time.
+
+KeyEventStream hooks the listener and turns every event into a KeyEvent whose time is on
+time.perf_counter() (the clock of egi3/clock_sync.py and of the loop timing) : the offset
+between time.time() and time.perf_counter() is taken when the event is handled, so a late
+handler does not shift the time. The listener thread appends to a deque and the game loop
+pops from it ; there is no lock between the two (deque append / popleft are atomic). Key
+repeat events are dropped, only the first press and the release of a key are kept.
+
+mark() starts an episode : 'down' keeps the keys held across episodes, but press_time() only
+gives the presses after the mark, and it takes the offset of the episode clock (t_ep of
+Session_atari) once, so that episode_time() puts a press time on that clock.
+
+usage (game loop) :
+    key_stream = KeyEventStream(scan_codes=[code for code, _ in GAME_KEYS])
+    key_stream.mark(t_ep.getTime())                           # episode start
+    key_stream.update()                                       # once per frame
+    t_press = key_stream.press_time(mask, key_table.scan_codes)   # latest press of the held keys
+    rt = key_stream.episode_time(t_press)                     # on t_ep
+    key_stream.close()
+
+Recorded evdev streams (the raw records of /dev/input/eventN) are replayed through the same
+conversion as _nixkeyboard.listen() :
+
+    python key_events.py record /dev/input/event3 keys.evdev --seconds 60      # as root
+    python key_events.py replay keys.evdev                   # presses, hold times, 60 Hz poll delay
+"""
+import os
+import sys
+import time
+import struct
+import argparse
+from collections import deque, namedtuple
+
+import numpy as np
+
+from keyboard._keyboard_event import KeyboardEvent, KEY_DOWN, KEY_UP
+from keyboard._nixcommon import EventDevice, EV_KEY, event_bin_format
+
+# t : time.perf_counter() time of the event ; t_os : the time given by the OS (time.time() base)
+KeyEvent = namedtuple('KeyEvent', 'scan_code down t t_os')
+
+EVENT_SIZE = struct.calcsize(event_bin_format)
+
+
+class KeyEventStream(object):
+    """
+    'hook' installs the handler (keyboard.hook by default, None : events are only given to feed()) ;
+    'scan_codes' limits the stream to these keys. The oldest events are dropped when more
+    than 'maxlen' are waiting.
+    """
+
+    def __init__(self, scan_codes=None, maxlen=4096, hook='keyboard'):
+        self.scan_codes = None if scan_codes is None else frozenset(scan_codes)
+        self._events = deque(maxlen=maxlen)
+        self._held = set()  # keys down, as seen by the listener thread (for the key repeats)
+        self.down = {}  # keys down, as seen by the game loop : scan code -> press time
+        self._t_mark = -np.inf  # presses up to this time belong to the previous episode
+        self._episode_offset = 0.0  # episode clock - time.perf_counter()
+        self.n_received = 0
+        self.n_read = 0
+
+        if hook == 'keyboard':
+            import keyboard as pykb
+            hook = pykb.hook
+        self._remove = hook(self.feed) if hook is not None else None
+
+    def feed(self, event, clock_offset=None):
+        """
+        listener thread : one keyboard.KeyboardEvent ; 'clock_offset' is time.time() - time.perf_counter(),
+        taken now if None
+        """
+        code = event.scan_code
+        if self.scan_codes is not None and code not in self.scan_codes:
+            return
+        if clock_offset is None:
+            clock_offset = time.time() - time.perf_counter()
+
+        if event.event_type == KEY_DOWN:
+            if code in self._held:  # key repeat
+                return
+            self._held.add(code)
+            self._events.append(KeyEvent(code, True, event.time - clock_offset, event.time))
+        else:
+            self._held.discard(code)
+            self._events.append(KeyEvent(code, False, event.time - clock_offset, event.time))
+        self.n_received += 1
+
+    def update(self):
+        """ game loop : take the events since the last call ; returns them """
+        events = []
+        pop = self._events.popleft
+        while True:
+            try:
+                event = pop()
+            except IndexError:
+                break
+            events.append(event)
+            if event.down:
+                self.down[event.scan_code] = event.t
+            else:
+                self.down.pop(event.scan_code, None)
+        self.n_read += len(events)
+        return events
+
+    def press_time(self, mask, scan_codes):
+        """
+        time of the latest press among the keys of the bitmask 'mask' (bit i : scan_codes[i])
+        that are down ; None if the stream has not seen any of them pressed since mark()
+        """
+        t = None
+        for bit, code in enumerate(scan_codes):
+            if mask & (1 << bit):
+                t_down = self.down.get(code)
+                if t_down is not None and t_down > self._t_mark and (t is None or t_down > t):
+                    t = t_down
+        return t
+
+    def mark(self, t_episode=0.0, t=None):
+        """
+        start of an episode : 't_episode' on the episode clock is 't' on time.perf_counter()
+        (read right after 't_episode' if None) ; earlier presses are not presses of the episode
+        """
+        if t is None:
+            t = time.perf_counter()
+        self._t_mark = t
+        self._episode_offset = t_episode - t
+
+    def episode_time(self, t):
+        """ a time of the stream (time.perf_counter()) on the episode clock of the last mark() """
+        return t + self._episode_offset
+
+    @property
+    def n_dropped(self):
+        return self.n_received - self.n_read - len(self._events)
+
+    def close(self):
+        if self._remove is not None:
+            self._remove()
+            self._remove = None
+
+
+def read_evdev(path):
+    """ yield the KeyboardEvents of a recorded evdev stream, as _nixkeyboard.listen() makes them """
+    device = EventDevice(path)
+    size = os.path.getsize(path)
+    for _ in range(size // EVENT_SIZE):
+        t, type, code, value, device_id = device.read_event()
+        if type != EV_KEY:
+            continue
+        event_type = KEY_DOWN if value else KEY_UP  # 0 = UP, 1 = DOWN, 2 = HOLD
+        yield KeyboardEvent(event_type=event_type, scan_code=code, time=t, device=device_id)
+    device.input_file.close()
+
+
+def replay_evdev(path, stream, clock_offset=None):
+    """
+    feed a recorded evdev stream to 'stream' ; the times are relative to the first event unless
+    'clock_offset' (time.time() - time.perf_counter() of the recording) is given
+    """
+    for event in read_evdev(path):
+        if clock_offset is None:
+            clock_offset = event.time
+        stream.feed(event, clock_offset)
+    return stream.update()
+
+
+def poll_delays(events, period=1 / 60.):
+    """ delay from every press to the next poll of a loop polling every 'period' from the first event on """
+    if not events:
+        return np.zeros(0)
+    t0 = events[0].t
+    presses = np.array([e.t for e in events if e.down]) - t0
+    return np.ceil(presses / period) * period - presses
+
+
+def record_evdev(device_path, out_path, seconds):
+    """ copy the raw records of an evdev device (e.g. /dev/input/event3, needs root) to a file """
+    t_end = time.time() + seconds
+    with open(device_path, 'rb', buffering=0) as device, open(out_path, 'wb') as out:
+        while time.time() < t_end:
+            out.write(device.read(EVENT_SIZE))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='record / replay evdev key streams')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record')
+    rec.add_argument('device')
+    rec.add_argument('out')
+    rec.add_argument('--seconds', type=float, default=60)
+    rep = sub.add_parser('replay')
+    rep.add_argument('path')
+    rep.add_argument('--rate', type=float, default=60, help='poll rate to compare with (Hz)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        record_evdev(args.device, args.out, args.seconds)
+        return
+
+    events = replay_evdev(args.path, KeyEventStream(hook=None))
+    pressed = {}
+    for e in events:
+        if e.down:
+            pressed[e.scan_code] = e.t
+            print("{0:10.4f} s  key {1:3d} down".format(e.t, e.scan_code))
+        elif e.scan_code in pressed:
+            print("{0:10.4f} s  key {1:3d} up    held {2:7.1f} ms".format(
+                e.t, e.scan_code, 1000 * (e.t - pressed.pop(e.scan_code))))
+    delays = poll_delays(events, 1 / args.rate)
+    if len(delays) == 0:
+        print("no key presses")
+        sys.exit(1)
+    print("{0} presses ; a {1:g} Hz poll sees them {2:.2f} ms later on average (max {3:.2f} ms)".format(
+        len(delays), args.rate, 1000 * delays.mean(), 1000 * delays.max()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Precompiled key state -> action lookup table for the Atari sessions.
+
+The game keys are read as one bitmask (one bit per scan code) and the bitmask is
+used as an index into a table that is built once per game from
+Env_actionMap.get_actionSpace(). Every entry holds the ALE action, the label that
+is logged in info_keys and the label of the Netstation 'act' event, so the game loop
+does no list building, sorting or dictionary lookups per frame.
+"""
+import numpy as np
+import keyboard as pykb
+
+# scan code and key name, in the order key_processing() used to collect them ;
+# the position in this list is the bit of the key in the bitmask
+GAME_KEYS = [(31, 's'), (17, 'w'), (32, 'd'), (30, 'a'), (38, 'l'), (35, 'h')]
+
+# games in which the up / down keys are not used
+NO_UP_DOWN = ('Enduro-v0', 'SpaceInvaders-v0', 'Breakout-v0')
+
+_KEYWORD_TO_NAME = {'UP': 'w', 'DOWN': 's', 'LEFT': 'a', 'RIGHT': 'd', 'FIRE': 'l'}
+
+
+def action_space_from_meanings(meanings):
+    """
+    {key name(s): action} for the given ALE action meanings (the key mapping of
+    AtariEnv.get_keys_to_action) ; get_actionSpace() adds the Enduro special case
+    """
+    action_space = {}
+    for i, meaning in enumerate(meanings):
+        k = sorted(name for keyword, name in _KEYWORD_TO_NAME.items() if keyword in meaning)
+        if len(k) == 1:
+            action_space[k[0]] = i
+        elif len(k) > 1:
+            action_space[tuple(k)] = i
+    return action_space
+
+
+def resolve_keys(keyss, action_space):
+    """
+    The per-frame key logic of the former key_processing(), for the list of pressed
+    key names 'keyss' (in GAME_KEYS order).
+
+    Returns (action, log label, event label) ; the log label is None if no row is
+    logged and np.nan if nothing is pressed, the event label is None if no 'act'
+    event is sent.
+    """
+    keyss = list(keyss)
+
+    if len(keyss) > 1:
+        if 'a' in keyss and 'd' in keyss:
+            keyss.remove('a')
+            keyss.remove('d')
+
+        if 'w' in keyss and 's' in keyss:
+            keyss.remove('w')
+            keyss.remove('s')
+
+    final_len = len(keyss)
+
+    if final_len == 0:  # press nothing
+        return 0, np.nan, None
+
+    elif final_len == 1:
+        event_label = keyss[0]
+
+        if keyss[0] in action_space.keys():
+            return action_space[keyss[0]], keyss[0], event_label
+        # 'h' or a key without an action in this game
+        return 0, None, event_label
+
+    elif final_len == 2:  # press two key
+        event_label = "({0}, {1})".format(keyss[0], keyss[1])
+
+        action_pre = [keyss[0], keyss[1]]
+        action_pre.sort()
+
+        if tuple(action_pre) in action_space.keys():
+            return action_space[tuple(action_pre)], (keyss[0], keyss[1]), event_label
+        # combination 안될 때 첫 key만
+        if keyss[0] in action_space.keys():
+            return action_space[keyss[0]], keyss[0], event_label
+        return 0, None, event_label
+
+    else:  # len(keys) >= 3
+        event_label = "({0}, {1}, {2})".format(keyss[0], keyss[1], keyss[2])
+
+        action_pre = [keyss[0], keyss[1], keyss[2]]
+        action_pre.sort()
+
+        if tuple(action_pre) in action_space.keys():
+            return action_space[tuple(action_pre)], (keyss[0], keyss[1], keyss[2]), event_label
+
+        # combination 안될 때
+        if 'l' in action_pre:
+            keyss.remove('l')
+            actual_act = [keyss[0], 'l']
+            actual_act.sort()
+            if tuple(actual_act) in action_space.keys():
+                return action_space[tuple(actual_act)], (keyss[0], 'l'), event_label
+            return 0, None, event_label
+
+        # action_pre 에 'l'없을때
+        if keyss[0] in action_space.keys():
+            return action_space[keyss[0]], keyss[0], event_label
+        return 0, None, event_label
+
+
+class KeyActionTable(object):
+    """
+    bitmask -> (action, log label, event label) for one game.
+
+    usage :
+        table = KeyActionTable(env_name, get_actionSpace(env_name))
+        action, log_label, event_label = table.lookup(table.read_mask())
+
+    The keys are read with keyboard.pressed_mask_reader (one lock acquisition per frame) ;
+    'is_pressed' replaces it by a per-key function, e.g. scripted keys for headless runs.
+    """
+
+    def __init__(self, env_name, action_space, is_pressed=None):
+        self.env_name = env_name
+        self.is_pressed = is_pressed
+
+        if env_name in NO_UP_DOWN:
+            game_keys = [(code, name) for code, name in GAME_KEYS if name not in ('s', 'w')]
+        else:
+            game_keys = list(GAME_KEYS)
+
+        self.scan_codes = tuple(code for code, _ in game_keys)
+        self.key_names = tuple(name for _, name in game_keys)
+        self.fire_bit = 1 << self.key_names.index('l')
+        # scan codes resolved once ; bit i of the mask : scan_codes[i], as in the table
+        self._read_pressed = pykb.pressed_mask_reader(self.scan_codes) if is_pressed is None else None
+
+        entries = []
+        for mask in range(1 << len(game_keys)):
+            keyss = [name for bit, name in enumerate(self.key_names) if mask & (1 << bit)]
+            entries.append(resolve_keys(keyss, action_space))
+        self.entries = tuple(entries)
+
+        # actions without / with fire, for the (currently disabled) uncertainty condition
+        self.random_actions = (tuple(a for k, a in action_space.items() if 'l' not in k),
+                               tuple(action_space.values()))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def read_mask(self):
+        """ current state of the game keys as a bitmask """
+        if self._read_pressed is not None:
+            return self._read_pressed()
+        mask = 0
+        for bit, code in enumerate(self.scan_codes):
+            if self.is_pressed(code):
+                mask |= 1 << bit
+        return mask
+
+    def lookup(self, mask):
+        return self.entries[mask]
@@ -426,6 +426,33 @@ def is_pressed(hotkey):
             return False
     return True
 
+def pressed_mask_reader(keys):
+    """
+    Returns a function that reads the pressed state of all `keys` (list of
+    key names or scan codes) at once, as an integer bitmask: bit `i` is set if
+    `keys[i]` is pressed. The keys are resolved to scan codes here, once, and
+    each read takes the lock of the pressed keys a single time, so polling
+    several keys per frame is much cheaper than one `is_pressed` call per key.
+
+        read_mask = pressed_mask_reader(['s', 'w', 57])
+        read_mask() #-> 0b101 if 's' and space are pressed
+    """
+    _listener.start_if_necessary()
+
+    bits = {}
+    for bit, key in enumerate(keys):
+        for scan_code in key_to_scan_codes(key):
+            bits[scan_code] = bits.get(scan_code, 0) | (1 << bit)
+    get_bits = bits.get
+
+    def read_mask():
+        mask = 0
+        with _pressed_events_lock:
+            for scan_code in _pressed_events:
+                mask |= get_bits(scan_code, 0)
+        return mask
+    return read_mask
+
 def call_later(fn, args=(), delay=0.001):
     """
     Calls the provided function in a new thread after waiting some time.
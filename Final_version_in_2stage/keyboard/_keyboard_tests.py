@@ -232,6 +232,23 @@ class TestKeyboard(unittest.TestCase):
     def test_is_pressed_hotkey_false(self):
         self.do(d_shift+d_a+u_a)
         self.assertFalse(keyboard.is_pressed('shift+a'))
+    def test_pressed_mask_reader_none(self):
+        read_mask = keyboard.pressed_mask_reader(['a', 'b', 3])
+        self.assertEqual(read_mask(), 0)
+    def test_pressed_mask_reader_names_and_scan_codes(self):
+        read_mask = keyboard.pressed_mask_reader(['a', 'b', 3])
+        self.do(d_a+d_c)
+        self.assertEqual(read_mask(), 0b101)
+        self.do(u_a+d_b)
+        self.assertEqual(read_mask(), 0b110)
+    def test_pressed_mask_reader_unregistered(self):
+        read_mask = keyboard.pressed_mask_reader([2])
+        self.do(d_a)
+        self.assertEqual(read_mask(), 0)
+    def test_pressed_mask_reader_shared_scan_code(self):
+        read_mask = keyboard.pressed_mask_reader(['a', 1])
+        self.do(d_a)
+        self.assertEqual(read_mask(), 0b11)
     def test_is_pressed_multi_step_fail(self):
         self.do(u_a+d_a)
         with self.assertRaises(ValueError):
@@ -0,0 +1,131 @@
+"""
+Fixed-timestep scheduler for the Atari game loop.
+
+Every task (env.step, env.render, key polling, ...) has its own rate. Deadlines are
+kept on an absolute grid (t0 + k * period), so the loop does not drift when single
+iterations take longer, and the waiting is done with a sleep that wakes up
+'spin' seconds early followed by a short busy wait on time.perf_counter().
+This keeps the CPU mostly idle between frames and the jitter below the sleep
+granularity of the OS.
+
+usage :
+    sched = LoopScheduler({'keys': 60, 'step': 60, 'render': 60})
+    while True:
+        due = sched.wait()
+        if 'keys' in due: ...
+        if 'step' in due: ...
+        if 'render' in due: ...
+    print(sched.summary())
+"""
+import math
+import time
+
+
+class _Task(object):
+    """ one periodic task and the statistics of its achieved periods """
+
+    def __init__(self, name, rate, t0):
+        self.name = name
+        self.period = 1.0 / rate
+        self.k = 0  # index of the next tick on the grid
+        self.t0 = t0
+        self.deadline = t0
+
+        self.t_last = None
+        self.n = 0
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.late = 0  # achieved period > 1.5 x target
+        self.skipped = 0  # ticks dropped to catch up after a stall
+
+    def fire(self, now, max_lag):
+        if self.t_last is not None:
+            dt = now - self.t_last
+            self.n += 1
+            self.sum += dt
+            self.sumsq += dt * dt
+            self.min = min(self.min, dt)
+            self.max = max(self.max, dt)
+            if dt > 1.5 * self.period:
+                self.late += 1
+        self.t_last = now
+
+        self.k += 1
+        self.deadline = self.t0 + self.k * self.period
+
+        # after a stall longer than 'max_lag' periods, drop the missed ticks instead of bursting them
+        lag = int((now - self.deadline) / self.period)
+        if lag > max_lag:
+            self.k += lag
+            self.skipped += lag
+            self.deadline = self.t0 + self.k * self.period
+
+    def stats(self):
+        mean = self.sum / self.n if self.n > 0 else math.nan
+        std = math.sqrt(max(self.sumsq / self.n - mean * mean, 0.0)) if self.n > 0 else math.nan
+        return {'target_period': self.period, 'mean_period': mean, 'std_period': std,
+                'min_period': self.min if self.n > 0 else math.nan,
+                'max_period': self.max if self.n > 0 else math.nan,
+                'achieved_rate': 1.0 / mean if self.n > 0 and mean > 0 else math.nan,
+                'n_ticks': self.n, 'n_late': self.late, 'n_skipped': self.skipped}
+
+
+class LoopScheduler(object):
+    """
+    Deterministic fixed-timestep scheduler for several periodic tasks.
+
+    rates    : {task name: rate in Hz}
+    spin     : how long before a deadline the sleep ends and the busy wait starts (s);
+               ~2 ms is enough on Linux, use more on Windows without timeBeginPeriod(1)
+    max_lag  : number of missed periods after which a task is re-aligned to the grid
+    clock, sleep : time source and sleep of the waits (see session_clock.py)
+    """
+
+    def __init__(self, rates, spin=0.002, max_lag=3, clock=time.perf_counter, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.spin = spin
+        self.max_lag = max_lag
+        self.rates = dict(rates)
+        self.reset()
+
+    def reset(self):
+        """ restart all tasks on a fresh grid starting now ; every task is due immediately """
+        t0 = self.clock()
+        self.tasks = [_Task(name, rate, t0) for name, rate in self.rates.items()]
+
+    def next_deadline(self):
+        return min(task.deadline for task in self.tasks)
+
+    def wait(self):
+        """ wait until the next deadline and return the names of all due tasks """
+        deadline = self.next_deadline()
+
+        remaining = deadline - self.clock()
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+        while self.clock() < deadline:
+            pass
+
+        now = self.clock()
+        due = []
+        for task in self.tasks:
+            if task.deadline <= now:
+                task.fire(now, self.max_lag)
+                due.append(task.name)
+        return due
+
+    def stats(self):
+        """ {task name: achieved vs. target period statistics} """
+        return {task.name: task.stats() for task in self.tasks}
+
+    def summary(self):
+        lines = []
+        for name, s in self.stats().items():
+            lines.append("{0}: {1:.1f} Hz (target {2:.1f} Hz), period {3:.2f} +- {4:.2f} ms, max {5:.2f} ms, "
+                         "late {6}, skipped {7}".format(name, s['achieved_rate'], 1.0 / s['target_period'],
+                                                        1000 * s['mean_period'], 1000 * s['std_period'],
+                                                        1000 * s['max_period'], s['n_late'], s['n_skipped']))
+        return '\n'.join(lines)
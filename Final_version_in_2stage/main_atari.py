@@ -1,27 +1,33 @@
 # from Session_CartPole_eeg import *
+import argparse
 from Session_atari import *
 # import egi.simple as egi
 import egi3.simple as egi
 
-def run_(subi, i):
+def run_(subi, i, resume=None):
     ns = egi.Netstation()
     # ns.connect("10.10.10.42", 55513) # hard connection
     # ns.connect("192.168.0.2", 55513) # wifi connection
     # ns.sync()
     ns = None
-    openAI_function_atari(subi, i, ns)
+    openAI_function_atari(subi, i, ns, resume=resume)
     # ns.EndSession()
     # ns.disconnect()
 
 
 if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    # 중단된 session 이어서 하기 : --resume (가장 최근 것) or --resume <checkpoint directory>
+    parser.add_argument('--resume', nargs='?', const='latest', default=None)
+    args = parser.parse_args()
+
     subi = 2 #1
 
     # for scheduling
-    # sess_list, sess_goal_list = openAI_function_atari(subi, 0)  # TODO: 다시 돌려놓기 or 한 번 돌렸으면 주석처리해놓기(오래걸림)
+    # sess_list, sess_goal_list = openAI_function_atari(subi, 0)  # schedule bank 다시 만들기 (없으면 session 시작할 때 자동 생성)
 
     # first session
-    run_(subi, 3) # SESS_NUM = 1, 2, 3
+    run_(subi, 3, resume=args.resume) # SESS_NUM = 1, 2, 3
     # # 2nd session
     # run_(subi,2)
     # # 3rd session
@@ -11,6 +11,7 @@ import math
 import numpy as np
 import itertools
 import random
+import json
 
 def block_permut(num_of_gameType = 3, num_eachGame = 2):
     """ 7개 만들어 놓고 돌려 쓸 것"""
@@ -39,115 +40,92 @@ def block_permut(num_of_gameType = 3, num_eachGame = 2):
 
 
 
+# stage codes of the HIGH complexity condition (index in the shuffled list -> stage)
+COMPLEXITY_CODE = {0: 0, 1: 1, 2: 100, 3: 101, 4: 111, 5: 110, 6: 200, 7: 201, 8: 211, 9: 210,
+                   10: 300, 11: 301, 12: 311, 13: 310}
+
+SCHEDULE_BANK_PATH = './SESS_atari/schedule_bank.json'
+
+# shuffles drawn and seed per condition ; the orderings left after the filter are the schedules
+# (499 HIGH, 39 LOW), as the SESS_day0*.pkl pickles of session 0 had them
+SHUFFLES = {'high': (800, 2024), 'low': (50000, 2025)}
+
+
+def has_run(seq, max_run=2):
+    """ more than 'max_run' identical items in a row ? """
+    run = 1
+    for i in range(1, len(seq)):
+        run = run + 1 if seq[i] == seq[i - 1] else 1
+        if run > max_run:
+            return True
+    return False
+
+
+def filtered_shuffles(items, n_shuffles, seed, max_run=2):
+    """
+    The distinct orderings among 'n_shuffles' seeded shuffles of 'items', in the order they were
+    drawn, without those that have more than 'max_run' identical items in a row : the shuffles
+    of random.seed(seed) + random.sample and the filter of the former goal_setting_permut, with
+    the duplicates found through a set instead of a list. Every valid ordering is as likely as
+    with the former code (uniform), and the schedules are the same.
+    """
+    rng = random.Random(seed)
+    seen = set()
+    schedules = []
+    for _ in range(n_shuffles):
+        seq = tuple(rng.sample(items, len(items)))
+        if seq not in seen:
+            seen.add(seq)
+            schedules.append(seq)
+    return [list(seq) for seq in schedules if not has_run(seq, max_run)]
+
+
 def goal_setting_permut(is_main = 1):
     # for complexity schedule per one block
 
-    random.seed(2023)
     # for HIGH complexity condition
     prev_list_complex = list(range(12)) + list(range(12))
     list_complex_comp = [x + 2 for x in prev_list_complex]
-    list_complex_comp = random.sample(list_complex_comp, 13)
+    list_complex_comp = random.Random(2023).sample(list_complex_comp, 13)
     list_complex = list_complex_comp + [1] * 7 + [0] * 7
 
     # for LOW complexity condition
     list_simple = [1] * 20 + [0] * 20
 
-    # randomize schedule
-
-    # for complex case
-    random.seed(2024)
-    complexity_list = []
-
-    for t in range(800):
-        list_sh = random.sample(list_complex, len(list_complex))
-        # print(list_sh)
-        if list_sh not in complexity_list:
-            complexity_list.append(list_sh)
-
-    del_index = []
-    for i in range(len(complexity_list)):
-        flag = 0
-        for j in range(len(complexity_list[i])):
-            try:
-                if complexity_list[i][j] == complexity_list[i][j + 1] == complexity_list[i][j + 2]:
-                    flag = 1
-                    break
-            except:
-                continue
-        if flag == 1:
-            del_index.append(i)
-
-    del_index.reverse()
-    for d in del_index:
-        complexity_list.pop(d)  # 499개
-
-    # for simple case
-    random.seed(2025)
-    complexity_list_s = []
-
-    for t in range(50000):
-        list_sh = random.sample(list_simple, len(list_simple))
-        if list_sh not in complexity_list_s:
-            complexity_list_s.append(list_sh)
-
-    del_index_s = []
-    for i in range(len(complexity_list_s)):
-        flag = 0
-        for j in range(len(complexity_list_s[i])):
-            try:
-                if complexity_list_s[i][j] == complexity_list_s[i][j + 1] == complexity_list_s[i][j + 2]:
-                    flag = 1
-                    break
-            except:
-                continue
-        if flag == 1:
-            del_index_s.append(i)
-
-    del_index_s.reverse()
-    for d in del_index_s:
-        complexity_list_s.pop(d)  # 39 개
+    # randomize schedule : shuffles without three identical stages in a row
+    complexity_list = filtered_shuffles(list_complex, *SHUFFLES['high'])  # 499개
+    complexity_list_s = filtered_shuffles(list_simple, *SHUFFLES['low'])  # 39 개
 
     # change the name of stages
-
-    list_complexity_LOW = complexity_list_s  # 39 개
-
-    list_complexity_HIGH = []  # 499개
-
-
-    for comp in complexity_list:
-        list_complexity_HIGH_per_comp = []
-
-        for num in comp:
-            if num == 0:
-                list_complexity_HIGH_per_comp.append(0)
-            elif num == 1:
-                list_complexity_HIGH_per_comp.append(1)
-            elif num == 2:
-                list_complexity_HIGH_per_comp.append(100)
-            elif num == 3:
-                list_complexity_HIGH_per_comp.append(101)
-            elif num == 4:
-                list_complexity_HIGH_per_comp.append(111)
-            elif num == 5:
-                list_complexity_HIGH_per_comp.append(110)
-            elif num == 6:
-                list_complexity_HIGH_per_comp.append(200)
-            elif num == 7:
-                list_complexity_HIGH_per_comp.append(201)
-            elif num == 8:
-                list_complexity_HIGH_per_comp.append(211)
-            elif num == 9:
-                list_complexity_HIGH_per_comp.append(210)
-            elif num == 10:
-                list_complexity_HIGH_per_comp.append(300)
-            elif num == 11:
-                list_complexity_HIGH_per_comp.append(301)
-            elif num == 12:
-                list_complexity_HIGH_per_comp.append(311)
-            elif num == 13:
-                list_complexity_HIGH_per_comp.append(310)
-        list_complexity_HIGH.append(list_complexity_HIGH_per_comp)
+    list_complexity_LOW = complexity_list_s
+    list_complexity_HIGH = [[COMPLEXITY_CODE[num] for num in comp] for comp in complexity_list]
 
     schedule_list = {'high_complexity_per_trial': list_complexity_HIGH, 'low_complexity_per_trial': list_complexity_LOW}  # session마다 COND_name_
 
-    return schedule_list
\ No newline at end of file
+    return schedule_list
+
+
+def build_schedule_bank(path=SCHEDULE_BANK_PATH):
+    """ generate the block and goal setting schedules and store them in 'path' (json) """
+    bank = {'params': {'shuffles': SHUFFLES}}
+    bank.update(block_permut())
+    bank.update(goal_setting_permut())
+
+    direc = os.path.dirname(path)
+    if direc and not os.path.exists(direc):
+        os.makedirs(direc)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(bank, f)
+    os.replace(path + '.tmp', path)
+    return bank
+
+
+def load_schedule_bank(path=SCHEDULE_BANK_PATH):
+    """ the schedule bank in 'path', (re)generated if it is missing or was built with other shuffles """
+    if os.path.exists(path):
+        with open(path) as f:
+            bank = json.load(f)
+        # json turns the tuples into lists
+        if bank.get('params') == json.loads(json.dumps({'shuffles': SHUFFLES})):
+            return bank
+    return build_schedule_bank(path)
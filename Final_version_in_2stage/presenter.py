@@ -0,0 +1,246 @@
+"""
+Optional two-process mode of the Atari sessions : simulation and presentation are split.
+
+The simulation process (openAI_function_atari) keeps key polling, env.step, the score logic
+and Netstation events. Its AtariEnv renders into a RingViewer, which keeps the score state of
+SimpleImageViewer (update / img_update / get_cur / release) but only publishes the frame and
+the score display state to a FrameRing ; it does not import pyglet. The timings are kept for the
+latest frames only (_TimeRing). The presenter process owns the pyglet window and shows
+the latest frame of the ring with the real SimpleImageViewer ; a slow flip or a blocked
+socket write in one process does not delay the other.
+
+usage :
+    presenter = PresenterProcess()
+    env_pool = EnvPool(make=presenter.make_env)
+    ...
+    print(presenter.summary())
+    presenter.close()
+"""
+import time
+import multiprocessing
+import numpy as np
+
+import gym
+
+from frame_ring import FrameRing
+from frame_recorder import FRAME_SHAPE
+
+
+def _timing(samples):
+    """ mean / p50 / p95 / p99 / max in ms """
+    if len(samples) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'n': len(samples), 'mean_ms': 1000 * float(np.mean(samples)), 'p50_ms': 1000 * float(p50),
+            'p95_ms': 1000 * float(p95), 'p99_ms': 1000 * float(p99), 'max_ms': 1000 * float(np.max(samples))}
+
+
+class _TimeRing(object):
+    """ the latest 'n' durations (s) ; the memory stays the same over a whole session """
+
+    def __init__(self, n=8192):
+        self.samples = np.empty(n)
+        self.count = 0
+
+    def append(self, t):
+        self.samples[self.count % len(self.samples)] = t
+        self.count += 1
+
+    def recent(self):
+        return self.samples[:min(self.count, len(self.samples))]
+
+
+class RingViewer(object):
+    """
+    Viewer of the simulation process : the score state of SimpleImageViewer (update / img_update /
+    get_cur / release / close, with its arithmetic), the frames go to the ring. No pyglet : the
+    window, the HUD images and the GL context are only in the presenter process.
+    """
+
+    def __init__(self, width, height, prev, seq, game, order, ring=None, **kwargs):
+        self.width = width
+        self.height = height
+        self.ring = ring
+        self.isopen = True
+        self.write_times = _TimeRing()
+        self.cur = 0
+        self.reset(prev, seq, game, order)
+
+    def imshow(self, arr):
+        t0 = time.perf_counter()
+        self.ring.write(arr, self.game, self.sequence[0], self.order, self.prev, self.cur)
+        self.write_times.append(time.perf_counter() - t0)
+
+    def update(self, reward):
+        self.cur += self.signed_reward(reward)
+
+    def img_update(self, seq, prev, order):
+        self.sequence = seq
+        self.comp = seq[0]
+        self.order = order
+        self.prev = prev
+        self.cur = 0
+
+    def reset(self, prev, seq, game, order):
+        self.comp = seq[0]
+        self.game = game
+        self.order = order
+        self.prev = prev
+        self.sequence = seq
+        self.ring.set_visible(True)
+
+    def release(self):
+        self.ring.set_visible(False)
+        total = self.calculate()
+        self.cur = 0
+        return int(total)
+
+    def close(self):
+        self.ring.set_visible(False)
+        self.isopen = False
+        return int(self.calculate())
+
+    # 현재 complexity 색깔에 따라 reward의 negative 여부 결정 (SimpleImageViewer.signed_reward)
+    def signed_reward(self, reward):
+        if self.comp < 2:
+            return - reward if self.comp == 0 else reward
+        compare = str(self.comp)
+        if compare[1] == '0' and self.order == 1:
+            return - reward
+        if compare[2] == '0' and self.order == 2:
+            return - reward
+        return reward
+
+    # 연산 존재하는 경우 self.prev 와 self.cur 이용하여 계산한 값 (SimpleImageViewer.calculate)
+    def calculate(self):
+        reward = int(self.cur)
+        type = str(self.comp)
+
+        if reward != 0:
+            print(reward)
+        if self.order == 1:
+            return reward
+
+        if self.comp != 1 and type[0] == '1':
+            reward = self.prev * reward
+        elif type[0] == '2':
+            reward = self.prev / reward if reward != 0 else self.prev
+        elif type[0] == '3':
+            reward = (self.prev - reward) ** 3 if self.prev != 0 else 0
+        return reward
+
+    def get_cur(self):
+        return self.calculate()
+
+
+def run_presenter(ring_name, n_slots, frame_shape, stop, stats_queue, poll=0.0005):
+    """ presenter process : show the latest frame of the ring until 'stop' is set """
+    from gym.envs.classic_control import rendering  # pyglet, the window and the HUD images : this process only
+
+    ring = FrameRing(n_slots, frame_shape, name=ring_name)
+    frame = np.empty(frame_shape, dtype=np.uint8)
+    viewer = None
+    shown_game = None
+    hidden = True
+    last = 0
+    n_skipped = 0
+    latency = _TimeRing()  # write in the simulation -> flip
+    present = _TimeRing()  # duration of imshow (upload, draw, flip)
+
+    while not stop.is_set():
+        if ring.latest == last:
+            if not ring.visible and not hidden and viewer is not None and viewer.window is not None:
+                viewer.window.set_visible(False)
+                hidden = True
+            time.sleep(poll)
+            continue
+
+        k, meta = ring.read_latest(frame)
+        if k == 0:
+            continue
+        if last > 0 and k > last + 1:
+            n_skipped += k - last - 1
+        last = k
+
+        game, comp, order = int(meta['game']), int(meta['comp']), int(meta['order'])
+        if viewer is None:
+            viewer = rendering.SimpleImageViewer(width=1920, height=1080, prev=float(meta['prev']), seq=[comp],
+                                                 game=game, order=order)
+        elif hidden or game != shown_game:
+            viewer.reset(prev=float(meta['prev']), seq=[comp], game=game, order=order)
+        shown_game = game
+        hidden = False
+
+        viewer.sequence = [comp]
+        viewer.comp = comp
+        viewer.order = order
+        viewer.prev = float(meta['prev'])
+        viewer.cur = float(meta['cur'])
+
+        t0 = time.perf_counter()
+        viewer.imshow(frame)
+        t1 = time.perf_counter()
+        present.append(t1 - t0)
+        latency.append(t1 - float(meta['t_write']))
+
+    stats_queue.put({'frames_shown': present.count, 'frames_skipped': n_skipped,
+                     'present': _timing(present.recent()), 'latency': _timing(latency.recent())})
+    if viewer is not None:
+        viewer.close()
+    ring.close()
+
+
+class PresenterProcess(object):
+    """ FrameRing + presenter process ; make_env() builds environments that render into the ring """
+
+    def __init__(self, n_slots=4, frame_shape=FRAME_SHAPE):
+        self.ring = FrameRing(n_slots, frame_shape)
+        self._stop = multiprocessing.Event()
+        self._stats_queue = multiprocessing.Queue()
+        self._viewers = []
+        self.presenter_stats = None
+        self._process = multiprocessing.Process(target=run_presenter, name='presenter',
+                                                args=(self.ring.name, n_slots, frame_shape, self._stop,
+                                                      self._stats_queue))
+        self._process.start()
+
+    def _viewer_factory(self, **kwargs):
+        viewer = RingViewer(ring=self.ring, **kwargs)
+        self._viewers.append(viewer)
+        return viewer
+
+    def make_env(self, env_name):
+        """ gym.make(env_name) rendering into the ring (for EnvPool(make=...)) """
+        env = gym.make(env_name)
+        env.unwrapped.viewer_factory = self._viewer_factory
+        return env
+
+    def simulation_stats(self):
+        write_times = np.concatenate([viewer.write_times.recent() for viewer in self._viewers] + [np.empty(0)])
+        return {'frames_written': self.ring.latest, 'write': _timing(write_times)}
+
+    def summary(self):
+        lines = []
+        s = self.simulation_stats()
+        if s['write']:
+            lines.append("simulation: {0} frames written, ring write {1:.3f} ms mean, {2:.3f} ms p99".format(
+                s['frames_written'], s['write']['mean_ms'], s['write']['p99_ms']))
+        p = self.presenter_stats
+        if p is not None and p['present']:
+            lines.append("presenter: {0} frames shown, {1} skipped, imshow {2:.2f} ms mean / {3:.2f} ms p99, "
+                         "write -> flip {4:.2f} ms mean / {5:.2f} ms p99".format(
+                             p['frames_shown'], p['frames_skipped'], p['present']['mean_ms'],
+                             p['present']['p99_ms'], p['latency']['mean_ms'], p['latency']['p99_ms']))
+        return '\n'.join(lines)
+
+    def close(self, timeout=5):
+        """ stop the presenter and collect its statistics """
+        self._stop.set()
+        try:
+            self.presenter_stats = self._stats_queue.get(timeout=timeout)
+        except Exception:
+            self.presenter_stats = None
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self.ring.close()
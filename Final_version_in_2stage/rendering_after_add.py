@@ -61,13 +61,26 @@ def get_display(spec):
         )
 
 
+# GL context all windows share their textures with (e.g. the cue image atlas)
+_shared_context = None
+
+
 def get_window(width, height, display, **kwargs):
     """
     Will create a pyglet window from the display specification provided.
     """
+    global _shared_context
+
+    if _shared_context is not None and _shared_context.canvas is None:
+        # the window owning the shared context was closed ; its textures are gone as well
+        _shared_context = None
+        _cue_atlas.clear()
+
     screen = display.get_screens()  # available screens
     config = screen[0].get_best_config()  # selecting the first screen
-    context = config.create_context(None)  # create GL context
+    context = config.create_context(_shared_context)  # create GL context
+    if _shared_context is None:
+        _shared_context = context
 
     return pyglet.window.Window(
         width=width,
@@ -401,10 +414,59 @@ class Image(Geom):
 
 # ================================================================
 
+# complexity cue 이미지 : {complexity : 파일}. complexity + "1" 또는 complexity + "2" 통해 첫번째 항인지 두번째 항인지 구분
+CUE_IMAGE_FILES = {
+    # "0": 'comp_0.png', "1": 'comp_1.png',
+    "0": 'comp_300O__.png', "1": 'comp_311O__.png',
+    "100": 'comp_100.png', "1001": 'comp_100L.png', "1002": 'comp_100R.png',
+    "101": 'comp_101.png', "1011": 'comp_101L.png', "1012": 'comp_101R.png',
+    "110": 'comp_110.png', "1101": 'comp_110L.png', "1102": 'comp_110R.png',
+    "111": 'comp_111.png', "1111": 'comp_111L.png', "1112": 'comp_111R.png',
+    "200": 'comp_200.png', "2001": 'comp_200U.png', "2002": 'comp_200D.png',
+    "201": 'comp_201.png', "2011": 'comp_201U.png', "2012": 'comp_201D.png',
+    "210": 'comp_210.png', "2101": 'comp_210U.png', "2102": 'comp_210D.png',
+    "211": 'comp_211.png', "2111": 'comp_211U.png', "2112": 'comp_211D.png',
+    "300": 'comp_300.png', "3001": 'comp_300O.png', "3002": 'comp_300I.png',
+    "301": 'comp_301.png', "3011": 'comp_301O.png', "3012": 'comp_301I.png',
+    "310": 'comp_310.png', "3101": 'comp_310O.png', "3102": 'comp_310I.png',
+    "311": 'comp_311.png', "3111": 'comp_311O.png', "3112": 'comp_311I.png',
+}
+
+# the cue images are in resource/ next to this module ; ATARI_RESOURCE_DIR points elsewhere
+DEFAULT_RESOURCE_DIR = os.environ.get('ATARI_RESOURCE_DIR',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resource'))
+
+_cue_images = {}  # resource dir -> {complexity : decoded image}
+_cue_atlas = {}  # resource dir -> {complexity : region of the shared texture atlas}
+
+
+def load_cue_images(resource_dir=None):
+    """ decode the cue images of 'resource_dir' ; done once per process """
+    resource_dir = resource_dir or DEFAULT_RESOURCE_DIR
+    if resource_dir not in _cue_images:
+        _cue_images[resource_dir] = {key: pyglet.image.load(os.path.join(resource_dir, fname))
+                                     for key, fname in CUE_IMAGE_FILES.items()}
+    return _cue_images[resource_dir]
+
+
+def get_cue_atlas(resource_dir=None):
+    """
+    the cue images of 'resource_dir' packed into one texture atlas ; needs a current GL
+    context, the atlas is shared by all windows (see get_window) and built once per process
+    """
+    from pyglet.image.atlas import TextureBin
+
+    resource_dir = resource_dir or DEFAULT_RESOURCE_DIR
+    if resource_dir not in _cue_atlas:
+        atlas = TextureBin(texture_width=512, texture_height=512)
+        _cue_atlas[resource_dir] = {key: atlas.add(img) for key, img in load_cue_images(resource_dir).items()}
+    return _cue_atlas[resource_dir]
+
+
 # 'C:/Users/kmh/Documents/Atari_add/MH/resource/comp_311I.png'
 
 class SimpleImageViewer(object):
-    def __init__(self, width, height, prev, seq, game, order, display=None, maxwidth=1600):
+    def __init__(self, width, height, prev, seq, game, order, display=None, maxwidth=1600, resource_dir=None):
 
         self.window = None
         self.isopen = False
@@ -416,6 +478,17 @@ class SimpleImageViewer(object):
         self.label = None
         self.label_tot = None
 
+        # retained HUD objects, created by the first imshow()
+        self._texture = None
+        self._frame_buf = None
+        self._region = None
+        self._region_game = None
+        self._label_1 = None
+        self._label_2 = None
+        self._label_state = {}
+        self._cue = None
+        self._cue_index = None
+
         # current complexity
         self.comp = seq[0]
 
@@ -429,73 +502,16 @@ class SimpleImageViewer(object):
         self.prev = prev
         self.cur = 0
 
-        # circle image dictionary
+        # circle image dictionary (regions of the shared atlas after the first imshow())
+        self.resource_dir = resource_dir
         self.circles = self.load_images()
 
         # sequence of complexity given as input
         self.sequence = seq
 
-    # load circles from the proper folder - need to be changed
+    # load circles from the resource folder (ATARI_RESOURCE_DIR or 'resource_dir') ; cached per process
     def load_images(self):
-
-        # {complexity : 이미지 파일}로 저장. complexity + "1" 또는 complexity + "2" 통해 첫번째 항인지 두번째 항인지 구분
-
-        image_dic = {}
-        image_dir = 'C:/Users/user/Documents/Atari_mh_22/resource/'#'C:/Users/kmh/Documents/Atari_add/MH/resource/'
-        # image_dic.update({"0": pyglet.image.load(image_dir + 'comp_0.png')})
-        # image_dic.update({"1": pyglet.image.load(image_dir +'comp_1.png')})
-        image_dic.update({"0": pyglet.image.load(image_dir + 'comp_300O__.png')})
-        image_dic.update({"1": pyglet.image.load(image_dir + 'comp_311O__.png')})
-
-        image_dic.update({"100": pyglet.image.load(image_dir + 'comp_100.png')})
-        image_dic.update({"1001": pyglet.image.load(image_dir + 'comp_100L.png')})
-        image_dic.update({"1002": pyglet.image.load(image_dir + 'comp_100R.png')})
-
-        image_dic.update({"101": pyglet.image.load(image_dir + 'comp_101.png')})
-        image_dic.update({"1011": pyglet.image.load(image_dir + 'comp_101L.png')})
-        image_dic.update({"1012": pyglet.image.load(image_dir + 'comp_101R.png')})
-
-        image_dic.update({"110": pyglet.image.load(image_dir + 'comp_110.png')})
-        image_dic.update({"1101": pyglet.image.load(image_dir + 'comp_110L.png')})
-        image_dic.update({"1102": pyglet.image.load(image_dir + 'comp_110R.png')})
-
-        image_dic.update({"111": pyglet.image.load(image_dir + 'comp_111.png')})
-        image_dic.update({"1111": pyglet.image.load(image_dir + 'comp_111L.png')})
-        image_dic.update({"1112": pyglet.image.load(image_dir + 'comp_111R.png')})
-
-        image_dic.update({"200": pyglet.image.load(image_dir + 'comp_200.png')})
-        image_dic.update({"2001": pyglet.image.load(image_dir + 'comp_200U.png')})
-        image_dic.update({"2002": pyglet.image.load(image_dir + 'comp_200D.png')})
-
-        image_dic.update({"201": pyglet.image.load(image_dir + 'comp_201.png')})
-        image_dic.update({"2011": pyglet.image.load(image_dir + 'comp_201U.png')})
-        image_dic.update({"2012": pyglet.image.load(image_dir + 'comp_201D.png')})
-
-        image_dic.update({"210": pyglet.image.load(image_dir + 'comp_210.png')})
-        image_dic.update({"2101": pyglet.image.load(image_dir + 'comp_210U.png')})
-        image_dic.update({"2102": pyglet.image.load(image_dir + 'comp_210D.png')})
-
-        image_dic.update({"211": pyglet.image.load(image_dir + 'comp_211.png')})
-        image_dic.update({"2111": pyglet.image.load(image_dir + 'comp_211U.png')})
-        image_dic.update({"2112": pyglet.image.load(image_dir + 'comp_211D.png')})
-
-        image_dic.update({"300": pyglet.image.load(image_dir + 'comp_300.png')})
-        image_dic.update({"3001": pyglet.image.load(image_dir + 'comp_300O.png')})
-        image_dic.update({"3002": pyglet.image.load(image_dir + 'comp_300I.png')})
-
-        image_dic.update({"301": pyglet.image.load(image_dir + 'comp_301.png')})
-        image_dic.update({"3011": pyglet.image.load(image_dir + 'comp_301O.png')})
-        image_dic.update({"3012": pyglet.image.load(image_dir + 'comp_301I.png')})
-
-        image_dic.update({"310": pyglet.image.load(image_dir + 'comp_310.png')})
-        image_dic.update({"3101": pyglet.image.load(image_dir + 'comp_310O.png')})
-        image_dic.update({"3102": pyglet.image.load(image_dir + 'comp_310I.png')})
-
-        image_dic.update({"311": pyglet.image.load(image_dir + 'comp_311.png')})
-        image_dic.update({"3111": pyglet.image.load(image_dir + 'comp_311O.png')})
-        image_dic.update({"3112": pyglet.image.load(image_dir + 'comp_311I.png')})
-
-        return image_dic
+        return load_cue_images(self.resource_dir)
 
     def imshow(self, arr):
 
@@ -528,27 +544,17 @@ class SimpleImageViewer(object):
                 self.isopen = False
 
         assert len(arr.shape) == 3, "You passed in an image with the wrong number shape"
-        image = pyglet.image.ImageData(
-            arr.shape[1], arr.shape[0], "RGB", arr.tobytes(), pitch=arr.shape[1] * -3
-        )
 
-        texture = image.get_texture()
+        if self._texture is None or self._frame_buf.shape != arr.shape:
+            self._init_hud(arr.shape)
 
-        # 기존 점수 UI 지우는 부분
-
-        # 'Seaquest-v0' or 'SpaceInvaders-v0' 일 때 상단부 crop
-        if self.game == 1 or self.game == 3 or self.game == 6:
-            texture = texture.get_region(0, 0, texture.width, texture.height - 20)
-
-        # 'Pitfall-v0' 일 때 상단부 더 많이 crop
-        elif self.game == 7 :
-            texture = texture.get_region(0, 0, texture.width, texture.height - 50)
-
-        # 'MsPacman-v0' or 'Asterix-v0' or 'Kangaroo-v0' 일 때 하단부 cropㅇ
-        else:
-            texture = texture.get_region(0, 27, texture.width, texture.height - 27)
+        # 화면 texture 는 한 번만 만들고 매 frame 은 glTexSubImage2D 로 덮어씀 (GL 은 아래 행부터이므로 상하 반전)
+        np.copyto(self._frame_buf, arr[::-1])
+        glBindTexture(self._texture.target, self._texture.id)
+        glTexSubImage2D(self._texture.target, 0, 0, 0, arr.shape[1], arr.shape[0], GL_RGB, GL_UNSIGNED_BYTE,
+                        self._frame_buf.ctypes.data)
 
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        texture = self._region
         texture.width = self.width
         texture.height = self.height - 150
 
@@ -558,38 +564,14 @@ class SimpleImageViewer(object):
 
         texture.blit(0, 0)  # draw
 
-        # msg_2 = 'R Cur : {} '.format(int(self.cur))
-        # label_2 = pyglet.text.Label(msg_2, font_name='Consolas', font_size=32,
-        #                             x=self.width - 200, y=self.height - 120, anchor_x='center', anchor_y='center')
-
-
-        if self.order == 2 : # if current stage == stage 2
-            msg_2 = 'Life 2 : {} '.format(int(self.cur))  # TODO : here
-            label_2 = pyglet.text.Label(msg_2, font_name='Consolas', font_size=32,
-                                        x=200, y=self.height - 105, anchor_x='center', anchor_y='center', color = (255, 255, 0, 255), bold = True)
-
-            self.label = label_2
-
-            # msg_1 = 'R Prev : {} '.format(int(self.prev))
-            # label_1 = pyglet.text.Label(msg_1, font_name='Consolas', font_size=32,
-            #                             x=200, y=self.height - 120, anchor_x='center', anchor_y='center')
-
-            msg_1 = 'Life 1 : {} '.format(int(self.prev))
-            label_1 = pyglet.text.Label(msg_1, font_name='Consolas', font_size=32,
-                                        x=200, y=self.height - 45, anchor_x='center', anchor_y='center')
-
-        else : # if current stage == stage 1
-            msg_2 = 'Life 2 : {} '.format(int(0))  # TODO : here
-            label_2 = pyglet.text.Label(msg_2, font_name='Consolas', font_size=32,
-                                        x=200, y=self.height - 105, anchor_x='center', anchor_y='center')
-
-            self.label = label_2
-
-
-            # msg_1 = 'Stage 1 : {} '.format(int(self.prev))
-            msg_1 = 'Life 1 : {} '.format(int(self.cur))
-            label_1 = pyglet.text.Label(msg_1, font_name='Consolas', font_size=32,
-                                        x=200, y=self.height - 45, anchor_x='center', anchor_y='center', color = (255, 255, 0, 255), bold = True)
+        # label 은 점수 / stage 가 바뀔 때만 갱신
+        if self.order == 2:  # if current stage == stage 2
+            self._set_label(self._label_2, 'Life 2', int(self.cur), True, self.height - 105)
+            self._set_label(self._label_1, 'Life 1', int(self.prev), False, self.height - 45)
+        else:  # if current stage == stage 1
+            self._set_label(self._label_2, 'Life 2', 0, False, self.height - 105)
+            self._set_label(self._label_1, 'Life 1', int(self.cur), True, self.height - 45)
+        self.label = self._label_2
 
         # current complexity 그림 불러오는 부분
         index = self.sequence[0]
@@ -597,25 +579,72 @@ class SimpleImageViewer(object):
         if index > 1:
             str_index = str_index + str(self.order)
 
-        # cir1 = pyglet.sprite.Sprite(self.circles.get(str_index), self.width / 30, self.height * 27 / 30)
-        cir1 = pyglet.sprite.Sprite(self.circles.get(str_index), self.width - 120,
-                                    self.height * 27 / 30)
-        cir1.draw()
-        self.label.draw()
-        label_1.draw()
+        if str_index != self._cue_index:
+            self._cue.image = self.circles.get(str_index)
+            self._cue_index = str_index
+        if self._cue.position != (self.width - 120, self.height * 27 / 30):
+            self._cue.position = (self.width - 120, self.height * 27 / 30)
+
+        self._cue.draw()
+        self._label_2.draw()
+        self._label_1.draw()
         # self.show_seq()
         self.window.flip()
 
-    # environment.py 안에 step() 통해 점수 얻을 때마다 호출됨. UI 상에서 R Cur update
+    # 화면 texture, label, sprite 를 한 번만 생성 (retained mode)
+    def _init_hud(self, shape):
+        height, width, _channels = shape
+        self._frame_buf = np.empty(shape, dtype=np.uint8)
+
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        self._texture = pyglet.image.Texture.create(width, height, GL_RGB)
+        glBindTexture(self._texture.target, self._texture.id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+
+        # 기존 점수 UI 지우는 부분
+
+        # 'Seaquest-v0' or 'SpaceInvaders-v0' 일 때 상단부 crop
+        if self.game == 1 or self.game == 3 or self.game == 6:
+            self._region = self._texture.get_region(0, 0, width, height - 20)
+
+        # 'Pitfall-v0' 일 때 상단부 더 많이 crop
+        elif self.game == 7:
+            self._region = self._texture.get_region(0, 0, width, height - 50)
+
+        # 'MsPacman-v0' or 'Asterix-v0' or 'Kangaroo-v0' 일 때 하단부 crop
+        else:
+            self._region = self._texture.get_region(0, 27, width, height - 27)
+        self._region_game = self.game
+
+        self._label_1 = pyglet.text.Label('', font_name='Consolas', font_size=32,
+                                          x=200, y=self.height - 45, anchor_x='center', anchor_y='center')
+        self._label_2 = pyglet.text.Label('', font_name='Consolas', font_size=32,
+                                          x=200, y=self.height - 105, anchor_x='center', anchor_y='center')
+        self._label_state = {}
+
+        # cue 그림은 공유 atlas 의 영역으로 그림 (texture 하나)
+        self.circles = get_cue_atlas(self.resource_dir)
+        self._cue = pyglet.sprite.Sprite(self.circles.get('0'), self.width - 120, self.height * 27 / 30)
+        self._cue_index = '0'
+
+    # 점수 / 강조 / 위치가 바뀐 경우에만 label 을 다시 layout
+    def _set_label(self, label, name, score, highlight, y):
+        state = (score, highlight, y)
+        if self._label_state.get(id(label)) == state:
+            return
+        label.begin_update()
+        label.text = '{0} : {1} '.format(name, score)
+        label.color = (255, 255, 0, 255) if highlight else (255, 255, 255, 255)
+        label.bold = highlight
+        label.y = y
+        label.end_update()
+        self._label_state[id(label)] = state
+
+    # environment.py 안에 step() 통해 점수 얻을 때마다 호출됨. UI 상에서 점수 update (label 은 imshow 에서 갱신)
     def update(self, reward):
 
         self.cur += self.signed_reward(reward)
 
-        msg_2 = 'R Cur : {} '.format(self.cur)
-        label_2 = pyglet.text.Label(msg_2, font_name='Consolas', font_size=32,
-                                    x=self.width - 200, y=self.height - 120, anchor_x='center', anchor_y='center')
-        self.label = label_2
-
     def img_update(self, seq, prev, order):
         self.sequence = seq
         self.comp = seq[0]
@@ -623,6 +652,28 @@ class SimpleImageViewer(object):
         self.prev = prev
         self.cur = 0
 
+    # env pool 에서 viewer 재사용 : 새 episode 시작할 때 window 는 그대로 두고 상태만 초기화
+    def reset(self, prev, seq, game, order):
+        if game != self._region_game:
+            self._texture = None  # crop 영역이 게임마다 다름
+        self.comp = seq[0]
+        self.game = game
+        self.order = order
+        self.prev = prev
+        self.sequence = seq
+        if self.window is not None:
+            self.window.set_visible(True)
+
+    # close() 와 같은 값을 return 하지만 window 와 GL context 는 숨겨서 다음 episode 에 재사용
+    def release(self):
+        if self.window is not None:
+            self.window.set_visible(False)
+
+        total = self.calculate()
+        self.cur = 0
+
+        return int(total)
+
     # 이후의 complexity sequence UI 상에 나타냄
     def show_seq(self):
         tmp = self.sequence
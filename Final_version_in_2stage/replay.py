@@ -0,0 +1,259 @@
+"""
+Deterministic replay of Atari episodes from a compact action / seed log.
+
+Given the seed, the game settings and the sequence of actions, ALE is deterministic :
+the sticky actions (repeat_action_probability) are drawn from the ALE system RNG and
+the random frameskip from AtariEnv.np_random, both restored by a checkpoint. Instead of
+every frame, an episode only stores
+
+    - the env name, its frameskip / repeat_action_probability and the seed of AtariEnv.np_random,
+    - one action per env.step() (uint8),
+    - the step after which each frame was shown (the frames of the FrameRecorder / PNG export),
+    - every 'checkpoint_every' steps : AtariEnv.clone_full_state() and the np_random state.
+
+ReplayEngine regenerates any frame range offline by restoring the last checkpoint before it
+and stepping forward, so frames around an EEG event are fetched without replaying from the start.
+
+The episodes of a pooled env (env_pool.py) keep its loaded ROM : ReplayRecorder only seeds
+np_random, the ALE system RNG goes on from the previous episode and is in the first checkpoint,
+taken before the first step ; replays always start from a checkpoint. An episode resumed from a
+snapshot() is logged in a file of its own, its steps numbered on from those of the interrupted one.
+
+usage (game loop) :
+    env = env_pool.acquire(env_name)                           # reset
+    replay_log = ReplayRecorder(path, env, env_name, seed, reset=False)
+    observation, reward, done, info = replay_log.step(action)  # instead of env.step(action)
+    replay_log.mark_frame()                                    # the last observation was shown
+    replay_log.close()
+
+usage (offline) :
+    engine = ReplayEngine(path)
+    frames = engine.frames(1000, 1060)                         # (60, 210, 160, 3) uint8
+
+    python replay.py episode000.npz --export 1000 1060 out.npy
+    python replay.py episode000.npz --verify ./block1_Seaquest_frames/episode000
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+_FORMAT_VERSION = 1
+
+
+def _rng_state(np_random):
+    """ np.random.RandomState state as arrays (keys, [pos, has_gauss], cached_gaussian) """
+    _, keys, pos, has_gauss, cached_gaussian = np_random.get_state()
+    return np.asarray(keys, dtype=np.uint32), np.array([pos, has_gauss], dtype=np.int64), float(cached_gaussian)
+
+
+def _set_rng_state(np_random, keys, pos_gauss, cached_gaussian):
+    np_random.set_state(('MT19937', keys, int(pos_gauss[0]), int(pos_gauss[1]), float(cached_gaussian)))
+
+
+class ReplayRecorder(object):
+    """
+    Action / seed log of one episode, written to 'path' (.npz) by close().
+
+    AtariEnv.np_random is seeded with 'seed' (not AtariEnv.seed(), which reloads the ROM) and the
+    environment is reset here, unless reset=False : it was just reset (EnvPool.acquire). The first
+    checkpoint is taken before the first step. 'restore' (a snapshot()) continues from a saved
+    state instead, e.g. after a crash (session_checkpoint.py) ; 'first_step' is then the step
+    counter of the snapshot (len() of the interrupted log), the steps go on from it.
+    """
+
+    def __init__(self, path, env, env_name, seed, checkpoint_every=600, restore=None, reset=True, first_step=0):
+        self.path = path
+        self.env = env
+        self.atari = env.unwrapped
+        self.env_name = env_name
+        self.seed = int(seed)
+        self.checkpoint_every = checkpoint_every
+        self.first_step = int(first_step)
+
+        from gym.utils import seeding
+        self.atari.np_random, _ = seeding.np_random(self.seed)
+        # after a reset, the observation is the current screen
+        self.observation = env.reset() if reset else self.atari._get_obs()
+        if restore is not None:
+            self.atari.restore_full_state(restore[0])
+            _set_rng_state(self.atari.np_random, *restore[1])
+
+        self.actions = bytearray()
+        self.frame_steps = []
+        self.checkpoint_steps = []
+        self.checkpoint_states = []
+        self.checkpoint_rng = []
+        self._closed = False
+
+    def __len__(self):
+        """ step counter : steps of the episode so far """
+        return self.first_step + len(self.actions)
+
+    def _checkpoint(self):
+        state, rng = self.snapshot()
+        self.checkpoint_steps.append(len(self))
+        self.checkpoint_states.append(state)
+        self.checkpoint_rng.append(rng)
+
+    def snapshot(self):
+        """ (ALE full state, np_random state) of the environment now """
+        return np.asarray(self.atari.clone_full_state(), dtype=np.uint8), _rng_state(self.atari.np_random)
+
+    def step(self, action):
+        """ env.step(action), logged """
+        if len(self.actions) == 0 or len(self) % self.checkpoint_every == 0:
+            self._checkpoint()
+        self.actions.append(action)
+        return self.env.step(action)
+
+    def mark_frame(self):
+        """ the observation of the last step is a recorded frame """
+        self.frame_steps.append(len(self) - 1)
+
+    def close(self):
+        if self._closed:
+            return self.path
+        self._closed = True
+
+        direc = os.path.dirname(self.path)
+        if direc and not os.path.exists(direc):
+            os.makedirs(direc)
+
+        states = self.checkpoint_states
+        offsets = np.cumsum([0] + [len(s) for s in states]).astype(np.int64)
+        frameskip = self.atari.frameskip
+        frameskip = np.array(frameskip if isinstance(frameskip, tuple) else (frameskip, frameskip + 1), dtype=np.int64)
+
+        tmp = self.path + '.tmp.npz'
+        np.savez(tmp,
+                 version=_FORMAT_VERSION,
+                 env_name=self.env_name,
+                 seed=self.seed,
+                 frameskip=frameskip,
+                 repeat_action_probability=self.atari.ale.getFloat(b'repeat_action_probability'),
+                 checkpoint_every=self.checkpoint_every,
+                 first_step=self.first_step,
+                 actions=np.frombuffer(bytes(self.actions), dtype=np.uint8),
+                 frame_steps=np.array(self.frame_steps, dtype=np.int64),
+                 checkpoint_steps=np.array(self.checkpoint_steps, dtype=np.int64),
+                 checkpoint_offsets=offsets,
+                 checkpoint_data=np.concatenate(states) if states else np.zeros(0, np.uint8),
+                 checkpoint_rng_keys=np.array([r[0] for r in self.checkpoint_rng], dtype=np.uint32).reshape(-1, 624),
+                 checkpoint_rng_pos=np.array([r[1] for r in self.checkpoint_rng], dtype=np.int64).reshape(-1, 2),
+                 checkpoint_rng_gauss=np.array([r[2] for r in self.checkpoint_rng], dtype=np.float64))
+        os.replace(tmp, self.path)
+        return self.path
+
+
+class ReplayEngine(object):
+    """ regenerate the observations of an episode logged by ReplayRecorder """
+
+    def __init__(self, path, make=None):
+        with np.load(path) as f:
+            self.log = {key: f[key] for key in f.files}
+        if int(self.log['version']) != _FORMAT_VERSION:
+            raise ValueError('unknown replay log version %d' % (int(self.log['version']),))
+
+        self.env_name = str(self.log['env_name'])
+        self.seed = int(self.log['seed'])
+        self.actions = self.log['actions']  # steps first_step, first_step + 1, ...
+        self.first_step = int(self.log['first_step']) if 'first_step' in self.log else 0
+        self.frame_steps = self.log['frame_steps']
+        self.checkpoint_steps = self.log['checkpoint_steps']
+
+        if make is None:
+            import gym
+            make = gym.make
+        self.env = make(self.env_name).unwrapped
+
+        frameskip = tuple(int(x) for x in self.log['frameskip'])
+        self.env.frameskip = frameskip if frameskip[1] - frameskip[0] > 1 else frameskip[0]
+        self.env.ale.setFloat(b'repeat_action_probability', float(self.log['repeat_action_probability']))
+        self.env.seed(self.seed)
+        self.env.reset()
+
+    def __len__(self):
+        """ number of recorded frames """
+        return len(self.frame_steps)
+
+    def restore(self, step):
+        """ restore the last checkpoint at or before 'step' ; returns its step """
+        i = int(np.searchsorted(self.checkpoint_steps, step, side='right')) - 1
+        if i < 0:
+            raise ValueError('no checkpoint before step %d' % (step,))
+        offsets = self.log['checkpoint_offsets']
+        state = self.log['checkpoint_data'][offsets[i]:offsets[i + 1]]
+        self.env.restore_full_state(state)
+        _set_rng_state(self.env.np_random, self.log['checkpoint_rng_keys'][i], self.log['checkpoint_rng_pos'][i],
+                       self.log['checkpoint_rng_gauss'][i])
+        return int(self.checkpoint_steps[i])
+
+    def iter_steps(self, start, stop):
+        """ yield (step, observation) for the steps start ... stop - 1 """
+        stop = min(stop, self.first_step + len(self.actions))
+        step = self.restore(start)
+        while step < stop:
+            ob, _, _, _ = self.env.step(int(self.actions[step - self.first_step]))
+            if step >= start:
+                yield step, ob
+            step += 1
+
+    def iter_frames(self, start=0, stop=None):
+        """ yield (frame index, observation) for the recorded frames start ... stop - 1 """
+        stop = len(self.frame_steps) if stop is None else min(stop, len(self.frame_steps))
+        if start >= stop:
+            return
+        wanted = self.frame_steps[start:stop]
+        frame_i = start
+        for step, ob in self.iter_steps(int(wanted[0]), int(wanted[-1]) + 1):
+            while frame_i < stop and self.frame_steps[frame_i] == step:
+                yield frame_i, ob
+                frame_i += 1
+
+    def frames(self, start=0, stop=None):
+        """ the recorded frames start ... stop - 1 as one array """
+        return np.array([ob for _, ob in self.iter_frames(start, stop)], dtype=np.uint8)
+
+    def close(self):
+        self.env.close()
+
+
+def verify(path, direc_frames, every=1):
+    """ compare the replayed frames with a FrameRecorder directory ; returns the mismatching frame indices """
+    from frame_recorder import iter_frames
+    engine = ReplayEngine(path)
+    mismatch = []
+    recorded = iter_frames(direc_frames)
+    for (frame_i, ob), frame in zip(engine.iter_frames(), recorded):
+        if frame_i % every == 0 and not np.array_equal(ob, frame):
+            mismatch.append(frame_i)
+    engine.close()
+    return mismatch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='regenerate the frames of a logged Atari episode')
+    parser.add_argument('log', help='episode .npz written by ReplayRecorder')
+    parser.add_argument('--export', nargs=3, metavar=('START', 'STOP', 'OUT'), help='save frames START:STOP to OUT.npy')
+    parser.add_argument('--verify', metavar='FRAMES_DIR', help='compare with the frames of a FrameRecorder')
+    args = parser.parse_args(argv)
+
+    if args.export:
+        start, stop, out = int(args.export[0]), int(args.export[1]), args.export[2]
+        engine = ReplayEngine(args.log)
+        frames = engine.frames(start, stop)
+        engine.close()
+        np.save(out, frames)
+        print("{0} frames saved to {1}".format(len(frames), out))
+
+    if args.verify:
+        mismatch = verify(args.log, args.verify)
+        if mismatch:
+            print("{0} frames differ, first : {1}".format(len(mismatch), mismatch[:10]))
+            sys.exit(1)
+        print("replay identical to the recorded frames")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Append-only result log of one block, compacted into the .mat files of the block at its end.
+
+Every episode appends one record (its ots, key rows, rewards, ... and the two reward per
+stage entries) instead of rewriting all episodes of the block into three .mat files, so the
+save after an episode costs the same for the first and the last episode of a block.
+Each record is fsync'd, a crash loses at most the episode being played.
+
+layout of one log directory :
+    header.pkl      - the values that are the same for all episodes of the block (schedules, ...)
+    episodes.log    - records : <length uint32> <crc32 uint32> <pickled dict>, appended and fsync'd
+    index.json      - number of records and their offsets, rewritten atomically after each append
+
+compact() (or `python result_log.py LOG_DIR DICT_DIR TIME_NOW`) writes the .mat files of the
+former per-episode io.savemat calls, with their keys and shapes :
+    DICT_DIR/<TIME_NOW>.mat                                      - frame_data_dict
+    DICT_DIR/reward_per_session_stage_dict_sep<TIME_NOW>.mat     - reward_per_session_MH
+    DICT_DIR/reward_per_session_stage_dict<TIME_NOW>.mat         - reward_per_session
+and what the session logs beyond them into a file of its own :
+    DICT_DIR/extra_dict<TIME_NOW>.mat                            - extra_dict (EXTRA_KEYS and the poll
+                                                                   time of every key row, per episode)
+"""
+import os
+import sys
+import json
+import zlib
+import pickle
+import struct
+
+from frame_log import to_info_keys, to_ots, to_rewards_per_image
+
+_RECORD_HEAD = struct.Struct('<II')  # payload length, crc32
+
+# keys of frame_data_dict, in the order the session used to build it
+EPISODE_KEYS = ('observation_time', 'reward_c', 'rewards_per_image', 'key')
+HEADER_KEYS = ('session', 'session_tag', 'complexity_schedule', 'uncertainty_schedule', 'goal_condition_schedule')
+# episode values that are not in frame_data_dict, saved in extra_dict
+EXTRA_KEYS = ('loop_timing', 'replay_log')
+
+
+def _header_path(direc):
+    return os.path.join(direc, 'header.pkl')
+
+
+def _log_path(direc):
+    return os.path.join(direc, 'episodes.log')
+
+
+def _index_path(direc):
+    return os.path.join(direc, 'index.json')
+
+
+def _write_atomic(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+class ResultLog(object):
+    """
+    usage :
+        result_log = ResultLog(direc, header={'session': ..., ...})
+        result_log.append({'observation_time': ots, 'reward_c': ..., ...})   # after every episode
+        result_log.close()
+        compact(direc, direc_save_dict, time_now)
+    """
+
+    def __init__(self, direc, header=None):
+        self.direc = direc
+        if not os.path.exists(direc):
+            os.makedirs(direc)
+        if header is not None:
+            _write_atomic(_header_path(direc), pickle.dumps(header, protocol=4))
+
+        records, self._end = _scan(direc)
+        self.offsets = [offset for offset, _ in records]
+        self._f = open(_log_path(direc), 'ab')
+        self._f.truncate(self._end)  # drop a torn record left by a crash before appending again
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, record):
+        """ append one episode record and make it durable ; returns its index """
+        payload = pickle.dumps(record, protocol=4)
+        self._f.write(_RECORD_HEAD.pack(len(payload), zlib.crc32(payload)))
+        self._f.write(payload)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+        self.offsets.append(self._end)
+        self._end += _RECORD_HEAD.size + len(payload)
+        _write_atomic(_index_path(self.direc), json.dumps(
+            {'n_records': len(self.offsets), 'offsets': self.offsets, 'size': self._end}).encode())
+        return len(self.offsets) - 1
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+def _scan(direc):
+    """
+    (offset, record) of every complete record and the end of the last one ;
+    a torn or corrupt tail (crash during append) ends the scan
+    """
+    path = _log_path(direc)
+    if not os.path.exists(path):
+        return [], 0
+    records = []
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + _RECORD_HEAD.size <= len(data):
+        length, crc = _RECORD_HEAD.unpack_from(data, offset)
+        payload = data[offset + _RECORD_HEAD.size:offset + _RECORD_HEAD.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append((offset, pickle.loads(payload)))
+        offset += _RECORD_HEAD.size + length
+    return records, offset
+
+
+def read_header(direc):
+    path = _header_path(direc)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def read_records(direc):
+    """ all complete episode records of a log, in order """
+    return [record for _, record in _scan(direc)[0]]
+
+
+def read_record(direc, i):
+    """ episode record 'i', located through index.json """
+    with open(_index_path(direc)) as f:
+        offset = json.load(f)['offsets'][i]
+    with open(_log_path(direc), 'rb') as f:
+        f.seek(offset)
+        length, crc = _RECORD_HEAD.unpack(f.read(_RECORD_HEAD.size))
+        payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        raise IOError('record %d of %s is corrupt' % (i, direc))
+    return pickle.loads(payload)
+
+
+def _matlab_layout(record):
+    """ the ots / reward / key lists of an episode record saved with frame_log arrays """
+    if 'key_rows' in record:
+        record = dict(record)
+        record['observation_time'] = to_ots(record['time_rows'])
+        record['rewards_per_image'] = to_rewards_per_image(record['time_rows'])
+        record['key'] = to_info_keys(record['key_rows'], record['key_labels'])
+    return record
+
+
+def to_dicts(direc):
+    """ (frame_data_dict, reward_per_session_MH, reward_per_session) as the session built them, and extra_dict """
+    header = read_header(direc)
+    records = [_matlab_layout(r) for r in read_records(direc)]
+
+    frame_data_dict = {}
+    for key in EPISODE_KEYS:
+        frame_data_dict[key] = [r[key] for r in records]
+    for key in HEADER_KEYS:
+        frame_data_dict[key] = header.get(key)
+
+    extra_dict = {}
+    for key in EXTRA_KEYS:
+        extra_dict[key] = [r[key] for r in records]
+    extra_dict['key_poll_time'] = [r['key_rows']['poll'].tolist() if 'key_rows' in r else [] for r in records]
+
+    reward_per_session_MH = {}
+    reward_per_session = {}
+    for r in records:
+        reward_per_session_MH.update(r['reward_per_session_stage_sep'])
+        reward_per_session.update(r['reward_per_session_stage'])
+    return frame_data_dict, reward_per_session_MH, reward_per_session, extra_dict
+
+
+def compact(direc, direc_save_dict, time_now):
+    """ write the .mat files of the block from its log ; returns the number of episodes """
+    from scipy import io
+
+    frame_data_dict, reward_per_session_MH, reward_per_session, extra_dict = to_dicts(direc)
+    if not os.path.exists(direc_save_dict):
+        os.makedirs(direc_save_dict)
+
+    io.savemat(direc_save_dict + '/' + time_now + '.mat', frame_data_dict)
+    io.savemat(direc_save_dict + '/reward_per_session_stage_dict_sep' + time_now + '.mat', reward_per_session_MH)
+    io.savemat(direc_save_dict + '/reward_per_session_stage_dict' + time_now + '.mat', reward_per_session)
+    io.savemat(direc_save_dict + '/extra_dict' + time_now + '.mat', extra_dict)
+    return len(frame_data_dict['reward_c'])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print("usage : python result_log.py LOG_DIR DICT_DIR TIME_NOW")
+        sys.exit(1)
+    n = compact(sys.argv[1], sys.argv[2], sys.argv[3])
+    print("{0} episodes written to {1}".format(n, sys.argv[2]))
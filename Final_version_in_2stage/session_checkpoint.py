@@ -0,0 +1,110 @@
+"""
+Crash-safe checkpoints of an Atari session, for restarting from where it stopped.
+
+openAI_function_atari saves a checkpoint
+    - 'stage'   at every stage boundary : the session state, the ALE state (clone_full_state), the
+                step counter of the replay log and the key / time rows (frame_log.py) of the episode since the previous checkpoint,
+    - 'episode' after every episode,
+    - 'block'   after every block,
+    - 'done'    at the end of the session.
+
+Checkpoints are records of an append-only log (result_log.ResultLog) ; the game loop only
+takes the snapshot, pickling, writing and fsync run on a background thread, so a save at a
+stage boundary costs well below one frame. load() merges the records back into the state to
+continue from : the last block boundary, episode boundary or stage boundary.
+
+    python main_atari.py --resume                  # latest unfinished session of the subject
+    python main_atari.py --resume ./result_save/ATARI/Subject2/session3_20230301-1012/checkpoint
+"""
+import os
+import glob
+import queue
+import threading
+import numpy as np
+
+from result_log import ResultLog, read_records
+
+CHECKPOINT_DIR = 'checkpoint'
+
+# rows of the running episode, saved as the part added since the previous 'stage' checkpoint
+EPISODE_ROWS = ('key_rows', 'time_rows')
+
+_STOP = None
+
+
+class SessionCheckpoint(object):
+    """
+    usage :
+        checkpoint = SessionCheckpoint(direc_session + '/checkpoint')
+        checkpoint.save('stage', state)       # returns immediately
+        checkpoint.close()
+    """
+
+    def __init__(self, direc):
+        self.direc = direc
+        self._log = ResultLog(direc)
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='SessionCheckpoint', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            try:
+                self._log.append(record)
+            except Exception as e:  # reported on the next save() / close()
+                self._error = e
+
+    def save(self, kind, state):
+        """ queue a checkpoint ; 'state' must not be mutated afterwards (copy the lists) """
+        if self._error is not None:
+            raise IOError('checkpoint writer failed') from self._error
+        record = dict(state)
+        record['kind'] = kind
+        self._queue.put(record)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._log.close()
+        if self._error is not None:
+            raise IOError('checkpoint writer failed') from self._error
+
+
+def load(direc):
+    """
+    State to continue from, i.e. the last checkpoint ; for a 'stage' checkpoint the rows of the
+    running episode are joined from all its 'stage' records and 'episode_frames' lists the
+    frame directories recorded for that episode before the crash. None if nothing was saved.
+    """
+    records = read_records(direc)
+    if not records:
+        return None
+
+    state = dict(records[-1])
+    if state['kind'] == 'stage':
+        first = len(records)
+        while first > 0 and records[first - 1]['kind'] == 'stage':
+            first -= 1
+        for key in EPISODE_ROWS:
+            state[key] = np.concatenate([r[key] for r in records[first:]])
+        frames = []
+        for r in records[first:]:
+            if r['frames_direc'] is not None and r['frames_direc'] not in frames:
+                frames.append(r['frames_direc'])
+        state['episode_frames'] = frames
+    return state
+
+
+def find_latest(part_number, sess_number, root='./result_save/ATARI'):
+    """ checkpoint directory of the latest session of this subject / session number that did not finish """
+    pattern = os.path.join(root, 'Subject{0}'.format(part_number), 'session{0}_*'.format(sess_number), CHECKPOINT_DIR)
+    for direc in sorted(glob.glob(pattern), reverse=True):  # session dirs end with the start time
+        records = read_records(direc)
+        if records and records[-1]['kind'] != 'done':
+            return direc
+    return None
@@ -0,0 +1,63 @@
+"""
+Clocks of the session loop of Session_atari (openAI_function_atari(..., clock=...)).
+
+The loop takes every time stamp, timer and wait from its clock :
+    now()        - seconds, monotonic (time.perf_counter)
+    sleep(s)     - wait s seconds
+    timer()      - timer with the interface of psychopy core.Clock (getTime, reset, addTime)
+    spin         - busy wait of the LoopScheduler before a deadline (s)
+
+    WallClock : the experiment ; real waits, psychopy timers
+    FastClock : the waits are not waited, their time is added to the clock instead. The session
+                logic (60 Hz grid, 4 min blocks, rests, score screens) runs unchanged and as fast
+                as the machine can, e.g. for bench_headless.py
+"""
+import time
+
+
+class _Timer(object):
+    """ core.Clock on top of a clock's now() """
+
+    def __init__(self, now):
+        self._now = now
+        self.reset()
+
+    def reset(self, newT=0.0):
+        self._t0 = self._now() + newT
+
+    def getTime(self):
+        return self._now() - self._t0
+
+    def addTime(self, t):
+        self._t0 += t
+
+
+class WallClock(object):
+    spin = 0.002
+
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def timer(self):
+        from psychopy import core
+        return core.Clock()
+
+
+class FastClock(object):
+    spin = 0.0  # a wait of the scheduler ends exactly on its deadline
+
+    def __init__(self):
+        self.skipped = 0.0  # seconds of waits added to the clock
+
+    def now(self):
+        return time.perf_counter() + self.skipped
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.skipped += seconds
+
+    def timer(self):
+        return _Timer(self.now)